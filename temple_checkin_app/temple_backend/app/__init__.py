@@ -1,14 +1,13 @@
 import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from app.config import config
 from app.utils.helpers import CustomJSONEncoder
+from app.models import db
 
-# 初始化擴展
-db = SQLAlchemy()
+# 初始化擴展（db 使用 models 模組中的同一個實例）
 migrate = Migrate()
 jwt = JWTManager()
 cors = CORS()
@@ -24,12 +23,50 @@ def create_app(config_name=None):
     # 設定自定義 JSON 編碼器 (Flask 2.2+ 使用新方法)
     app.json.encoder = CustomJSONEncoder
     
+    # 回應 JSON 編碼後端與模型序列化函式
+    from app.utils.json_backend import json_backend
+    from app.models.serialization import compile_serializers
+    json_backend.init_app(app)
+    compile_serializers(model for model in db.Model.__subclasses__() if hasattr(model, 'FIELDS'))
+    
     # 初始化擴展
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     cors.init_app(app, origins=app.config['CORS_ORIGINS'])
     
+    # 回應壓縮
+    from app.utils.compression import response_compressor
+    response_compressor.init_app(app)
+    
+    # 分頁總數快取（count=estimate）
+    from app.utils.count_cache import count_cache
+    count_cache.init_app(app)
+    
+    # Idempotency-Key 回應重播
+    from app.utils.idempotency import idempotency_store
+    idempotency_store.init_app(app)
+    
+    # 廟宇目錄、加碼活動與平安符 UID 快取
+    from app.services.temple_catalog import temple_catalog
+    from app.services.bonus_campaigns import bonus_campaigns
+    from app.services.amulet_resolver import amulet_resolver
+    temple_catalog.init_app(app)
+    bonus_campaigns.init_app(app)
+    amulet_resolver.init_app(app)
+    
+    # 附近廟宇的空間索引
+    from app.services.spatial_index import spatial_index
+    spatial_index.init_app(app)
+    
+    # 打卡寫入緩衝（依設定啟用）
+    from app.services.checkin_writer import checkin_writer
+    checkin_writer.init_app(app)
+    
+    # 批次請求分派
+    from app.services.batch_dispatcher import batch_dispatcher
+    batch_dispatcher.init_app(app)
+    
     # 註冊藍圖
     register_blueprints(app)
     
@@ -52,6 +89,7 @@ def register_blueprints(app):
     from app.routes.checkin import checkin_bp
     from app.routes.amulets import amulets_bp
     from app.routes.admin import admin_bp
+    from app.routes.batch import batch_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(users_bp)
@@ -59,6 +97,7 @@ def register_blueprints(app):
     app.register_blueprint(checkin_bp)
     app.register_blueprint(amulets_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(batch_bp)
 
 def register_error_handlers(app):
     """註冊錯誤處理器"""
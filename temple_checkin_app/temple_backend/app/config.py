@@ -29,6 +29,29 @@ class Config:
     
     # 分頁設定
     POSTS_PER_PAGE = 20
+    COUNT_CACHE_SIZE = int(os.environ.get('COUNT_CACHE_SIZE', 1024))  # count=estimate 快取的總數筆數
+    COUNT_CACHE_TTL_SECONDS = int(os.environ.get('COUNT_CACHE_TTL_SECONDS', 300))
+    MULTI_GET_MAX_IDS = int(os.environ.get('MULTI_GET_MAX_IDS', 200))  # ids= 批次查詢每次最多筆數
+    DISTANCE_MAX_POINTS = int(os.environ.get('DISTANCE_MAX_POINTS', 100))  # 距離計算每次最多起點數
+    DISTANCE_MAX_TEMPLES = int(os.environ.get('DISTANCE_MAX_TEMPLES', 1000))  # 距離計算每次最多廟宇數
+    
+    # 打卡設定
+    CHECKIN_BATCH_MAX_ITEMS = int(os.environ.get('CHECKIN_BATCH_MAX_ITEMS', 500))
+    CHECKIN_BATCH_MAX_AGE_DAYS = int(os.environ.get('CHECKIN_BATCH_MAX_AGE_DAYS', 30))
+    CHECKIN_CLOCK_SKEW_SECONDS = int(os.environ.get('CHECKIN_CLOCK_SKEW_SECONDS', 300))
+    CHECKIN_EXPORT_CHUNK_SIZE = int(os.environ.get('CHECKIN_EXPORT_CHUNK_SIZE', 1000))  # 匯出時每批讀取筆數
+    
+    # 打卡寫入緩衝（write-behind + group commit）設定
+    CHECKIN_WRITE_BEHIND = os.environ.get('CHECKIN_WRITE_BEHIND', 'false').lower() in ['true', 'on', '1']
+    CHECKIN_WRITE_BEHIND_DIR = os.environ.get('CHECKIN_WRITE_BEHIND_DIR')  # 預設為 instance 目錄
+    CHECKIN_WRITE_BEHIND_FSYNC = os.environ.get('CHECKIN_WRITE_BEHIND_FSYNC', 'true').lower() in ['true', 'on', '1']
+    CHECKIN_FLUSH_BATCH_SIZE = int(os.environ.get('CHECKIN_FLUSH_BATCH_SIZE', 200))
+    CHECKIN_FLUSH_INTERVAL_MS = int(os.environ.get('CHECKIN_FLUSH_INTERVAL_MS', 50))
+    CHECKIN_FLUSH_MAX_ATTEMPTS = int(os.environ.get('CHECKIN_FLUSH_MAX_ATTEMPTS', 5))  # 超過後逐筆寫入，失敗的移到 dead-letter 日誌
+    
+    # 批次請求（POST /api/batch）設定
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+    BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))  # parallel 時的執行緒數，1 為停用
     
     # 郵件設定
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -37,6 +60,50 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     
+    # 廟宇目錄快取設定
+    TEMPLE_CACHE_SIZE = int(os.environ.get('TEMPLE_CACHE_SIZE', 20000))
+    TEMPLE_CACHE_CHECK_INTERVAL_MS = int(os.environ.get('TEMPLE_CACHE_CHECK_INTERVAL_MS', 1000))
+    
+    # 附近廟宇查詢方式：memory（各 worker 的記憶體網格索引）、geohash（資料庫前綴範圍掃描）、sql（經緯度邊界框）
+    SPATIAL_BACKEND = os.environ.get('SPATIAL_BACKEND', 'memory')
+    SPATIAL_INDEX_CELL_KM = float(os.environ.get('SPATIAL_INDEX_CELL_KM', 2))  # 網格邊長（公里）
+    
+    # 地圖視窗：此縮放層級以下回傳群集，以上回傳個別廟宇
+    VIEWPORT_CLUSTER_MAX_ZOOM = int(os.environ.get('VIEWPORT_CLUSTER_MAX_ZOOM', 14))
+    VIEWPORT_CLUSTER_CELL_PX = int(os.environ.get('VIEWPORT_CLUSTER_CELL_PX', 64))  # 群集格子邊長（像素，圖磚為 256）
+    VIEWPORT_MAX_POINTS = int(os.environ.get('VIEWPORT_MAX_POINTS', 2000))  # 超過時仍回傳群集
+    
+    # 加碼活動快取設定
+    BONUS_CAMPAIGN_CHECK_INTERVAL_MS = int(os.environ.get('BONUS_CAMPAIGN_CHECK_INTERVAL_MS', 1000))
+    
+    # 平安符 UID 快取設定
+    AMULET_CACHE_SIZE = int(os.environ.get('AMULET_CACHE_SIZE', 4096))
+    AMULET_CACHE_TTL_SECONDS = int(os.environ.get('AMULET_CACHE_TTL_SECONDS', 60))
+    AMULET_MISS_TTL_SECONDS = int(os.environ.get('AMULET_MISS_TTL_SECONDS', 5))  # 查無資料的快取秒數，0 為不快取
+    AMULET_CACHE_CHECK_INTERVAL_MS = int(os.environ.get('AMULET_CACHE_CHECK_INTERVAL_MS', 1000))
+    # 執行 normalize-amulet-uids 後可設為 false，省去比對不到時的 UPPER(uid) 查詢
+    AMULET_UID_MATCH_LEGACY_CASE = os.environ.get('AMULET_UID_MATCH_LEGACY_CASE', 'true').lower() in ['true', 'on', '1']
+    
+    # Idempotency-Key 設定
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))
+    IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 1024))
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT_SECONDS', 60))  # 處理中的 key 逾時後可重新取得，需大於請求逾時
+    
+    # 回應 JSON 編碼後端（auto 時有安裝 orjson 就使用）
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    
+    # 回應壓縮設定（依 Accept-Encoding 使用 br 或 gzip）
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # 小於此位元組數不壓縮
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+    COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))  # 依 ETag 快取的壓縮結果數
+    COMPRESSION_MIMETYPES = [
+        'application/json', 'application/x-ndjson', 'application/cbor',
+        'application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack',
+        'text/csv', 'text/plain', 'text/html',
+    ]
+    
     # API 設定
     API_VERSION = 'v1'
     API_PREFIX = '/api'
@@ -56,6 +123,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    CHECKIN_WRITE_BEHIND = False
 
 # 設定映射
 config = {
@@ -7,5 +7,12 @@ from .user import User
 from .temple import Temple  
 from .amulet import Amulet
 from .checkin import Checkin
+from .temple_visit import TempleVisit
+from .idempotency_key import IdempotencyKey
+from .cache_generation import CacheGeneration
+from .bonus_campaign import BonusCampaign
+from .blessing_ledger import BlessingLedger
+from .blessing_snapshot import BlessingSnapshot
 
-__all__ = ['db', 'User', 'Temple', 'Amulet', 'Checkin']
\ No newline at end of file
+__all__ = ['db', 'User', 'Temple', 'Amulet', 'Checkin', 'TempleVisit', 'IdempotencyKey', 'CacheGeneration',
+           'BonusCampaign', 'BlessingLedger', 'BlessingSnapshot']
\ No newline at end of file
@@ -1,8 +1,9 @@
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey
 
 # 從主 models 模組引入 db 實例
 from . import db
+from .serialization import serialize_fields
 
 class Amulet(db.Model):
     """平安符模型"""
@@ -14,6 +15,8 @@ class Amulet(db.Model):
     name = Column(String(100), nullable=False)
     description = Column(Text, nullable=True)
     image_url = Column(Text, nullable=True)
+    checkin_count = Column(Integer, default=0, nullable=False)  # 打卡次數（打卡時累加）
+    last_checkin_at = Column(DateTime, nullable=True)  # 最後打卡時間（打卡時更新）
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -30,18 +33,11 @@ class Amulet(db.Model):
     
     def get_checkin_count(self):
         """取得打卡次數"""
-        from .checkin import Checkin
-        return db.session.query(db.func.count(Checkin.id)).filter(
-            Checkin.amulet_id == self.id
-        ).scalar() or 0
+        return self.checkin_count or 0
     
     def get_last_checkin(self):
         """取得最後打卡時間"""
-        from .checkin import Checkin
-        last_checkin = db.session.query(Checkin).filter(
-            Checkin.amulet_id == self.id
-        ).order_by(Checkin.checkin_time.desc()).first()
-        return last_checkin.checkin_time if last_checkin else None
+        return self.last_checkin_at
     
     def get_visited_temples(self):
         """取得造訪過的廟宇列表"""
@@ -53,25 +49,33 @@ class Amulet(db.Model):
             Checkin.amulet_id == self.id
         ).distinct().all()
     
-    def to_dict(self, include_stats=False):
-        """轉換為字典"""
-        data = {
-            'id': self.id,
-            'user_id': self.user_id,
-            'uid': self.uid,
-            'name': self.name,
-            'description': self.description,
-            'image_url': self.image_url,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
+    # 可輸出的欄位（fields= 參數可從中選擇），序列化函式由欄位型別產生
+    FIELDS = (
+        'id', 'user_id', 'uid', 'name', 'description', 'image_url', 'is_active', 'created_at',
+        'updated_at',
+    )
+    
+    # include 區塊需要的欄位
+    INCLUDE_COLUMNS = {
+        'stats': ('checkin_count', 'last_checkin_at'),
+    }
+    
+    def get_visited_temples_count(self):
+        """取得造訪過的廟宇數"""
+        from .checkin import Checkin
+        return db.session.query(db.func.count(db.distinct(Checkin.temple_id))).filter(
+            Checkin.amulet_id == self.id
+        ).scalar() or 0
+    
+    def to_dict(self, include_stats=False, fields=None):
+        """轉換為字典（fields 指定時只輸出這些欄位）"""
+        data = serialize_fields(self, fields)
         
         if include_stats:
             data['stats'] = {
                 'checkin_count': self.get_checkin_count(),
-                'last_checkin': self.get_last_checkin().isoformat() if self.get_last_checkin() else None,
-                'visited_temples_count': len(self.get_visited_temples()),
+                'last_checkin': self.last_checkin_at,
+                'visited_temples_count': self.get_visited_temples_count(),
             }
         
         return data
@@ -0,0 +1,111 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index
+
+# 從主 models 模組引入 db 實例
+from . import db
+
+class BlessingLedger(db.Model):
+    """福報值帳本（只新增不修改，每次發放一筆）
+    
+    供稽核與重建使用：回應中的福報值仍讀取 users.blessing_points（與帳本在
+    同一個交易中更新），帳本餘額只由 reconcile-blessings 用來核對兩者是否一致。
+    """
+    __tablename__ = 'blessing_ledger'
+    __table_args__ = (
+        Index('ix_blessing_ledger_user_id_id', 'user_id', 'id'),
+    )
+    
+    REASON_CHECKIN = 'checkin'
+    REASON_ADJUSTMENT = 'adjustment'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(36), ForeignKey('users.id'), nullable=False)
+    points = Column(Integer, nullable=False)
+    reason = Column(String(20), nullable=False)  # checkin, adjustment
+    checkin_id = Column(String(36), ForeignKey('checkins.id'), nullable=True, index=True)
+    campaign_id = Column(String(36), ForeignKey('bonus_campaigns.id'), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __init__(self, user_id, points, reason, checkin_id=None, campaign_id=None):
+        self.user_id = user_id
+        self.points = points
+        self.reason = reason
+        self.checkin_id = checkin_id
+        self.campaign_id = campaign_id
+    
+    @staticmethod
+    def append_checkins(rows, now=None):
+        """為已寫入的打卡各新增一筆帳本記錄（executemany，不 commit）"""
+        now = now or datetime.utcnow()
+        db.session.execute(BlessingLedger.__table__.insert(), [
+            {
+                'user_id': row['user_id'],
+                'points': row['points_earned'],
+                'reason': BlessingLedger.REASON_CHECKIN,
+                'checkin_id': row['id'],
+                'campaign_id': row.get('campaign_id'),
+                'created_at': now,
+            }
+            for row in rows
+        ])
+    
+    @staticmethod
+    def get_balances(user_ids, max_ledger_id=None):
+        """以最新快照加上之後的帳本記錄計算餘額，回傳 user_id -> (餘額, 最後帳本 id)
+        
+        沒有快照也沒有帳本記錄的使用者不會出現在結果中。
+        """
+        from .blessing_snapshot import BlessingSnapshot
+        
+        ledger = BlessingLedger.__table__
+        snapshots = BlessingSnapshot.__table__
+        user_ids = list(user_ids)
+        
+        balances = {
+            user_id: (balance, ledger_id)
+            for user_id, balance, ledger_id in db.session.execute(
+                db.select(snapshots.c.user_id, snapshots.c.balance, snapshots.c.ledger_id).where(
+                    snapshots.c.user_id.in_(user_ids)
+                )
+            )
+        }
+        
+        deltas = db.select(
+            ledger.c.user_id,
+            db.func.sum(ledger.c.points),
+            db.func.max(ledger.c.id)
+        ).select_from(
+            ledger.outerjoin(snapshots, snapshots.c.user_id == ledger.c.user_id)
+        ).where(
+            ledger.c.user_id.in_(user_ids),
+            ledger.c.id > db.func.coalesce(snapshots.c.ledger_id, 0)
+        ).group_by(ledger.c.user_id)
+        if max_ledger_id is not None:
+            deltas = deltas.where(ledger.c.id <= max_ledger_id)
+        
+        for user_id, points, ledger_id in db.session.execute(deltas):
+            balance, _ = balances.get(user_id, (0, 0))
+            balances[user_id] = (balance + points, ledger_id)
+        
+        return balances
+    
+    @staticmethod
+    def get_balance(user_id):
+        """取得單一使用者的帳本餘額"""
+        balance, _ = BlessingLedger.get_balances([user_id]).get(user_id, (0, 0))
+        return balance
+    
+    def to_dict(self):
+        """轉換為字典"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'points': self.points,
+            'reason': self.reason,
+            'checkin_id': self.checkin_id,
+            'campaign_id': self.campaign_id,
+            'created_at': self.created_at,
+        }
+    
+    def __repr__(self):
+        return f'<BlessingLedger {self.user_id} {self.points:+d}>'
\ No newline at end of file
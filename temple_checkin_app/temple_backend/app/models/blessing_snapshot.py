@@ -0,0 +1,55 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+
+# 從主 models 模組引入 db 實例
+from . import db
+
+class BlessingSnapshot(db.Model):
+    """福報值快照（每位使用者保留最新一筆，餘額 = 快照 + 之後的帳本記錄）"""
+    __tablename__ = 'blessing_snapshots'
+    
+    user_id = Column(String(36), ForeignKey('users.id'), primary_key=True)
+    balance = Column(Integer, nullable=False)
+    ledger_id = Column(Integer, nullable=False)  # 已計入快照的最後一筆帳本 id
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __init__(self, user_id, balance, ledger_id):
+        self.user_id = user_id
+        self.balance = balance
+        self.ledger_id = ledger_id
+    
+    @staticmethod
+    def take(user_ids, max_ledger_id):
+        """為一批使用者建立快照（計入 id <= max_ledger_id 的帳本記錄，不 commit），回傳更新筆數"""
+        from .blessing_ledger import BlessingLedger
+        
+        snapshots = BlessingSnapshot.__table__
+        user_ids = list(user_ids)
+        existing = dict(db.session.execute(
+            db.select(snapshots.c.user_id, snapshots.c.ledger_id).where(snapshots.c.user_id.in_(user_ids))
+        ).all())
+        
+        now = datetime.utcnow()
+        updates = []
+        inserts = []
+        for user_id, (balance, ledger_id) in BlessingLedger.get_balances(user_ids, max_ledger_id).items():
+            if user_id not in existing:
+                inserts.append({'user_id': user_id, 'balance': balance, 'ledger_id': ledger_id, 'created_at': now})
+            elif ledger_id != existing[user_id]:
+                updates.append({'_user_id': user_id, 'balance': balance, 'ledger_id': ledger_id, 'created_at': now})
+        
+        if updates:
+            db.session.execute(
+                snapshots.update().where(snapshots.c.user_id == db.bindparam('_user_id')).values(
+                    balance=db.bindparam('balance'),
+                    ledger_id=db.bindparam('ledger_id'),
+                    created_at=db.bindparam('created_at')
+                ),
+                updates
+            )
+        if inserts:
+            db.session.execute(snapshots.insert(), inserts)
+        return len(updates) + len(inserts)
+    
+    def __repr__(self):
+        return f'<BlessingSnapshot {self.user_id}={self.balance}>'
\ No newline at end of file
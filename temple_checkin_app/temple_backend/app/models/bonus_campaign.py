@@ -0,0 +1,43 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey
+
+# 從主 models 模組引入 db 實例
+from . import db
+from .serialization import serialize_fields
+
+class BonusCampaign(db.Model):
+    """福報加碼活動（活動期間打卡額外獲得福報值）"""
+    __tablename__ = 'bonus_campaigns'
+    
+    id = Column(String(36), primary_key=True)
+    name = Column(String(100), nullable=False)
+    description = Column(Text, nullable=True)
+    temple_id = Column(String(36), ForeignKey('temples.id'), nullable=True, index=True)  # 空值代表所有廟宇
+    bonus_points = Column(Integer, nullable=False)
+    starts_at = Column(DateTime, nullable=False)
+    ends_at = Column(DateTime, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, id, name, bonus_points, starts_at, ends_at, temple_id=None, description=None):
+        self.id = id
+        self.name = name
+        self.bonus_points = bonus_points
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+        self.temple_id = temple_id
+        self.description = description
+    
+    # 可輸出的欄位（fields= 參數可從中選擇），序列化函式由欄位型別產生
+    FIELDS = (
+        'id', 'name', 'description', 'temple_id', 'bonus_points', 'starts_at', 'ends_at',
+        'is_active', 'created_at', 'updated_at',
+    )
+    
+    def to_dict(self, fields=None):
+        """轉換為字典（fields 指定時只輸出這些欄位）"""
+        return serialize_fields(self, fields)
+    
+    def __repr__(self):
+        return f'<BonusCampaign {self.name}>'
\ No newline at end of file
@@ -0,0 +1,60 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.exc import IntegrityError
+
+# 從主 models 模組引入 db 實例
+from . import db
+
+class CacheGeneration(db.Model):
+    """快取世代計數器（跨 worker 快取失效用）"""
+    __tablename__ = 'cache_generations'
+    
+    name = Column(String(50), primary_key=True)
+    generation = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __init__(self, name, generation=0):
+        self.name = name
+        self.generation = generation
+    
+    @staticmethod
+    def get(name):
+        """取得目前世代（尚未建立時為 0）"""
+        return db.session.query(CacheGeneration.generation).filter(
+            CacheGeneration.name == name
+        ).scalar() or 0
+    
+    @staticmethod
+    def get_state(name):
+        """取得目前世代與最後遞增時間（尚未建立時為 (0, None)）"""
+        row = db.session.query(CacheGeneration.generation, CacheGeneration.updated_at).filter(
+            CacheGeneration.name == name
+        ).first()
+        return (row.generation, row.updated_at) if row else (0, None)
+    
+    @staticmethod
+    def bump(name):
+        """在目前交易中遞增世代，與資料異動一起 commit，回傳遞增後的世代
+        
+        世代列在 commit 前保持鎖定，世代的順序即 commit 的順序。
+        """
+        generations = CacheGeneration.__table__
+        now = datetime.utcnow()
+        result = db.session.execute(
+            generations.update().where(generations.c.name == name).values(
+                generation=generations.c.generation + 1,
+                updated_at=now
+            )
+        )
+        if result.rowcount:
+            return CacheGeneration.get(name)
+        
+        try:
+            with db.session.begin_nested():
+                db.session.execute(generations.insert().values(name=name, generation=1, updated_at=now))
+            return 1
+        except IntegrityError:
+            return CacheGeneration.bump(name)
+    
+    def __repr__(self):
+        return f'<CacheGeneration {self.name}={self.generation}>'
\ No newline at end of file
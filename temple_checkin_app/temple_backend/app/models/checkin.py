@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, JSON, Index
 
 # 從主 models 模組引入 db 實例
 from . import db
+from .serialization import serialize_fields
 
 class Checkin(db.Model):
     """打卡記錄模型"""
@@ -16,8 +17,13 @@ class Checkin(db.Model):
     checkin_time = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     notes = Column(Text, nullable=True)
     extra_data = Column(JSON, nullable=True)  # 額外資料，如GPS位置等
+    campaign_id = Column(String(36), ForeignKey('bonus_campaigns.id'), nullable=True)  # 套用的加碼活動
     
-    def __init__(self, id, user_id, temple_id, amulet_id, points_earned, notes=None, extra_data=None):
+    __table_args__ = (
+        Index('ix_checkins_user_time_id', user_id, checkin_time.desc(), id.desc()),
+    )
+    
+    def __init__(self, id, user_id, temple_id, amulet_id, points_earned, notes=None, extra_data=None, campaign_id=None):
         self.id = id
         self.user_id = user_id
         self.temple_id = temple_id
@@ -25,19 +31,53 @@ class Checkin(db.Model):
         self.points_earned = points_earned
         self.notes = notes
         self.extra_data = extra_data or {}
+        self.campaign_id = campaign_id
+    
+    @staticmethod
+    def history_query(user_id):
+        """使用者打卡歷史查詢（新到舊，id 作為同時間的次序）"""
+        return Checkin.query.filter(Checkin.user_id == user_id).order_by(
+            Checkin.checkin_time.desc(),
+            Checkin.id.desc()
+        )
+    
+    @staticmethod
+    def history_page(user_id, per_page, after=None, query=None):
+        """以 (checkin_time, id) 游標取得一頁打卡歷史，回傳 (打卡列表, 是否有下一頁)
+        
+        after 為上一頁最後一筆的 (checkin_time, id)，不使用 OFFSET 也不計算總數，
+        每一頁都只掃描 ix_checkins_user_time_id 索引上的 per_page + 1 筆。
+        query 可傳入已加上載入選項的 history_query。
+        """
+        if query is None:
+            query = Checkin.history_query(user_id)
+        if after is not None:
+            query = query.filter(db.tuple_(Checkin.checkin_time, Checkin.id) < tuple(after))
+        
+        checkins = query.limit(per_page + 1).all()
+        return checkins[:per_page], len(checkins) > per_page
     
     @staticmethod
-    def can_checkin(user_id, temple_id, hours_limit=24):
-        """檢查是否可以在該廟宇打卡（避免重複打卡）"""
-        time_limit = datetime.utcnow() - timedelta(hours=hours_limit)
+    def can_checkin(user_id, temple_id, hours_limit=None):
+        """檢查是否可以在該廟宇打卡（避免重複打卡）
+
+        hours_limit 未指定時使用廟宇設定的冷卻時數。
+        """
+        from .temple import Temple
+        from .temple_visit import TempleVisit
         
-        recent_checkin = Checkin.query.filter(
-            Checkin.user_id == user_id,
-            Checkin.temple_id == temple_id,
-            Checkin.checkin_time >= time_limit
-        ).first()
+        if hours_limit is None:
+            hours_limit = db.session.query(Temple.checkin_cooldown_hours).filter(
+                Temple.id == temple_id
+            ).scalar()
+        if hours_limit is None:
+            hours_limit = 24
         
-        return recent_checkin is None
+        last_checkin_time = TempleVisit.get_last_checkin_time(user_id, temple_id)
+        if last_checkin_time is None:
+            return True
+        
+        return last_checkin_time <= datetime.utcnow() - timedelta(hours=hours_limit)
     
     @staticmethod
     def get_user_stats(user_id):
@@ -55,7 +95,7 @@ class Checkin(db.Model):
             'total_checkins': stats.total_checkins or 0,
             'total_points': stats.total_points or 0,
             'unique_temples': stats.unique_temples or 0,
-            'last_checkin': stats.last_checkin.isoformat() if stats.last_checkin else None,
+            'last_checkin': stats.last_checkin,
         }
     
     @staticmethod
@@ -141,30 +181,84 @@ class Checkin(db.Model):
             'unique_users': stat.unique_users
         } for stat in stats]
     
-    def to_dict(self, include_relations=False):
-        """轉換為字典"""
-        data = {
-            'id': self.id,
-            'user_id': self.user_id,
-            'temple_id': self.temple_id,
-            'amulet_id': self.amulet_id,
-            'points_earned': self.points_earned,
-            'checkin_time': self.checkin_time.isoformat(),
-            'notes': self.notes,
-            'extra_data': self.extra_data or {},
-        }
-        
+    # 可輸出的欄位（fields= 參數可從中選擇），序列化函式由欄位型別產生
+    FIELDS = (
+        'id', 'user_id', 'temple_id', 'amulet_id', 'points_earned', 'checkin_time', 'notes',
+        'extra_data', 'campaign_id',
+    )
+    
+    # 需要自訂轉換的欄位
+    FIELD_GETTERS = {
+        'extra_data': lambda checkin: checkin.extra_data or {},
+    }
+    
+    # 關聯欄位名稱 -> 外鍵欄位
+    RELATIONS = {
+        'temple': 'temple_id',
+        'amulet': 'amulet_id',
+    }
+    
+    # include 區塊需要的欄位（關聯需要外鍵才能載入）
+    INCLUDE_COLUMNS = {
+        'temple': ('temple_id',),
+        'amulet': ('amulet_id',),
+    }
+    
+    def to_dict(self, include_relations=False, fields=None):
+        """轉換為字典（fields 指定時只輸出這些欄位）"""
         if include_relations:
-            # 動態引入避免循環引入
-            user = db.session.get(db.registry._class_registry['User'], self.user_id)
-            temple = db.session.get(db.registry._class_registry['Temple'], self.temple_id)
-            amulet = db.session.get(db.registry._class_registry['Amulet'], self.amulet_id)
-            
-            data['user'] = user.to_dict() if user else None
-            data['temple'] = temple.to_dict() if temple else None
-            data['amulet'] = amulet.to_dict() if amulet else None
+            return Checkin.to_dict_many([self], include_relations=True, fields=fields)[0]
+        
+        return serialize_fields(self, fields)
+    
+    @staticmethod
+    def to_dict_many(checkins, include_relations=False, fields=None, nested=None):
+        """批次轉換為字典
+        
+        include_relations 為 True 時附上廟宇與平安符，也可傳入關聯名稱的集合；
+        關聯各以一次 IN 查詢載入，查詢數不隨筆數增加；使用者即為 user_id，不另外附上。
+        nested 為關聯名稱 -> 該關聯要輸出的欄位（None 為全部）。
+        """
+        if not include_relations:
+            return [serialize_fields(checkin, fields) for checkin in checkins]
         
-        return data
+        # 依 RELATIONS 的順序輸出，鍵的順序不受傳入集合影響
+        include_relations = [name for name in Checkin.RELATIONS if include_relations is True or name in include_relations]
+        nested = nested or {}
+        
+        # 動態引入避免循環引入
+        from .temple import Temple
+        from .amulet import Amulet
+        models = {'temple': Temple, 'amulet': Amulet}
+        
+        related = {}
+        for name in include_relations:
+            key = Checkin.RELATIONS[name]
+            related[name] = (key, Checkin._load_related(
+                models[name],
+                {getattr(checkin, key) for checkin in checkins},
+                nested.get(name)
+            ))
+        
+        result = []
+        for checkin in checkins:
+            data = serialize_fields(checkin, fields)
+            for name, (key, objects) in related.items():
+                obj = objects.get(getattr(checkin, key))
+                data[name] = obj.to_dict(fields=nested.get(name)) if obj else None
+            result.append(data)
+        return result
+    
+    @staticmethod
+    def _load_related(model, ids, fields=None):
+        """以一次 IN 查詢載入關聯物件（fields 指定時只讀取這些欄位），回傳 id -> 物件"""
+        if not ids:
+            return {}
+        query = model.query.filter(model.id.in_(ids))
+        if fields is not None:
+            columns = {'id'} | {name for name in fields if name in model.__table__.c}
+            query = query.options(db.load_only(*(getattr(model, name) for name in columns)))
+        return {obj.id: obj for obj in query}
     
     def __repr__(self):
         return f'<Checkin {self.user_id} at {self.temple_id}>'
\ No newline at end of file
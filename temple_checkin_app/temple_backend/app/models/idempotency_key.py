@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary
+
+# 從主 models 模組引入 db 實例
+from . import db
+
+class IdempotencyKey(db.Model):
+    """Idempotency-Key 回應重播記錄"""
+    __tablename__ = 'idempotency_keys'
+    
+    key = Column(String(64), primary_key=True)  # 使用者、路徑與客戶端 key 的雜湊
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # None 表示處理中
+    content_type = Column(String(100), nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def __init__(self, key, request_hash, expires_at):
+        self.key = key
+        self.request_hash = request_hash
+        self.expires_at = expires_at
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} ({self.status_code})>'
\ No newline at end of file
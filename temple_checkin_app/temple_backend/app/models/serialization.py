@@ -0,0 +1,59 @@
+# 模型序列化共用工具
+from functools import lru_cache
+
+def isoformat(value):
+    """datetime 轉 ISO 字串（空值維持 None）"""
+    return value.isoformat() if value else None
+
+@lru_cache(maxsize=256)
+def compile_serializer(model, fields=None):
+    """依模型的 FIELDS 產生序列化函式（同一組欄位只產生一次）
+    
+    產生的函式直接以 dict literal 建立輸出：一般欄位直接取值、FIELD_GETTERS 中的欄位
+    呼叫自訂函式。datetime 欄位不轉換，輸出為原生 datetime，由回應編碼器轉為
+    ISO 字串（JSON）或 timestamp（二進位格式）。
+    欄位都已載入時直接讀取實例的 __dict__，略過 ORM 屬性描述器；
+    有欄位未載入或已過期時改走一般屬性存取，由 ORM 負責載入。
+    fields 為 frozenset 時只輸出（也只讀取）這些欄位。
+    """
+    getters = getattr(model, 'FIELD_GETTERS', {})
+    namespace = {}
+    fast_items = []
+    slow_items = []
+    loaded = set()
+    for name in model.FIELDS:
+        if fields is not None and name not in fields:
+            continue
+        if name in getters:
+            namespace[f'_get_{name}'] = getters[name]
+            fast = slow = f'_get_{name}(obj)'
+        else:
+            loaded.add(name)
+            fast, slow = f'state[{name!r}]', f'obj.{name}'
+        fast_items.append(f'{name!r}: {fast}')
+        slow_items.append(f'{name!r}: {slow}')
+    namespace['_loaded'] = frozenset(loaded)
+    
+    source = (
+        'def serialize(obj):\n'
+        '    state = obj.__dict__\n'
+        '    if state.keys() >= _loaded:\n'
+        '        return {' + ', '.join(fast_items) + '}\n'
+        '    return {' + ', '.join(slow_items) + '}\n'
+    )
+    exec(compile(source, f'<serializer {model.__name__}>', 'exec'), namespace)
+    return namespace['serialize']
+
+def compile_serializers(models):
+    """啟動時預先產生各模型完整欄位的序列化函式"""
+    for model in models:
+        compile_serializer(model)
+
+def serialize_fields(obj, fields=None):
+    """依欄位序列化，fields 為 None 時輸出全部欄位
+    
+    只會讀取被選到的屬性，搭配 load_only 時不會觸發延遲載入。
+    """
+    if fields is not None and not isinstance(fields, frozenset):
+        fields = frozenset(fields)
+    return compile_serializer(type(obj), fields)(obj)
\ No newline at end of file
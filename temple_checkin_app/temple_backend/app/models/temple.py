@@ -4,6 +4,7 @@ import math
 
 # 從主 models 模組引入 db 實例
 from . import db
+from .serialization import serialize_fields
 
 class Temple(db.Model):
     """廟宇模型"""
@@ -16,41 +17,41 @@ class Temple(db.Model):
     address = Column(Text, nullable=False)
     latitude = Column(Float, nullable=False, index=True)
     longitude = Column(Float, nullable=False, index=True)
+    geohash = Column(String(12), nullable=True, index=True)  # 座標的 geohash，附近查詢以前綴範圍掃描
     image_url = Column(Text, nullable=True)
     blessing_bonus = Column(Integer, default=1, nullable=False)  # 福報加成值
+    checkin_cooldown_hours = Column(Integer, default=24, nullable=False)  # 重複打卡冷卻時數
     phone = Column(String(20), nullable=True)
     website = Column(Text, nullable=True)
     opening_hours = Column(Text, nullable=True)
+    checkin_count = Column(Integer, default=0, nullable=False)  # 打卡次數（打卡時累加）
+    unique_visitors_count = Column(Integer, default=0, nullable=False)  # 獨特訪客數（打卡時累加）
     is_active = Column(Boolean, default=True, nullable=False)
+    catalog_generation = Column(Integer, nullable=True, index=True)  # 最後異動時的廟宇目錄世代（空間索引增量同步用）
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 關聯（使用字串避免循環引入）
     checkins = db.relationship('Checkin', backref='temple', lazy='dynamic', cascade='all, delete-orphan')
     
-    def __init__(self, id, name, main_deity, description, address, latitude, longitude, blessing_bonus=1):
+    def __init__(self, id, name, main_deity, description, address, latitude, longitude, blessing_bonus=1,
+                 checkin_cooldown_hours=24):
         self.id = id
         self.name = name
         self.main_deity = main_deity
         self.description = description
         self.address = address
-        self.latitude = latitude
-        self.longitude = longitude
+        self.set_location(latitude, longitude)
         self.blessing_bonus = blessing_bonus
+        self.checkin_cooldown_hours = checkin_cooldown_hours
     
     def get_checkin_count(self):
         """取得總打卡次數"""
-        from .checkin import Checkin
-        return db.session.query(db.func.count(Checkin.id)).filter(
-            Checkin.temple_id == self.id
-        ).scalar() or 0
+        return self.checkin_count or 0
     
     def get_unique_visitors_count(self):
         """取得獨特訪客數"""
-        from .checkin import Checkin
-        return db.session.query(
-            db.func.count(db.distinct(Checkin.user_id))
-        ).filter(Checkin.temple_id == self.id).scalar() or 0
+        return self.unique_visitors_count or 0
     
     def get_recent_checkins(self, limit=10):
         """取得最近的打卡記錄"""
@@ -59,28 +60,27 @@ class Temple(db.Model):
             Checkin.temple_id == self.id
         ).order_by(Checkin.checkin_time.desc()).limit(limit).all()
     
+    def set_location(self, latitude, longitude):
+        """設定座標並更新 geohash"""
+        from app.utils.geo import geohash_encode
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geohash = geohash_encode(latitude, longitude)
+    
     def calculate_distance(self, lat, lng):
-        """計算與指定座標的距離（公里）"""
-        # 使用 Haversine 公式計算距離
-        R = 6371  # 地球半徑（公里）
-        
-        lat1_rad = math.radians(self.latitude)
-        lng1_rad = math.radians(self.longitude)
-        lat2_rad = math.radians(lat)
-        lng2_rad = math.radians(lng)
-        
-        dlat = lat2_rad - lat1_rad
-        dlng = lng2_rad - lng1_rad
-        
-        a = (math.sin(dlat / 2) ** 2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        """計算與指定座標的距離（公里，Haversine）"""
+        from app.utils.geo import haversine
+        return haversine(self.latitude, self.longitude, lat, lng)
     
     @staticmethod
-    def find_nearby(latitude, longitude, radius_km=5, limit=20):
-        """尋找附近的廟宇"""
+    def find_nearby(latitude, longitude, radius_km=5, limit=20, min_radius_km=None):
+        """尋找附近的廟宇
+        
+        min_radius_km 指定時不讀取確定在此距離內的廟宇（kNN 下一頁只查詢外圈），
+        結果仍可能包含少數距離小於 min_radius_km 的廟宇，由呼叫端過濾。
+        """
+        from app.utils.geo import inner_box, nearest, outside_box
+        
         # 簡化版本：使用邊界框篩選
         lat_delta = radius_km / 111.0  # 緯度每度約111公里
         lng_delta = radius_km / (111.0 * math.cos(math.radians(latitude)))
@@ -88,20 +88,57 @@ class Temple(db.Model):
         temples = Temple.query.filter(
             Temple.is_active == True,
             Temple.latitude.between(latitude - lat_delta, latitude + lat_delta),
-            Temple.longitude.between(longitude - lng_delta, longitude + lng_delta)
+            Temple.longitude.between(longitude - lng_delta, longitude + lng_delta),
+            outside_box(Temple.latitude, Temple.longitude, inner_box(latitude, longitude, min_radius_km or 0))
         ).all()
         
-        # 計算精確距離並排序
-        temple_distances = []
-        for temple in temples:
-            distance = temple.calculate_distance(latitude, longitude)
-            if distance <= radius_km:
-                temple_distances.append((temple, distance))
+        # 一次計算所有候選的精確距離，取半徑內最近的 limit 筆
+        hits = nearest(
+            latitude, longitude,
+            [temple.latitude for temple in temples],
+            [temple.longitude for temple in temples],
+            radius_km, limit
+        )
         
-        # 按距離排序
-        temple_distances.sort(key=lambda x: x[1])
+        return [(temples[position], distance) for position, distance in hits]
+    
+    @staticmethod
+    def find_nearby_ids(latitude, longitude, radius_km=5, limit=20, min_radius_km=None):
+        """以 geohash 前綴範圍掃描尋找附近的廟宇，回傳依距離排序的 [(廟宇 id, 距離)]
+        
+        邊界框轉為少數幾個 geohash 索引範圍，只讀取候選的 id 與座標，
+        完整資料由呼叫端只讀取前 limit 筆。不需記憶體索引，多個 worker 皆可使用。
+        尚未執行 backfill-geohash 的廟宇（geohash 為 NULL）改以座標範圍比對。
+        min_radius_km 與 find_nearby 相同，整格都在此距離內的 geohash 格子不掃描。
+        """
+        from app.utils.geo import bounding_box, geohash_ranges, inner_box, nearest, outside_box
+        
+        lat_min, lat_max, lng_min, lng_max = bounding_box(latitude, longitude, radius_km)
+        skipped = inner_box(latitude, longitude, min_radius_km or 0)
+        conditions = [db.and_(
+            Temple.geohash.is_(None),
+            Temple.latitude.between(lat_min, lat_max),
+            Temple.longitude.between(lng_min, lng_max)
+        )]
+        for start, end in geohash_ranges(lat_min, lat_max, lng_min, lng_max, exclude=skipped):
+            if end is None:
+                conditions.append(Temple.geohash >= start)
+            else:
+                conditions.append(db.and_(Temple.geohash >= start, Temple.geohash < end))
+        
+        rows = db.session.query(Temple.id, Temple.latitude, Temple.longitude).filter(
+            db.or_(*conditions),
+            outside_box(Temple.latitude, Temple.longitude, skipped),
+            Temple.is_active == True
+        ).all()
         
-        return temple_distances[:limit]
+        hits = nearest(
+            latitude, longitude,
+            [row.latitude for row in rows],
+            [row.longitude for row in rows],
+            radius_km, limit
+        )
+        return [(rows[position].id, distance) for position, distance in hits]
     
     def get_popular_times(self):
         """取得熱門時段統計"""
@@ -120,104 +157,57 @@ class Temple(db.Model):
         
         return {int(hour): count for hour, count in result}
     
-    def to_dict(self, include_stats=False, user_location=None):
-        """轉換為字典"""
-        data = {
-            'id': self.id,
-            'name': self.name,
-            'main_deity': self.main_deity,
-            'description': self.description,
-            'address': self.address,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'image_url': self.image_url,
-            'blessing_bonus': self.blessing_bonus,
-            'phone': self.phone,
-            'website': self.website,
-            'opening_hours': self.opening_hours,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
-        
-        if include_stats:
-            data['stats'] = {
-                'checkin_count': self.get_checkin_count(),
-                'unique_visitors': self.get_unique_visitors_count(),
-                'popular_times': self.get_popular_times(),
-            }
-        
-        if user_location:
-            lat, lng = user_location
-            data['distance'] = round(self.calculate_distance(lat, lng), 2)
-        
-        return data
-    
-    def __repr__(self):
-        return f'<Temple {self.name}>'#緯度每度約111公里
-        lng_delta = radius_km / (111.0 * math.cos(math.radians(latitude)))
-        
-        temples = Temple.query.filter(
-            Temple.is_active == True,
-            Temple.latitude.between(latitude - lat_delta, latitude + lat_delta),
-            Temple.longitude.between(longitude - lng_delta, longitude + lng_delta)
-        ).all()
-        
-        # 計算精確距離並排序
-        temple_distances = []
-        for temple in temples:
-            distance = temple.calculate_distance(latitude, longitude)
-            if distance <= radius_km:
-                temple_distances.append((temple, distance))
-        
-        # 按距離排序
-        temple_distances.sort(key=lambda x: x[1])
-        
-        return temple_distances[:limit]
-    
-    def get_popular_times(self):
-        """取得熱門時段統計"""
+    @staticmethod
+    def get_popular_times_many(temple_ids):
+        """以一次 GROUP BY 取得多間廟宇的熱門時段，回傳 id -> {小時: 次數}"""
         from sqlalchemy import func
-        from app.models.checkin import Checkin
+        from .checkin import Checkin
         
-        # 按小時統計打卡次數
+        popular_times = {temple_id: {} for temple_id in temple_ids}
+        if not popular_times:
+            return popular_times
+        
+        hour = func.extract('hour', Checkin.checkin_time)
         result = db.session.query(
-            func.extract('hour', Checkin.checkin_time).label('hour'),
+            Checkin.temple_id,
+            hour.label('hour'),
             func.count(Checkin.id).label('count')
         ).filter(
-            Checkin.temple_id == self.id
+            Checkin.temple_id.in_(popular_times.keys())
         ).group_by(
-            func.extract('hour', Checkin.checkin_time)
+            Checkin.temple_id, hour
         ).all()
         
-        return {int(hour): count for hour, count in result}
+        for temple_id, checkin_hour, count in result:
+            popular_times[temple_id][int(checkin_hour)] = count
+        return popular_times
     
-    def to_dict(self, include_stats=False, user_location=None):
-        """轉換為字典"""
-        data = {
-            'id': self.id,
-            'name': self.name,
-            'main_deity': self.main_deity,
-            'description': self.description,
-            'address': self.address,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'image_url': self.image_url,
-            'blessing_bonus': self.blessing_bonus,
-            'phone': self.phone,
-            'website': self.website,
-            'opening_hours': self.opening_hours,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+    def get_stats(self, popular_times=None):
+        """取得統計資料（popular_times 可由 get_popular_times_many 預先取得）"""
+        return {
+            'checkin_count': self.get_checkin_count(),
+            'unique_visitors': self.get_unique_visitors_count(),
+            'popular_times': self.get_popular_times() if popular_times is None else popular_times,
         }
+    
+    # 可輸出的欄位（fields= 參數可從中選擇），序列化函式由欄位型別產生
+    FIELDS = (
+        'id', 'name', 'main_deity', 'description', 'address', 'latitude', 'longitude', 'image_url',
+        'blessing_bonus', 'checkin_cooldown_hours', 'phone', 'website', 'opening_hours',
+        'is_active', 'created_at', 'updated_at',
+    )
+    
+    # include 區塊需要的欄位
+    INCLUDE_COLUMNS = {
+        'stats': ('checkin_count', 'unique_visitors_count'),
+    }
+    
+    def to_dict(self, include_stats=False, user_location=None, fields=None):
+        """轉換為字典（fields 指定時只輸出這些欄位）"""
+        data = serialize_fields(self, fields)
         
         if include_stats:
-            data['stats'] = {
-                'checkin_count': self.get_checkin_count(),
-                'unique_visitors': self.get_unique_visitors_count(),
-                'popular_times': self.get_popular_times(),
-            }
+            data['stats'] = self.get_stats()
         
         if user_location:
             lat, lng = user_location
@@ -225,5 +215,32 @@ class Temple(db.Model):
         
         return data
     
+    @staticmethod
+    def to_dict_many(temples, include_stats=False, user_location=None, fields=None):
+        """批次轉換為字典，統計的熱門時段對整批廟宇只查詢一次，距離一次向量化計算"""
+        popular_times = {}
+        if include_stats:
+            popular_times = Temple.get_popular_times_many([temple.id for temple in temples])
+        
+        distances = None
+        if user_location:
+            from app.utils.geo import distances_from
+            lat, lng = user_location
+            distances = distances_from(
+                lat, lng,
+                [temple.latitude for temple in temples],
+                [temple.longitude for temple in temples]
+            )
+        
+        result = []
+        for index, temple in enumerate(temples):
+            data = serialize_fields(temple, fields)
+            if include_stats:
+                data['stats'] = temple.get_stats(popular_times[temple.id])
+            if distances is not None:
+                data['distance'] = round(distances[index], 2)
+            result.append(data)
+        return result
+    
     def __repr__(self):
         return f'<Temple {self.name}>'
\ No newline at end of file
@@ -0,0 +1,97 @@
+from datetime import timedelta
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy.exc import IntegrityError
+
+# 從主 models 模組引入 db 實例
+from . import db
+
+class TempleVisit(db.Model):
+    """使用者最後造訪廟宇時間（打卡冷卻用）"""
+    __tablename__ = 'temple_visits'
+    
+    user_id = Column(String(36), ForeignKey('users.id'), primary_key=True)
+    temple_id = Column(String(36), ForeignKey('temples.id'), primary_key=True)
+    last_checkin_time = Column(DateTime, nullable=False)
+    visit_count = Column(Integer, default=1, nullable=False)
+    
+    def __init__(self, user_id, temple_id, last_checkin_time, visit_count=1):
+        self.user_id = user_id
+        self.temple_id = temple_id
+        self.last_checkin_time = last_checkin_time
+        self.visit_count = visit_count
+    
+    @staticmethod
+    def get_last_checkin_time(user_id, temple_id):
+        """以主鍵取得最後打卡時間"""
+        return db.session.query(TempleVisit.last_checkin_time).filter(
+            TempleVisit.user_id == user_id,
+            TempleVisit.temple_id == temple_id
+        ).scalar()
+    
+    @staticmethod
+    def claim(user_id, temple_id, checkin_time, hours_limit, last_checkin_time=None, count=1):
+        """冷卻時間已過才更新最後造訪時間，回傳更新後的造訪次數（冷卻中為 None）
+        
+        由資料庫保證去重：同一使用者與廟宇的並行打卡只有一筆能成功，
+        不需要事先 SELECT。批次同步時 checkin_time 為該廟宇最早一筆，
+        last_checkin_time 為最晚一筆，count 為筆數。
+        回傳值等於 count 代表第一次造訪此廟宇。
+        """
+        visits = TempleVisit.__table__
+        time_limit = checkin_time - timedelta(hours=hours_limit)
+        last_checkin_time = last_checkin_time or checkin_time
+        dialect = db.session.get_bind().dialect
+        
+        if dialect.name in ('sqlite', 'postgresql') and dialect.insert_returning:
+            if dialect.name == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            
+            stmt = insert(visits).values(
+                user_id=user_id,
+                temple_id=temple_id,
+                last_checkin_time=last_checkin_time,
+                visit_count=count
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[visits.c.user_id, visits.c.temple_id],
+                set_={
+                    'last_checkin_time': stmt.excluded.last_checkin_time,
+                    'visit_count': visits.c.visit_count + stmt.excluded.visit_count,
+                },
+                where=visits.c.last_checkin_time <= time_limit
+            )
+            return db.session.execute(stmt.returning(visits.c.visit_count)).scalar()
+        
+        # 其他資料庫：條件式 UPDATE，沒有更新到再 INSERT（主鍵衝突代表仍在冷卻中）
+        result = db.session.execute(
+            visits.update().where(
+                visits.c.user_id == user_id,
+                visits.c.temple_id == temple_id,
+                visits.c.last_checkin_time <= time_limit
+            ).values(
+                last_checkin_time=last_checkin_time,
+                visit_count=visits.c.visit_count + count
+            )
+        )
+        if result.rowcount:
+            return db.session.query(TempleVisit.visit_count).filter(
+                TempleVisit.user_id == user_id,
+                TempleVisit.temple_id == temple_id
+            ).scalar()
+        
+        try:
+            with db.session.begin_nested():
+                db.session.execute(visits.insert().values(
+                    user_id=user_id,
+                    temple_id=temple_id,
+                    last_checkin_time=last_checkin_time,
+                    visit_count=count
+                ))
+            return count
+        except IntegrityError:
+            return None
+    
+    def __repr__(self):
+        return f'<TempleVisit {self.user_id} at {self.temple_id}>'
\ No newline at end of file
@@ -4,6 +4,7 @@ from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean
 
 # 從主 models 模組引入 db 實例
 from . import db
+from .serialization import serialize_fields
 
 class User(db.Model):
     """使用者模型"""
@@ -14,6 +15,8 @@ class User(db.Model):
     email = Column(String(120), unique=True, nullable=False, index=True)
     password_hash = Column(String(128), nullable=False)
     blessing_points = Column(Integer, default=0, nullable=False)
+    checkin_count = Column(Integer, default=0, nullable=False)  # 打卡次數（打卡時累加）
+    unique_temples_count = Column(Integer, default=0, nullable=False)  # 造訪過的廟宇數（打卡時累加）
     profile_image = Column(Text, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     is_admin = Column(Boolean, default=False, nullable=False)
@@ -39,13 +42,21 @@ class User(db.Model):
         """驗證密碼"""
         return check_password_hash(self.password_hash, password)
     
-    def add_blessing_points(self, points):
-        """增加福報值"""
+    def add_blessing_points(self, points, reason='adjustment'):
+        """增加福報值（同時寫入帳本）"""
+        from .blessing_ledger import BlessingLedger
+        
         self.blessing_points += points
         self.updated_at = datetime.utcnow()
+        db.session.add(BlessingLedger(self.id, points, reason))
     
     def get_blessing_level(self):
         """取得福報等級"""
+        return User.blessing_level_for(self.blessing_points)
+    
+    @staticmethod
+    def blessing_level_for(points):
+        """依福報值取得對應等級"""
         levels = [
             {'level': 1, 'name': '初心者', 'min_points': 0, 'max_points': 99},
             {'level': 2, 'name': '虔誠信徒', 'min_points': 100, 'max_points': 499},
@@ -56,46 +67,39 @@ class User(db.Model):
         ]
         
         for level in levels:
-            if level['max_points'] == -1 or self.blessing_points <= level['max_points']:
+            if level['max_points'] == -1 or points <= level['max_points']:
                 return level
         return levels[-1]
     
     def get_stats(self):
         """取得使用者統計資料"""
-        # 動態引入避免循環引入
-        from .checkin import Checkin
-        
-        total_temples = db.session.query(
-            db.func.count(db.distinct(Checkin.temple_id))
-        ).filter(Checkin.user_id == self.id).scalar() or 0
-        
-        total_checkins = db.session.query(
-            db.func.count(Checkin.id)
-        ).filter(Checkin.user_id == self.id).scalar() or 0
-        
         return {
-            'total_checkins': total_checkins,
-            'total_temples': total_temples,
+            'total_checkins': self.checkin_count or 0,
+            'total_temples': self.unique_temples_count or 0,
             'blessing_points': self.blessing_points,
             'blessing_level': self.get_blessing_level(),
             'join_date': self.created_at.strftime('%Y-%m-%d'),
         }
     
-    def to_dict(self, include_sensitive=False):
-        """轉換為字典"""
-        data = {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'blessing_points': self.blessing_points,
-            'profile_image': self.profile_image,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
+    # 可輸出的欄位（fields= 參數可從中選擇），序列化函式由欄位型別產生
+    FIELDS = (
+        'id', 'username', 'email', 'blessing_points', 'profile_image', 'is_active', 'created_at',
+        'updated_at',
+    )
+    
+    # include 區塊需要的欄位
+    INCLUDE_COLUMNS = {
+        'stats': ('blessing_points', 'checkin_count', 'unique_temples_count', 'created_at'),
+    }
+    
+    def to_dict(self, include_sensitive=False, fields=None, include_stats=None):
+        """轉換為字典（fields 指定時只輸出這些欄位；統計預設隨 include_sensitive 附上）"""
+        data = serialize_fields(self, fields)
         
         if include_sensitive:
             data['is_admin'] = self.is_admin
+        
+        if include_sensitive if include_stats is None else include_stats:
             data['stats'] = self.get_stats()
         
         return data
@@ -5,6 +5,7 @@ from .temples import temples_bp
 from .checkin import checkin_bp
 from .amulets import amulets_bp
 from .admin import admin_bp
+from .batch import batch_bp
 
 __all__ = [
     'auth_bp',
@@ -12,5 +13,6 @@ __all__ = [
     'temples_bp',
     'checkin_bp',
     'amulets_bp',
-    'admin_bp'
+    'admin_bp',
+    'batch_bp'
 ]
\ No newline at end of file
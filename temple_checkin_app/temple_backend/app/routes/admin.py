@@ -1,8 +1,14 @@
 from flask import Blueprint, request
-from app.models import db, Temple, Checkin, User
-from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, paginate_response
+from app.models import db, Temple, Checkin, User, CacheGeneration, BonusCampaign
+from app.services.temple_catalog import temple_catalog, TEMPLE_CATALOG
+from app.services.spatial_index import spatial_index
+from app.services.bonus_campaigns import bonus_campaigns, BONUS_CAMPAIGNS
+from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, paginate_response, parse_utc_datetime
+from app.utils.fieldsets import parse_fieldset, apply_fieldset
 from app.utils.auth import admin_required
-from app.utils.validators import validate_temple_data, validate_pagination_params
+from app.utils.validators import validate_temple_data, validate_campaign_data, validate_pagination_params, validate_count_mode
+from app.utils.count_cache import USERS_GENERATION
+from app.utils.metrics import collect_metrics
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -17,9 +23,15 @@ def get_all_temples():
         status = request.args.get('status', 'all')  # all, active, inactive
         
         errors, page, per_page = validate_pagination_params(page, per_page)
+        count_errors, count_mode = validate_count_mode(request.args.get('count'))
+        errors += count_errors
         if errors:
             return error_response('分頁參數錯誤', errors)
         
+        errors, fieldset = parse_fieldset(Temple, includes=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
         query = Temple.query
         
         # 狀態篩選
@@ -39,9 +51,15 @@ def get_all_temples():
                 )
             )
         
-        query = query.order_by(Temple.created_at.desc())
+        query = apply_fieldset(query.order_by(Temple.created_at.desc()), Temple, fieldset)
         
-        return paginate_response(query, page, per_page)
+        return paginate_response(
+            query, page, per_page,
+            count=count_mode,
+            count_key=TEMPLE_CATALOG,
+            fields=fieldset.fields,
+            include_stats='stats' in fieldset.include
+        )
         
     except Exception as e:
         return error_response(f'取得廟宇列表失敗: {str(e)}', status_code=500)
@@ -69,7 +87,8 @@ def create_temple():
             address=data['address'].strip(),
             latitude=float(data['latitude']),
             longitude=float(data['longitude']),
-            blessing_bonus=int(data.get('blessing_bonus', 1))
+            blessing_bonus=int(data.get('blessing_bonus', 1)),
+            checkin_cooldown_hours=int(data.get('checkin_cooldown_hours', 24))
         )
         
         # 可選欄位
@@ -83,7 +102,10 @@ def create_temple():
             temple.image_url = data['image_url'].strip()
         
         db.session.add(temple)
+        temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
         db.session.commit()
+        temple_catalog.invalidate(temple.id)
+        spatial_index.update(temple.id, temple.latitude, temple.longitude)
         
         return success_response(temple.to_dict(), '廟宇建立成功', 201)
         
@@ -113,12 +135,15 @@ def update_temple(temple_id):
             temple.description = data['description'].strip()
         if 'address' in data:
             temple.address = data['address'].strip()
-        if 'latitude' in data:
-            temple.latitude = float(data['latitude'])
-        if 'longitude' in data:
-            temple.longitude = float(data['longitude'])
+        if 'latitude' in data or 'longitude' in data:
+            temple.set_location(
+                float(data.get('latitude', temple.latitude)),
+                float(data.get('longitude', temple.longitude))
+            )
         if 'blessing_bonus' in data:
             temple.blessing_bonus = int(data['blessing_bonus'])
+        if 'checkin_cooldown_hours' in data:
+            temple.checkin_cooldown_hours = int(data['checkin_cooldown_hours'])
         if 'phone' in data:
             temple.phone = data['phone'].strip()
         if 'website' in data:
@@ -130,7 +155,10 @@ def update_temple(temple_id):
         if 'is_active' in data:
             temple.is_active = bool(data['is_active'])
         
+        temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
         db.session.commit()
+        temple_catalog.invalidate(temple_id)
+        spatial_index.update(temple_id, temple.latitude, temple.longitude, temple.is_active)
         
         return success_response(temple.to_dict(), '廟宇更新成功')
         
@@ -148,7 +176,10 @@ def delete_temple(temple_id):
             return error_response('廟宇不存在', status_code=404)
         
         temple.is_active = False
+        temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
         db.session.commit()
+        temple_catalog.invalidate(temple_id)
+        spatial_index.update(temple_id, None, None, is_active=False)
         
         return success_response(message='廟宇刪除成功')
         
@@ -156,6 +187,134 @@ def delete_temple(temple_id):
         db.session.rollback()
         return error_response(f'刪除廟宇失敗: {str(e)}', status_code=500)
 
+@admin_bp.route('/campaigns', methods=['GET'])
+@admin_required
+def get_campaigns():
+    """取得加碼活動列表"""
+    try:
+        errors, page, per_page = validate_pagination_params(
+            request.args.get('page', 1),
+            request.args.get('per_page', 20)
+        )
+        count_errors, count_mode = validate_count_mode(request.args.get('count'))
+        errors += count_errors
+        if errors:
+            return error_response('分頁參數錯誤', errors)
+        
+        errors, fieldset = parse_fieldset(BonusCampaign)
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
+        query = BonusCampaign.query.order_by(BonusCampaign.starts_at.desc())
+        query = apply_fieldset(query, BonusCampaign, fieldset)
+        
+        return paginate_response(query, page, per_page, count=count_mode, count_key=BONUS_CAMPAIGNS, fields=fieldset.fields)
+        
+    except Exception as e:
+        return error_response(f'取得加碼活動列表失敗: {str(e)}', status_code=500)
+
+@admin_bp.route('/campaigns', methods=['POST'])
+@admin_required
+def create_campaign():
+    """建立加碼活動"""
+    data, json_errors = safe_get_json()
+    if json_errors:
+        return error_response('JSON 格式錯誤', json_errors)
+    
+    validation_errors = validate_campaign_data(data)
+    if validation_errors:
+        return error_response('資料驗證失敗', validation_errors)
+    
+    try:
+        campaign = BonusCampaign(
+            id=generate_uuid(),
+            name=data['name'].strip(),
+            bonus_points=int(data['bonus_points']),
+            starts_at=parse_utc_datetime(data['starts_at']),
+            ends_at=parse_utc_datetime(data['ends_at']),
+            temple_id=data.get('temple_id') or None,
+            description=data.get('description')
+        )
+        if campaign.ends_at <= campaign.starts_at:
+            return error_response('結束時間必須晚於開始時間')
+        if campaign.temple_id and not db.session.get(Temple, campaign.temple_id):
+            return error_response('廟宇不存在', status_code=404)
+        
+        db.session.add(campaign)
+        CacheGeneration.bump(BONUS_CAMPAIGNS)
+        db.session.commit()
+        bonus_campaigns.invalidate()
+        
+        return success_response(campaign.to_dict(), '加碼活動建立成功', 201)
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'建立加碼活動失敗: {str(e)}', status_code=500)
+
+@admin_bp.route('/campaigns/<campaign_id>', methods=['PUT'])
+@admin_required
+def update_campaign(campaign_id):
+    """更新加碼活動"""
+    data, json_errors = safe_get_json()
+    if json_errors:
+        return error_response('JSON 格式錯誤', json_errors)
+    
+    validation_errors = validate_campaign_data(data, partial=True)
+    if validation_errors:
+        return error_response('資料驗證失敗', validation_errors)
+    
+    try:
+        campaign = db.session.get(BonusCampaign, campaign_id)
+        if not campaign:
+            return error_response('加碼活動不存在', status_code=404)
+        
+        if 'name' in data:
+            campaign.name = data['name'].strip()
+        if 'description' in data:
+            campaign.description = data['description']
+        if 'bonus_points' in data:
+            campaign.bonus_points = int(data['bonus_points'])
+        if 'starts_at' in data:
+            campaign.starts_at = parse_utc_datetime(data['starts_at'])
+        if 'ends_at' in data:
+            campaign.ends_at = parse_utc_datetime(data['ends_at'])
+        if 'is_active' in data:
+            campaign.is_active = bool(data['is_active'])
+        
+        if campaign.ends_at <= campaign.starts_at:
+            db.session.rollback()
+            return error_response('結束時間必須晚於開始時間')
+        
+        CacheGeneration.bump(BONUS_CAMPAIGNS)
+        db.session.commit()
+        bonus_campaigns.invalidate()
+        
+        return success_response(campaign.to_dict(), '加碼活動更新成功')
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'更新加碼活動失敗: {str(e)}', status_code=500)
+
+@admin_bp.route('/campaigns/<campaign_id>', methods=['DELETE'])
+@admin_required
+def delete_campaign(campaign_id):
+    """停用加碼活動（軟刪除，已發放的福報值不受影響）"""
+    try:
+        campaign = db.session.get(BonusCampaign, campaign_id)
+        if not campaign:
+            return error_response('加碼活動不存在', status_code=404)
+        
+        campaign.is_active = False
+        CacheGeneration.bump(BONUS_CAMPAIGNS)
+        db.session.commit()
+        bonus_campaigns.invalidate()
+        
+        return success_response(message='加碼活動已停用')
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'停用加碼活動失敗: {str(e)}', status_code=500)
+
 @admin_bp.route('/stats', methods=['GET'])
 @admin_required
 def get_admin_stats():
@@ -196,6 +355,12 @@ def get_admin_stats():
     except Exception as e:
         return error_response(f'取得統計資料失敗: {str(e)}', status_code=500)
 
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """取得快取與寫入緩衝等執行期統計"""
+    return success_response(collect_metrics())
+
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_all_users():
@@ -206,9 +371,15 @@ def get_all_users():
         search = request.args.get('search', '')
         
         errors, page, per_page = validate_pagination_params(page, per_page)
+        count_errors, count_mode = validate_count_mode(request.args.get('count'))
+        errors += count_errors
         if errors:
             return error_response('分頁參數錯誤', errors)
         
+        errors, fieldset = parse_fieldset(User, includes=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
         query = User.query
         
         # 搜尋功能
@@ -221,9 +392,15 @@ def get_all_users():
                 )
             )
         
-        query = query.order_by(User.created_at.desc())
+        query = apply_fieldset(query.order_by(User.created_at.desc()), User, fieldset)
         
-        return paginate_response(query, page, per_page)
+        return paginate_response(
+            query, page, per_page,
+            count=count_mode,
+            count_key=USERS_GENERATION,
+            fields=fieldset.fields,
+            include_stats='stats' in fieldset.include
+        )
         
     except Exception as e:
         return error_response(f'取得使用者列表失敗: {str(e)}', status_code=500)
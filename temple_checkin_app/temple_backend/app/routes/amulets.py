@@ -1,7 +1,10 @@
 from flask import Blueprint
-from app.models import db, Amulet
-from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, generate_amulet_uid
+from app.models import db, Amulet, CacheGeneration
+from app.services.amulet_resolver import amulet_resolver, AMULETS
+from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, generate_amulet_uid, normalize_amulet_uid
 from app.utils.auth import active_user_required
+from app.utils.fieldsets import parse_fieldset, apply_fieldset
+from app.utils.idempotency import idempotent
 from app.utils.validators import validate_amulet_data
 
 amulets_bp = Blueprint('amulets', __name__, url_prefix='/api/amulets')
@@ -11,8 +14,15 @@ amulets_bp = Blueprint('amulets', __name__, url_prefix='/api/amulets')
 def get_amulets(current_user):
     """取得使用者的平安符列表"""
     try:
-        amulets = current_user.amulets.filter_by(is_active=True).all()
-        amulets_data = [amulet.to_dict(include_stats=True) for amulet in amulets]
+        errors, fieldset = parse_fieldset(Amulet, includes=('stats',), default_include=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
+        query = apply_fieldset(current_user.amulets.filter_by(is_active=True), Amulet, fieldset)
+        amulets_data = [
+            amulet.to_dict(include_stats='stats' in fieldset.include, fields=fieldset.fields)
+            for amulet in query
+        ]
         
         return success_response(amulets_data)
         
@@ -20,6 +30,7 @@ def get_amulets(current_user):
         return error_response(f'取得平安符列表失敗: {str(e)}', status_code=500)
 
 @amulets_bp.route('', methods=['POST'])
+@idempotent
 @active_user_required
 def create_amulet(current_user):
     """建立新的平安符"""
@@ -34,11 +45,11 @@ def create_amulet(current_user):
     
     name = data['name'].strip()
     description = data.get('description', '').strip()
-    uid = data.get('uid', generate_amulet_uid()).strip()
+    uid = normalize_amulet_uid(data.get('uid', generate_amulet_uid()))
     
     try:
         # 檢查 UID 是否已存在
-        if Amulet.query.filter_by(uid=uid).first():
+        if amulet_resolver.is_taken(uid):
             return error_response('此 UID 已被使用')
         
         # 建立平安符
@@ -55,7 +66,9 @@ def create_amulet(current_user):
             amulet.image_url = data['image_url']
         
         db.session.add(amulet)
+        CacheGeneration.bump(AMULETS)
         db.session.commit()
+        amulet_resolver.invalidate(uid)
         
         return success_response(amulet.to_dict(), '平安符建立成功', 201)
         
@@ -90,7 +103,9 @@ def update_amulet(current_user, amulet_id):
         if 'image_url' in data:
             amulet.image_url = data['image_url']
         
+        CacheGeneration.bump(AMULETS)
         db.session.commit()
+        amulet_resolver.invalidate(amulet.uid)
         
         return success_response(amulet.to_dict(), '平安符更新成功')
         
@@ -110,7 +125,9 @@ def delete_amulet(current_user, amulet_id):
         
         # 軟刪除
         amulet.is_active = False
+        CacheGeneration.bump(AMULETS)
         db.session.commit()
+        amulet_resolver.invalidate(amulet.uid)
         
         return success_response(message='平安符刪除成功')
         
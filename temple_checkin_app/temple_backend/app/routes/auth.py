@@ -1,7 +1,12 @@
 from flask import Blueprint, request
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
-from app.models import db, User, Amulet
-from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, generate_amulet_uid
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, get_jwt
+from app.models import db, User, Amulet, CacheGeneration
+from app.services.amulet_resolver import amulet_resolver, AMULETS
+from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, generate_amulet_uid, normalize_amulet_uid
+from app.utils.auth import jwt_required, load_user
+from app.utils.fieldsets import parse_fieldset
+from app.utils.count_cache import USERS_GENERATION
+from app.utils.idempotency import idempotent
 from app.utils.validators import validate_username, validate_email_format, validate_password
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -9,7 +14,20 @@ auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 # 用於儲存撤銷的 token（實際應用中應使用 Redis）
 revoked_tokens = set()
 
+def _strip_tokens(payload):
+    """註冊回應保存於 idempotency_keys 前移除 token"""
+    payload['data'] = {key: value for key, value in payload['data'].items() if key not in ('access_token', 'refresh_token')}
+    return payload
+
+def _issue_tokens(payload):
+    """重播註冊回應時為該使用者簽發新的 token"""
+    user_id = payload['data']['user']['id']
+    payload['data']['access_token'] = create_access_token(identity=user_id)
+    payload['data']['refresh_token'] = create_refresh_token(identity=user_id)
+    return payload
+
 @auth_bp.route('/register', methods=['POST'])
+@idempotent(redact=_strip_tokens, restore=_issue_tokens)
 def register():
     """使用者註冊"""
     data, json_errors = safe_get_json()
@@ -60,6 +78,7 @@ def register():
         )
         
         db.session.add(user)
+        CacheGeneration.bump(USERS_GENERATION)  # 讓快取的使用者總數失效
         db.session.commit()
         
         # 生成 JWT token
@@ -80,6 +99,7 @@ def register():
         return error_response(f'註冊失敗: {str(e)}', status_code=500)
 
 @auth_bp.route('/bind-amulet', methods=['POST'])
+@idempotent
 @jwt_required()
 def bind_amulet():
     """綁定平安符"""
@@ -89,7 +109,7 @@ def bind_amulet():
     
     # 獲取當前用戶
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_user(current_user_id)
     if not user:
         return error_response('用戶不存在', status_code=404)
     
@@ -97,12 +117,11 @@ def bind_amulet():
     if 'amulet_uid' not in data or not data['amulet_uid']:
         return error_response('平安符 UID 為必填欄位')
     
-    amulet_uid = data['amulet_uid'].strip().upper()
+    amulet_uid = normalize_amulet_uid(data['amulet_uid'])
     
     try:
         # 檢查平安符 UID 是否已被綁定
-        existing_amulet = Amulet.query.filter_by(uid=amulet_uid).first()
-        if existing_amulet:
+        if amulet_resolver.is_taken(amulet_uid):
             return error_response('此平安符已被綁定')
         
         # 創建新的平安符綁定
@@ -116,7 +135,9 @@ def bind_amulet():
         )
         
         db.session.add(amulet)
+        CacheGeneration.bump(AMULETS)
         db.session.commit()
+        amulet_resolver.invalidate(amulet_uid)
         
         response_data = {
             'amulet': amulet.to_dict(),
@@ -143,7 +164,9 @@ def unbind_amulet(amulet_id):
         
         # 軟刪除（設為不活躍）而不是真正刪除
         amulet.is_active = False
+        CacheGeneration.bump(AMULETS)
         db.session.commit()
+        amulet_resolver.invalidate(amulet.uid)
         
         return success_response(message='平安符解綁成功')
         
@@ -200,7 +223,7 @@ def refresh():
     """刷新 access token"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = load_user(current_user_id)
         
         if not user or not user.is_active:
             return error_response('使用者不存在或已被停用', status_code=404)
@@ -233,22 +256,31 @@ def logout():
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    """取得當前使用者資訊"""
+    """取得當前使用者資訊（fields= 作用於使用者；include=stats,amulets）"""
     try:
+        errors, fieldset = parse_fieldset(User, includes=('stats', 'amulets'), default_include=('stats', 'amulets'))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = load_user(current_user_id)
         
         if not user:
             return error_response('使用者不存在', status_code=404)
         
-        # 取得使用者的平安符
-        amulets = Amulet.query.filter_by(user_id=user.id, is_active=True).all()
-        
         response_data = {
-            'user': user.to_dict(include_sensitive=True),
-            'amulets': [amulet.to_dict(include_stats=True) for amulet in amulets]
+            'user': user.to_dict(
+                include_sensitive=True,
+                fields=fieldset.fields,
+                include_stats='stats' in fieldset.include
+            ),
         }
         
+        # 取得使用者的平安符
+        if 'amulets' in fieldset.include:
+            amulets = Amulet.query.filter_by(user_id=user.id, is_active=True).all()
+            response_data['amulets'] = [amulet.to_dict(include_stats=True) for amulet in amulets]
+        
         return success_response(response_data)
         
     except Exception as e:
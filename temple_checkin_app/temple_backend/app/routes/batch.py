@@ -0,0 +1,32 @@
+from flask import Blueprint
+from app.services.batch_dispatcher import batch_dispatcher
+from app.utils.auth import jwt_required, batch_identity
+from app.utils.helpers import success_response, error_response, safe_get_json
+from app.utils.validators import validate_batch_requests
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/api/batch')
+
+@batch_bp.route('', methods=['POST'])
+@jwt_required(optional=True)
+def batch():
+    """批次執行多個 API 請求，減少行動網路下的往返次數
+    
+    body 為 {"requests": [{"method": "GET", "path": "/api/auth/me", "body": {...}, "headers": {...}}],
+    "parallel": false}；Authorization 等標頭沿用外層請求，Token 無效時整批直接回 401。
+    外層 Token 只驗證一次，沿用同一 Token 的子請求直接使用驗證結果與已載入的使用者。
+    回應的 responses 依序為各子請求的 {status, headers, body}，子請求失敗不影響其他子請求。
+    """
+    data, json_errors = safe_get_json()
+    if json_errors:
+        return error_response('JSON 格式錯誤', json_errors)
+    
+    errors = validate_batch_requests(data, batch_dispatcher.max_requests)
+    if errors:
+        return error_response('批次請求格式錯誤', errors)
+    
+    try:
+        responses = batch_dispatcher.dispatch(data['requests'], parallel=bool(data.get('parallel')), identity=batch_identity())
+        return success_response({'responses': responses})
+    
+    except Exception as e:
+        return error_response(f'批次請求失敗: {str(e)}', status_code=500)
\ No newline at end of file
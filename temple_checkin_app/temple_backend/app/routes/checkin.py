@@ -1,12 +1,19 @@
-from flask import Blueprint, request
-from app.models import db, Checkin, Temple, Amulet, User
-from app.utils.helpers import success_response, error_response, safe_get_json, generate_uuid, calculate_points
+from datetime import datetime
+from flask import Blueprint, request, current_app, stream_with_context
+from app.models import db, Checkin, Temple, Amulet
+from app.services.checkin_service import CheckinError, perform_checkin, perform_batch_checkin
+from app.services.checkin_writer import checkin_writer
+from app.services.checkin_export import EXPORT_FORMATS, iter_checkin_export
+from app.utils.helpers import success_response, error_response, safe_get_json, encode_cursor, decode_cursor
 from app.utils.auth import active_user_required
-from app.utils.validators import validate_checkin_data
+from app.utils.fieldsets import parse_fieldset, apply_fieldset
+from app.utils.idempotency import idempotent
+from app.utils.validators import validate_checkin_data, validate_batch_checkin_data, validate_pagination_params
 
 checkin_bp = Blueprint('checkin', __name__, url_prefix='/api/checkin')
 
 @checkin_bp.route('', methods=['POST'])
+@idempotent
 @active_user_required
 def create_checkin(current_user):
     """建立打卡記錄"""
@@ -25,75 +32,94 @@ def create_checkin(current_user):
     extra_data = data.get('extra_data', {})  # 改為 extra_data
     
     try:
-        # 檢查廟宇是否存在
-        temple = Temple.query.get(temple_id)
-        if not temple or not temple.is_active:
-            return error_response('廟宇不存在或已停用', status_code=404)
-        
-        # 檢查平安符是否存在且屬於當前使用者
-        amulet = Amulet.query.filter_by(uid=amulet_uid, user_id=current_user.id, is_active=True).first()
-        if not amulet:
-            return error_response('平安符不存在或不屬於您', status_code=404)
-        
-        # 檢查是否可以打卡（避免重複打卡）
-        if not Checkin.can_checkin(current_user.id, temple_id):
-            return error_response('您在24小時內已在此廟宇打卡過了', status_code=400)
-        
-        # 計算獲得的福報值
-        base_points = 1
-        points_earned = calculate_points(base_points, temple.blessing_bonus)
-        
-        # 建立打卡記錄
-        checkin_id = generate_uuid()
-        checkin = Checkin(
-            id=checkin_id,
-            user_id=current_user.id,
-            temple_id=temple_id,
-            amulet_id=amulet.id,
-            points_earned=points_earned,
-            notes=notes,
-            extra_data=extra_data  # 改為 extra_data
-        )
-        
-        # 更新使用者福報值
-        current_user.add_blessing_points(points_earned)
-        
-        db.session.add(checkin)
-        db.session.commit()
-        
-        response_data = {
-            'checkin': checkin.to_dict(include_relations=True),
-            'points_earned': points_earned,
-            'total_blessing_points': current_user.blessing_points,
-            'blessing_level': current_user.get_blessing_level()
-        }
+        # 啟用寫入緩衝時只同步驗證並受理，資料庫寫入由背景批次完成
+        if checkin_writer.enabled:
+            response_data = checkin_writer.submit(current_user, temple_id, amulet_uid, notes, extra_data)
+            return success_response(response_data, '打卡成功！', 202)
         
+        response_data = perform_checkin(current_user, temple_id, amulet_uid, notes, extra_data)
         return success_response(response_data, '打卡成功！', 201)
         
+    except CheckinError as e:
+        return error_response(e.message, status_code=e.status_code)
     except Exception as e:
         db.session.rollback()
         return error_response(f'打卡失敗: {str(e)}', status_code=500)
 
+@checkin_bp.route('/batch', methods=['POST'])
+@idempotent
+@active_user_required
+def create_batch_checkin(current_user):
+    """同步離線打卡記錄"""
+    data, json_errors = safe_get_json()
+    if json_errors:
+        return error_response('JSON 格式錯誤', json_errors)
+    
+    # 驗證資料
+    validation_errors = validate_batch_checkin_data(data, current_app.config['CHECKIN_BATCH_MAX_ITEMS'])
+    if validation_errors:
+        return error_response('資料驗證失敗', validation_errors)
+    
+    try:
+        response_data = perform_batch_checkin(
+            current_user,
+            data['checkins'],
+            max_age_days=current_app.config['CHECKIN_BATCH_MAX_AGE_DAYS'],
+            clock_skew_seconds=current_app.config['CHECKIN_CLOCK_SKEW_SECONDS']
+        )
+        return success_response(response_data, '同步完成')
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'同步打卡失敗: {str(e)}', status_code=500)
+
 @checkin_bp.route('/history', methods=['GET'])
 @active_user_required
 def get_checkin_history(current_user):
-    """取得打卡歷史記錄"""
+    """取得打卡歷史記錄
+    
+    帶 cursor 參數（第一頁為空字串）時使用 (checkin_time, id) 游標分頁，
+    不做 OFFSET 掃描與 COUNT(*)；未帶時維持原本的頁碼分頁。
+    兩種模式都會回傳 next_cursor，方便客戶端切換。
+    支援 fields=（可用 temple.name 這類關聯欄位）與 include=temple,amulet。
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        query = Checkin.query.filter_by(user_id=current_user.id).order_by(Checkin.checkin_time.desc())
-        
-        paginated = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        checkins_data = []
-        for checkin in paginated.items:
-            checkin_dict = checkin.to_dict(include_relations=True)
-            checkins_data.append(checkin_dict)
-        
-        response_data = {
-            'checkins': checkins_data,
-            'pagination': {
+        errors, page, per_page = validate_pagination_params(
+            request.args.get('page', 1),
+            request.args.get('per_page', 20)
+        )
+        if errors:
+            return error_response('分頁參數錯誤', errors)
+        
+        errors, fieldset = parse_fieldset(
+            Checkin,
+            includes=('temple', 'amulet'),
+            default_include=('temple', 'amulet'),
+            relations={'temple': Temple, 'amulet': Amulet}
+        )
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
+        # 游標需要 checkin_time 與 id
+        query = apply_fieldset(Checkin.history_query(current_user.id), Checkin, fieldset, required=('checkin_time',))
+        
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            after = None
+            if cursor:
+                after = _decode_history_cursor(cursor)
+                if after is None:
+                    return error_response('分頁游標格式不正確')
+            
+            checkins, has_next = Checkin.history_page(current_user.id, per_page, after, query)
+            pagination = {
+                'per_page': per_page,
+                'has_next': has_next,
+            }
+        else:
+            paginated = query.paginate(page=page, per_page=per_page, error_out=False)
+            checkins, has_next = paginated.items, paginated.has_next
+            pagination = {
                 'page': paginated.page,
                 'per_page': paginated.per_page,
                 'total': paginated.total,
@@ -101,6 +127,18 @@ def get_checkin_history(current_user):
                 'has_prev': paginated.has_prev,
                 'has_next': paginated.has_next,
             }
+        
+        last = checkins[-1] if checkins and has_next else None
+        pagination['next_cursor'] = encode_cursor(last.checkin_time, last.id) if last else None
+        
+        response_data = {
+            'checkins': Checkin.to_dict_many(
+                checkins,
+                include_relations=fieldset.include,
+                fields=fieldset.fields,
+                nested=fieldset.nested
+            ),
+            'pagination': pagination,
         }
         
         return success_response(response_data)
@@ -108,6 +146,23 @@ def get_checkin_history(current_user):
     except Exception as e:
         return error_response(f'取得打卡歷史失敗: {str(e)}', status_code=500)
 
+@checkin_bp.route('/export', methods=['GET'])
+@active_user_required
+def export_checkins(current_user):
+    """匯出完整打卡記錄（format=ndjson|csv，串流回應）"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return error_response('不支援的匯出格式', [f'format 必須是 {" 或 ".join(EXPORT_FORMATS)}'])
+    
+    content_type, extension = EXPORT_FORMATS[export_format]
+    chunks = iter_checkin_export(current_user.id, export_format, current_app.config['CHECKIN_EXPORT_CHUNK_SIZE'])
+    
+    response = current_app.response_class(stream_with_context(chunks), content_type=content_type)
+    filename = f'checkins-{datetime.utcnow():%Y%m%d}.{extension}'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # 反向代理不要緩衝，第一批資料立即送出
+    return response
+
 @checkin_bp.route('/stats', methods=['GET'])
 @active_user_required
 def get_checkin_stats(current_user):
@@ -122,4 +177,16 @@ def get_checkin_stats(current_user):
         return success_response(stats)
         
     except Exception as e:
-        return error_response(f'取得統計資料失敗: {str(e)}', status_code=500)
\ No newline at end of file
+        return error_response(f'取得統計資料失敗: {str(e)}', status_code=500)
+
+def _decode_history_cursor(cursor):
+    """解碼打卡歷史游標為 (checkin_time, id)"""
+    values = decode_cursor(cursor, 2)
+    if values is None:
+        return None
+    
+    checkin_time, checkin_id = values
+    try:
+        return datetime.fromisoformat(checkin_time), str(checkin_id)
+    except (ValueError, TypeError):
+        return None
\ No newline at end of file
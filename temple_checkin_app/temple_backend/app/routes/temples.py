@@ -1,22 +1,64 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, current_app
 from app.models import db, Temple
-from app.utils.helpers import success_response, error_response, paginate_response
-from app.utils.validators import validate_pagination_params
+from app.services.temple_catalog import temple_catalog, TEMPLE_CATALOG
+from app.services.spatial_index import spatial_index, after_cursor, KNN_INITIAL_RADIUS_KM, KNN_MAX_RADIUS_KM, KNN_SKIP_RATIO
+from app.utils.helpers import success_response, error_response, paginate_response, safe_get_json, encode_cursor, decode_cursor
+from app.utils.fieldsets import parse_fieldset, apply_fieldset
+from app.utils.conditional import make_etag, not_modified_response, set_validators
+from app.utils.geo import distance_matrix
+from app.utils.validators import validate_pagination_params, validate_count_mode, validate_id_list, validate_points, validate_bbox
 
 temples_bp = Blueprint('temples', __name__, url_prefix='/api/temples')
 
+# kNN 模式每頁最多筆數
+KNN_MAX_K = 100
+
+# 地圖最大縮放層級
+VIEWPORT_MAX_ZOOM = 22
+
+# 計算距離需要的欄位（fields 未包含時仍需讀取）
+LOCATION_COLUMNS = ('latitude', 'longitude')
+
+def _parse_user_location():
+    """由 lat、lng 參數取得使用者位置，未提供或格式錯誤時回傳 None"""
+    user_lat = request.args.get('lat')
+    user_lng = request.args.get('lng')
+    if not user_lat or not user_lng:
+        return None
+    
+    try:
+        return float(user_lat), float(user_lng)
+    except ValueError:
+        return None
+
 @temples_bp.route('', methods=['GET'])
 def get_temples():
-    """取得廟宇列表"""
+    """取得廟宇列表
+    
+    支援 If-None-Match / If-Modified-Since：廟宇只會由管理員異動（會遞增目錄世代），
+    ETag 由目錄世代與查詢參數產生，未變更時回 304 且不讀取廟宇資料；
+    include=stats 時另以打卡次數總和區分版本，且不提供 Last-Modified。
+    帶 ids=a,b,c 時改為依 id 批次取得（見 _get_temples_by_ids）；
+    帶 lat、lng 時每筆附上 distance（整頁一次計算）。
+    """
+    if 'ids' in request.args:
+        return _get_temples_by_ids(request.args.get('ids'), conditional=True)
+    
     try:
         page = request.args.get('page', 1)
         per_page = request.args.get('per_page', 20)
         search = request.args.get('search', '')
         
         errors, page, per_page = validate_pagination_params(page, per_page)
+        count_errors, count_mode = validate_count_mode(request.args.get('count'))
+        errors += count_errors
         if errors:
             return error_response('分頁參數錯誤', errors)
         
+        errors, fieldset = parse_fieldset(Temple, includes=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
         query = Temple.query.filter(Temple.is_active == True)
         
         # 搜尋功能
@@ -30,43 +72,238 @@ def get_temples():
                 )
             )
         
-        query = query.order_by(Temple.created_at.desc())
+        include_stats = 'stats' in fieldset.include
+        generation, last_modified = temple_catalog.version()
+        checkin_total = None
+        if include_stats:
+            checkin_total = query.with_entities(db.func.sum(Temple.checkin_count)).scalar()
+            last_modified = None
         
-        return paginate_response(query, page, per_page)
+        etag = make_etag('temples', generation, checkin_total, request.query_string.decode('utf-8'))
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        user_location = _parse_user_location()
+        query = apply_fieldset(
+            query.order_by(Temple.created_at.desc()), Temple, fieldset,
+            required=LOCATION_COLUMNS if user_location else ()
+        )
+        
+        response, status_code = paginate_response(
+            query, page, per_page,
+            count=count_mode,
+            count_key=TEMPLE_CATALOG,
+            fields=fieldset.fields,
+            include_stats=include_stats,
+            user_location=user_location
+        )
+        if status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response, status_code
+        
+    except Exception as e:
+        return error_response(f'取得廟宇列表失敗: {str(e)}', status_code=500)
+
+@temples_bp.route('/lookup', methods=['POST'])
+def lookup_temples():
+    """依 id 批次取得廟宇（id 過多放不進網址時使用，body 為 {"ids": [...]}）"""
+    data, json_errors = safe_get_json()
+    if json_errors:
+        return error_response('JSON 格式錯誤', json_errors)
+    
+    return _get_temples_by_ids(data.get('ids'))
+
+@temples_bp.route('/distances', methods=['POST'])
+def get_temple_distances():
+    """計算多個座標到多間廟宇的距離（公里）
+    
+    body 為 {"points": [[lat, lng], ...], "temple_ids": [...]}；廟宇座標取自目錄快取，
+    整個矩陣一次向量化計算。distances[i][j] 為第 i 個座標到 temple_ids[j] 的距離，
+    不存在或已停用的廟宇列在 missing。
+    """
+    data, json_errors = safe_get_json()
+    if json_errors:
+        return error_response('JSON 格式錯誤', json_errors)
+    
+    try:
+        errors, points = validate_points(data.get('points'), current_app.config['DISTANCE_MAX_POINTS'])
+        id_errors, ids = validate_id_list(data.get('temple_ids'), current_app.config['DISTANCE_MAX_TEMPLES'])
+        errors += id_errors
+        if errors:
+            return error_response('參數錯誤', errors)
+        
+        entries = temple_catalog.get_many(ids)
+        active = {temple_id: entry for temple_id, entry in entries.items() if entry and entry.is_active}
+        found = [active[temple_id] for temple_id in ids if temple_id in active]
+        matrix = distance_matrix(
+            points,
+            [entry.latitude for entry in found],
+            [entry.longitude for entry in found]
+        )
+        
+        return success_response({
+            'temple_ids': [entry.id for entry in found],
+            'distances': [[round(distance, 3) for distance in row] for row in matrix],
+            'missing': [temple_id for temple_id in ids if temple_id not in active],
+        })
+        
+    except Exception as e:
+        return error_response(f'計算距離失敗: {str(e)}', status_code=500)
+
+@temples_bp.route('/viewport', methods=['GET'])
+def get_viewport_temples():
+    """地圖視窗內的廟宇
+    
+    bbox 為「西經,南緯,東經,北緯」，zoom 為地圖縮放層級。低於 VIEWPORT_CLUSTER_MAX_ZOOM
+    時回傳網格群集 [緯度, 經度, 數量]，以上回傳精簡的廟宇 [id, 緯度, 經度]
+    （超過 VIEWPORT_MAX_POINTS 筆時仍回傳群集）。資料來自記憶體索引，不讀取廟宇資料表；
+    ETag 與列表相同由目錄世代與查詢參數產生。
+    """
+    try:
+        errors, bbox = validate_bbox(request.args.get('bbox'))
+        try:
+            zoom = int(request.args.get('zoom', ''))
+            if not 0 <= zoom <= VIEWPORT_MAX_ZOOM:
+                errors.append(f'zoom 必須在 0 到 {VIEWPORT_MAX_ZOOM} 之間')
+        except ValueError:
+            errors.append('zoom 必須為整數')
+        if errors:
+            return error_response('參數錯誤', errors)
+        
+        generation, last_modified = temple_catalog.version()
+        etag = make_etag('viewport', generation, request.query_string.decode('utf-8'))
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        south, north, west, east = bbox
+        kind, zoom, items = spatial_index.viewport(
+            south, north, west, east, zoom,
+            current_app.config['VIEWPORT_MAX_POINTS']
+        )
+        if kind == 'clusters':
+            items = [[round(lat, 6), round(lng, 6), count] for lat, lng, count in items]
+        else:
+            items = [[temple_id, lat, lng] for temple_id, lat, lng in items]
+        
+        response, status_code = success_response({'type': kind, 'zoom': zoom, 'items': items})
+        set_validators(response, etag, last_modified)
+        return response, status_code
+        
+    except Exception as e:
+        return error_response(f'取得地圖範圍廟宇失敗: {str(e)}', status_code=500)
+
+def _get_temples_by_ids(ids, conditional=False):
+    """依 id 批次取得廟宇
+    
+    所有廟宇以一次 IN 查詢讀取，include=stats 的熱門時段也只多一次 GROUP BY；
+    items 依請求的 id 順序排列，不存在或已停用的 id 列在 missing。
+    conditional 為 True 時（GET）與列表相同方式提供 ETag / Last-Modified。
+    """
+    try:
+        errors, ids = validate_id_list(ids, current_app.config['MULTI_GET_MAX_IDS'])
+        if errors:
+            return error_response('ids 參數錯誤', errors)
+        
+        errors, fieldset = parse_fieldset(Temple, includes=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
+        query = Temple.query.filter(Temple.id.in_(ids), Temple.is_active == True)
+        include_stats = 'stats' in fieldset.include
+        
+        etag = last_modified = None
+        if conditional:
+            generation, last_modified = temple_catalog.version()
+            checkin_total = None
+            if include_stats:
+                checkin_total = query.with_entities(db.func.sum(Temple.checkin_count)).scalar()
+                last_modified = None
+            
+            etag = make_etag('temples', generation, checkin_total, request.query_string.decode('utf-8'))
+            not_modified = not_modified_response(etag, last_modified)
+            if not_modified:
+                return not_modified
+        
+        user_location = _parse_user_location()
+        query = apply_fieldset(query, Temple, fieldset, required=LOCATION_COLUMNS if user_location else ())
+        temples = {temple.id: temple for temple in query}
+        found = [temples[temple_id] for temple_id in ids if temple_id in temples]
+        
+        response, status_code = success_response({
+            'items': Temple.to_dict_many(
+                found,
+                include_stats=include_stats,
+                user_location=user_location,
+                fields=fieldset.fields
+            ),
+            'missing': [temple_id for temple_id in ids if temple_id not in temples],
+        })
+        if etag:
+            set_validators(response, etag, last_modified)
+        return response, status_code
         
     except Exception as e:
         return error_response(f'取得廟宇列表失敗: {str(e)}', status_code=500)
 
 @temples_bp.route('/<temple_id>', methods=['GET'])
 def get_temple(temple_id):
-    """取得單一廟宇詳細資訊"""
+    """取得單一廟宇詳細資訊
+    
+    ETag 由目錄世代、廟宇 updated_at 與查詢參數產生，未變更時回 304；
+    不含統計時完全由目錄快取判斷，含統計時只多讀取打卡次數一個欄位。
+    """
     try:
-        temple = Temple.query.get(temple_id)
+        errors, fieldset = parse_fieldset(Temple, includes=('stats',), default_include=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
         
-        if not temple or not temple.is_active:
+        # 先以目錄快取判斷，不存在或已停用的廟宇不查資料庫
+        entry = temple_catalog.get(temple_id)
+        if not entry or not entry.is_active:
             return error_response('廟宇不存在', status_code=404)
         
-        # 檢查是否提供使用者位置
-        user_lat = request.args.get('lat')
-        user_lng = request.args.get('lng')
-        user_location = None
+        # 含統計時以打卡次數區分版本（打卡不會更新 updated_at），也就不提供 Last-Modified
+        include_stats = 'stats' in fieldset.include
+        generation, _ = temple_catalog.version()
+        last_modified = entry.updated_at
+        checkin_count = None
+        if include_stats:
+            checkin_count = db.session.query(Temple.checkin_count).filter(Temple.id == temple_id).scalar()
+            last_modified = None
+        
+        etag = make_etag('temple', temple_id, generation, entry.updated_at, checkin_count, request.query_string.decode('utf-8'))
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
         
-        if user_lat and user_lng:
-            try:
-                user_location = (float(user_lat), float(user_lng))
-            except ValueError:
-                pass
+        temple = db.session.get(Temple, temple_id)
+        if not temple:
+            return error_response('廟宇不存在', status_code=404)
         
-        temple_data = temple.to_dict(include_stats=True, user_location=user_location)
+        # 檢查是否提供使用者位置
+        user_location = _parse_user_location()
         
-        return success_response(temple_data)
+        temple_data = temple.to_dict(
+            include_stats=include_stats,
+            user_location=user_location,
+            fields=fieldset.fields
+        )
+        
+        response, status_code = success_response(temple_data)
+        return set_validators(response, etag, last_modified), status_code
         
     except Exception as e:
         return error_response(f'取得廟宇資訊失敗: {str(e)}', status_code=500)
 
 @temples_bp.route('/nearby', methods=['GET'])
 def get_nearby_temples():
-    """取得附近的廟宇"""
+    """取得附近的廟宇
+    
+    預設為半徑查詢（radius、limit）。帶 k 而不帶 radius 時為 kNN 模式：回傳最近的 k 筆
+    與 next_cursor，以 cursor 由上一頁最後一筆的 (距離, id) 繼續往外取得下一頁。
+    """
     try:
         lat = request.args.get('lat')
         lng = request.args.get('lng')
@@ -84,15 +321,103 @@ def get_nearby_temples():
         except ValueError:
             return error_response('座標格式不正確')
         
-        nearby_temples = Temple.find_nearby(latitude, longitude, radius_km, limit_count)
+        errors, fieldset = parse_fieldset(Temple)
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
+        if 'k' in request.args and 'radius' not in request.args:
+            return _get_nearest_temples(latitude, longitude, fieldset)
         
-        temples_data = []
-        for temple, distance in nearby_temples:
-            temple_dict = temple.to_dict()
-            temple_dict['distance'] = round(distance, 2)
-            temples_data.append(temple_dict)
+        if spatial_index.backend == 'memory':
+            hits = spatial_index.nearby(latitude, longitude, radius_km, limit_count)
+        elif spatial_index.backend == 'geohash':
+            hits = Temple.find_nearby_ids(latitude, longitude, radius_km, limit_count)
+        else:
+            nearby_temples = Temple.find_nearby(latitude, longitude, radius_km, limit_count)
+            hits = [(temple.id, distance) for temple, distance in nearby_temples]
         
-        return success_response(temples_data)
+        return success_response(_hydrate_nearby(hits, fieldset))
         
     except Exception as e:
-        return error_response(f'搜尋附近廟宇失敗: {str(e)}', status_code=500)
\ No newline at end of file
+        return error_response(f'搜尋附近廟宇失敗: {str(e)}', status_code=500)
+
+def _get_nearest_temples(latitude, longitude, fieldset):
+    """kNN 模式：最近的 k 筆，游標為 (查詢座標, 距離, id)"""
+    try:
+        k = int(request.args.get('k'))
+    except (TypeError, ValueError):
+        return error_response('k 必須為整數')
+    if not 1 <= k <= KNN_MAX_K:
+        return error_response(f'k 必須在 1 到 {KNN_MAX_K} 之間')
+    
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        values = decode_cursor(cursor, 4)
+        if values is None or values[:2] != [latitude, longitude] or not isinstance(values[3], str):
+            return error_response('分頁游標格式不正確或與座標不符')
+        try:
+            after = (float(values[2]), values[3])
+        except (TypeError, ValueError):
+            return error_response('分頁游標格式不正確或與座標不符')
+    
+    # 多取一筆判斷是否有下一頁
+    hits = _nearest(latitude, longitude, k + 1, after)
+    has_next = len(hits) > k
+    hits = hits[:k]
+    
+    last = hits[-1] if has_next else None
+    return success_response({
+        'temples': _hydrate_nearby(hits, fieldset),
+        'pagination': {
+            'per_page': k,
+            'has_next': has_next,
+            'next_cursor': encode_cursor(latitude, longitude, last[1], last[0]) if last else None,
+        },
+    })
+
+def _nearest(latitude, longitude, k, after=None):
+    """依 (距離, id) 排序、接在 after 之後的 k 筆 [(廟宇 id, 距離)]
+    
+    記憶體索引由上一頁的距離往外逐格搜尋；geohash 與 sql 方式同樣由上一頁的距離
+    往外加倍搜尋半徑，每次只查詢上一個半徑之外的環狀範圍，不重新讀取前幾頁的廟宇。
+    """
+    if spatial_index.backend == 'memory':
+        return spatial_index.knn(latitude, longitude, k, after)
+    
+    inner = after[0] if after else 0.0
+    radius = inner + KNN_INITIAL_RADIUS_KM
+    candidates = {}
+    while True:
+        # 保留球面近似的誤差，與上一頁距離相同（以 id 排序）的廟宇仍會讀取
+        skipped = inner * KNN_SKIP_RATIO
+        if spatial_index.backend == 'geohash':
+            hits = Temple.find_nearby_ids(latitude, longitude, radius, None, min_radius_km=skipped)
+        else:
+            hits = [
+                (temple.id, distance)
+                for temple, distance in Temple.find_nearby(latitude, longitude, radius, None, min_radius_km=skipped)
+            ]
+        candidates.update((temple_id, distance) for temple_id, distance in hits if after_cursor(distance, temple_id, after))
+        
+        # 半徑內的廟宇都已讀取（內圈在前幾次或前幾頁）
+        if len(candidates) >= k or radius >= KNN_MAX_RADIUS_KM:
+            hits = sorted((distance, temple_id) for temple_id, distance in candidates.items())
+            return [(temple_id, distance) for distance, temple_id in hits[:k]]
+        inner = radius
+        radius *= 2
+
+def _hydrate_nearby(hits, fieldset):
+    """只讀取 [(廟宇 id, 距離)] 這幾筆的完整資料，依原順序附上距離"""
+    query = Temple.query.filter(Temple.id.in_([temple_id for temple_id, _ in hits]), Temple.is_active == True)
+    temples = {temple.id: temple for temple in apply_fieldset(query, Temple, fieldset)}
+    
+    temples_data = []
+    for temple_id, distance in hits:
+        temple = temples.get(temple_id)
+        if temple is None:
+            continue
+        temple_dict = temple.to_dict(fields=fieldset.fields)
+        temple_dict['distance'] = round(distance, 2)
+        temples_data.append(temple_dict)
+    return temples_data
\ No newline at end of file
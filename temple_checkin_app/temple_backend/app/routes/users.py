@@ -1,8 +1,10 @@
 from flask import Blueprint
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User
+from flask_jwt_extended import get_jwt_identity
+from app.models import db, User, CacheGeneration
 from app.utils.helpers import success_response, error_response, safe_get_json
-from app.utils.auth import active_user_required
+from app.utils.auth import jwt_required, active_user_required, load_user
+from app.utils.fieldsets import parse_fieldset
+from app.utils.count_cache import USERS_GENERATION
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -11,13 +13,21 @@ users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 def get_profile():
     """取得使用者個人資料"""
     try:
+        errors, fieldset = parse_fieldset(User, includes=('stats',), default_include=('stats',))
+        if errors:
+            return error_response('欄位參數錯誤', errors)
+        
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = load_user(current_user_id)
         
         if not user:
             return error_response('使用者不存在', status_code=404)
         
-        return success_response(user.to_dict(include_sensitive=True))
+        return success_response(user.to_dict(
+            include_sensitive=True,
+            fields=fieldset.fields,
+            include_stats='stats' in fieldset.include
+        ))
         
     except Exception as e:
         return error_response(f'取得個人資料失敗: {str(e)}', status_code=500)
@@ -39,6 +49,8 @@ def update_profile(current_user):
                 if User.query.filter_by(username=username).first():
                     return error_response('使用者名稱已存在')
                 current_user.username = username
+                # 使用者列表的搜尋總數會改變
+                CacheGeneration.bump(USERS_GENERATION)
         
         if 'profile_image' in data:
             current_user.profile_image = data['profile_image']
@@ -0,0 +1,21 @@
+# 服務模組初始化檔案
+from .amulet_resolver import AmuletEntry, amulet_resolver
+from .temple_catalog import TempleEntry, temple_catalog
+from .spatial_index import spatial_index
+from .bonus_campaigns import CampaignEntry, bonus_campaigns
+from .checkin_service import CheckinError, perform_checkin, perform_batch_checkin
+from .batch_dispatcher import batch_dispatcher
+
+__all__ = [
+    'AmuletEntry',
+    'amulet_resolver',
+    'TempleEntry',
+    'temple_catalog',
+    'spatial_index',
+    'CampaignEntry',
+    'bonus_campaigns',
+    'CheckinError',
+    'perform_checkin',
+    'perform_batch_checkin',
+    'batch_dispatcher',
+]
\ No newline at end of file
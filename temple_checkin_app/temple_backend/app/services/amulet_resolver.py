@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import namedtuple
+
+from app.models import db, Amulet, CacheGeneration
+from app.utils.cache import LRUCache
+from app.utils.helpers import normalize_amulet_uid
+from app.utils.metrics import register_metrics
+
+# UID 解析結果
+AmuletEntry = namedtuple('AmuletEntry', ['amulet_id', 'user_id', 'is_active', 'uid', 'name'])
+
+# cache_generations 中的名稱
+AMULETS = 'amulets'
+
+_MISSING = object()
+
+class AmuletResolver:
+    """平安符 UID 解析服務（LRU 快取，寫入時失效）
+    
+    以正規化後的 UID 快取 (amulet_id, user_id, is_active)。綁定、解綁、更新與刪除時
+    在同一交易中遞增資料庫的世代計數器，各 worker 最多每隔檢查間隔比對一次，
+    世代改變即清空快取；與廟宇目錄相同，讀取期間快取被清除時不寫入讀到的資料。
+    查無資料只快取幾秒（AMULET_MISS_TTL_SECONDS），避免不存在的 UID 每次都查資料庫。
+    
+    舊版 create_amulet 依輸入原樣保存 UID；執行 normalize-amulet-uids 之前，
+    精確比對不到的 UID 會再以 UPPER(TRIM(uid)) 比對（AMULET_UID_MATCH_LEGACY_CASE）。
+    """
+    
+    def __init__(self, app=None):
+        self.cache = LRUCache(maxsize=4096, ttl=60)
+        self.miss_ttl = 5
+        self.match_legacy_case = True
+        self.generation = None
+        self.check_interval = 1.0
+        self._checked_at = 0.0
+        self._epoch = 0  # 每次清除或移除快取時遞增
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定調整快取容量、TTL 與世代檢查間隔"""
+        self.cache.resize(app.config['AMULET_CACHE_SIZE'], app.config['AMULET_CACHE_TTL_SECONDS'])
+        self.miss_ttl = app.config['AMULET_MISS_TTL_SECONDS']
+        self.check_interval = app.config['AMULET_CACHE_CHECK_INTERVAL_MS'] / 1000.0
+        self.match_legacy_case = app.config['AMULET_UID_MATCH_LEGACY_CASE']
+        register_metrics('amulet_resolver', self.get_stats)
+    
+    def resolve(self, uid):
+        """解析單一 UID，查無資料時回傳 None"""
+        return self.resolve_many([uid]).get(normalize_amulet_uid(uid))
+    
+    def resolve_many(self, uids):
+        """以一次 IN 查詢解析多個 UID，回傳 正規化 UID -> AmuletEntry 或 None"""
+        self._sync_generation()
+        
+        results = {}
+        missing = []
+        for uid in {normalize_amulet_uid(uid) for uid in uids}:
+            entry = self.cache.get(uid, _MISSING)
+            if entry is _MISSING:
+                missing.append(uid)
+            else:
+                results[uid] = entry
+        
+        if missing:
+            epoch = self._epoch
+            found = self._query(missing)
+            with self._lock:
+                fresh = epoch == self._epoch
+                for uid in missing:
+                    entry = found.get(uid)
+                    if fresh and (entry is not None or self.miss_ttl > 0):
+                        self.cache.set(uid, entry, None if entry is not None else self.miss_ttl)
+                    results[uid] = entry
+        
+        return results
+    
+    def _query(self, uids):
+        """查詢資料庫，回傳 正規化 UID -> AmuletEntry（只含找到的 UID）"""
+        columns = (Amulet.uid, Amulet.id, Amulet.user_id, Amulet.is_active, Amulet.name)
+        rows = db.session.query(*columns).filter(Amulet.uid.in_(uids)).all()
+        found = {row.uid: AmuletEntry(row.id, row.user_id, row.is_active, row.uid, row.name) for row in rows}
+        
+        # 舊資料的大小寫或空白與正規化結果不同（無法使用索引，只查精確比對不到的 UID）
+        remaining = [uid for uid in uids if uid not in found]
+        if remaining and self.match_legacy_case:
+            legacy_uid = db.func.upper(db.func.trim(Amulet.uid))
+            rows = db.session.query(legacy_uid.label('normalized'), *columns).filter(
+                legacy_uid.in_(remaining)
+            ).order_by(Amulet.created_at, Amulet.id).all()
+            for row in rows:
+                # 正規化後重複時使用最早建立的平安符（normalize-amulet-uids 會列出）
+                found.setdefault(row.normalized, AmuletEntry(row.id, row.user_id, row.is_active, row.uid, row.name))
+        
+        return found
+    
+    def is_taken(self, uid):
+        """UID 是否已被使用（不經快取，建立與綁定前檢查）"""
+        return bool(self._query([normalize_amulet_uid(uid)]))
+    
+    def resolve_for_user(self, uid, user_id):
+        """解析屬於該使用者且啟用中的平安符"""
+        entry = self.resolve(uid)
+        if entry is None or entry.user_id != user_id or not entry.is_active:
+            return None
+        return entry
+    
+    def invalidate(self, uid=None):
+        """本 worker 的平安符異動後移除快取（其他 worker 由世代計數器處理）"""
+        self._checked_at = 0.0  # 下次存取立即讀取新的世代
+        with self._lock:
+            self._epoch += 1
+            if uid is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(normalize_amulet_uid(uid))
+    
+    def get_stats(self):
+        """取得快取統計"""
+        stats = self.cache.get_stats()
+        stats['generation'] = self.generation
+        return stats
+    
+    def _sync_generation(self):
+        """比對資料庫世代，改變時清空快取"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        
+        self._checked_at = now
+        generation = CacheGeneration.get(AMULETS)
+        if generation != self.generation:
+            with self._lock:
+                self._epoch += 1
+                self.cache.clear()
+            self.generation = generation
+
+amulet_resolver = AmuletResolver()
\ No newline at end of file
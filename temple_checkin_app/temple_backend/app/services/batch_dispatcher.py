@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from flask import current_app, request
+from sqlalchemy import event
+from werkzeug.test import EnvironBuilder
+
+from app.models import db
+from app.utils.auth import BATCH_IDENTITY_KEY
+
+# 子請求可使用的方法，只讀的子請求才能平行執行
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+READ_METHODS = ('GET',)
+
+# 由外層請求沿用到子請求的標頭
+FORWARDED_HEADERS = ('Authorization', 'Accept-Language', 'User-Agent')
+
+# 子請求回應中回傳給用戶端的標頭
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Location', 'Retry-After')
+
+class BatchDispatcher:
+    """批次請求分派
+    
+    在同一程序內以 Flask 的請求機制執行子請求，不經過網路與 WSGI 伺服器。
+    依序執行時所有子請求共用外層的應用程式 context，也就共用同一個資料庫
+    session（使用者等已載入的資料列不會重複查詢）；全部為只讀請求且要求
+    平行時，改由執行緒池執行，每個子請求使用自己的 context 與 session。
+    """
+    
+    def __init__(self, app=None):
+        self.max_requests = 20
+        self.max_workers = 4
+        self._executor = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定調整子請求上限與執行緒數"""
+        self.max_requests = app.config['BATCH_MAX_REQUESTS']
+        self.max_workers = app.config['BATCH_MAX_WORKERS']
+    
+    def dispatch(self, subrequests, parallel=False, identity=None):
+        """執行子請求，依傳入順序回傳各自的 {status, headers, body}
+        
+        identity 為外層已驗證的身分（見 app.utils.auth.batch_identity），
+        沿用外層 Token 的子請求不再重新解碼 JWT 與查詢使用者
+        """
+        app = current_app._get_current_object()
+        environs = [self._build_environ(item, identity) for item in subrequests]
+        
+        if (parallel and self.max_workers > 1 and len(environs) > 1
+                and all(environ['REQUEST_METHOD'] in READ_METHODS for environ in environs)):
+            return list(self._get_executor().map(lambda environ: self._run_isolated(app, environ), environs))
+        
+        # identity map 只弱參照物件，批次期間保留已載入的資料列，
+        # 後續子請求（例如再次讀取使用者）可直接由 session 取得
+        session = db.session()
+        loaded = []
+        
+        def keep(session, instance):
+            loaded.append(instance)
+        
+        event.listen(session, 'loaded_as_persistent', keep)
+        try:
+            return [self._run(app, environ) for environ in environs]
+        finally:
+            event.remove(session, 'loaded_as_persistent', keep)
+    
+    def _build_environ(self, item, identity=None):
+        """由子請求描述建立 WSGI environ（沿用外層的驗證標頭、驗證結果與來源位址）"""
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        headers.update(item.get('headers') or {})
+        # 子回應要嵌入批次回應中，固定使用 JSON 且不壓縮
+        headers['Accept'] = 'application/json'
+        headers.pop('Accept-Encoding', None)
+        
+        path, _, query_string = item['path'].partition('?')
+        builder = EnvironBuilder(
+            path=path,
+            query_string=query_string,
+            method=item.get('method', 'GET').upper(),
+            headers=headers,
+            json=item.get('body'),
+            environ_base={'REMOTE_ADDR': request.remote_addr, BATCH_IDENTITY_KEY: identity},
+        )
+        try:
+            return builder.get_environ()
+        finally:
+            builder.close()
+    
+    def _run(self, app, environ):
+        """在目前的應用程式 context 中執行一個子請求"""
+        with app.request_context(environ):
+            try:
+                response = app.full_dispatch_request()
+            except Exception as e:
+                db.session.rollback()
+                return {'status': 500, 'headers': {}, 'body': {'success': False, 'message': f'子請求失敗: {str(e)}'}}
+            return self._result(response)
+    
+    def _run_isolated(self, app, environ):
+        """在獨立的應用程式 context（與資料庫 session）中執行子請求，供執行緒池使用"""
+        with app.app_context():
+            return self._run(app, environ)
+    
+    def _result(self, response):
+        """將子回應轉為可嵌入批次回應的資料"""
+        if response.is_json:
+            body = response.get_json(silent=True)
+        else:
+            body = response.get_data(as_text=True) or None
+        
+        return {
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RESPONSE_HEADERS if name in response.headers},
+            'body': body,
+        }
+    
+    def _get_executor(self):
+        """延遲建立執行緒池"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch')
+        return self._executor
+
+# 全域實例
+batch_dispatcher = BatchDispatcher()
\ No newline at end of file
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import namedtuple
+
+from app.models import db, BonusCampaign, CacheGeneration
+from app.utils.metrics import register_metrics
+
+# 打卡時判斷加碼所需的活動欄位
+CampaignEntry = namedtuple('CampaignEntry', ['id', 'temple_id', 'bonus_points', 'starts_at', 'ends_at'])
+
+# cache_generations 中的名稱
+BONUS_CAMPAIGNS = 'bonus_campaigns'
+
+class BonusCampaigns:
+    """加碼活動快取
+    
+    活動數量少，整批載入啟用中的活動；管理員異動時遞增資料庫世代計數器，
+    各 worker 最多每隔檢查間隔比對一次並重新載入。
+    同時有多個活動適用時取加碼最高者（不累加）。
+    """
+    
+    def __init__(self, app=None):
+        self.campaigns = None
+        self.generation = None
+        self.check_interval = 1.0
+        self._checked_at = 0.0
+        self._epoch = 0  # 每次 invalidate 時遞增
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'applied': 0, 'reloads': 0}
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定調整世代檢查間隔"""
+        self.check_interval = app.config['BONUS_CAMPAIGN_CHECK_INTERVAL_MS'] / 1000.0
+        register_metrics('bonus_campaigns', self.get_stats)
+    
+    def best_for(self, temple_id, checkin_time):
+        """取得打卡時間適用、加碼最高的活動，沒有時回傳 None"""
+        best = None
+        for campaign in self._load():
+            if campaign.temple_id is not None and campaign.temple_id != temple_id:
+                continue
+            if not campaign.starts_at <= checkin_time < campaign.ends_at:
+                continue
+            if best is None or campaign.bonus_points > best.bonus_points:
+                best = campaign
+        
+        self._stats['lookups'] += 1
+        if best is not None:
+            self._stats['applied'] += 1
+        return best
+    
+    def invalidate(self):
+        """本 worker 的活動異動後重新載入"""
+        self._checked_at = 0.0  # 下次存取立即讀取新的世代
+        with self._lock:
+            self._epoch += 1
+            self.campaigns = None
+    
+    def get_stats(self):
+        """取得快取統計"""
+        stats = dict(self._stats)
+        stats['size'] = len(self.campaigns or ())
+        stats['generation'] = self.generation
+        return stats
+    
+    def _load(self):
+        """比對資料庫世代，必要時重新載入啟用中的活動
+        
+        讀取期間有 invalidate() 時，讀到的活動只用於這次判斷、不寫入快取。
+        """
+        epoch = self._epoch
+        campaigns = self.campaigns
+        now = time.monotonic()
+        if campaigns is not None and now - self._checked_at < self.check_interval:
+            return campaigns
+        
+        self._checked_at = now
+        generation = CacheGeneration.get(BONUS_CAMPAIGNS)
+        if campaigns is not None and generation == self.generation:
+            return campaigns
+        
+        campaigns = self._query()
+        with self._lock:
+            if epoch == self._epoch:
+                self.campaigns = campaigns
+                self.generation = generation
+            self._stats['reloads'] += 1
+        return campaigns
+    
+    def _query(self):
+        """讀取啟用中的活動"""
+        rows = db.session.query(*[getattr(BonusCampaign, field) for field in CampaignEntry._fields]).filter(
+            BonusCampaign.is_active == True
+        ).all()
+        return [CampaignEntry(*row) for row in rows]
+
+bonus_campaigns = BonusCampaigns()
\ No newline at end of file
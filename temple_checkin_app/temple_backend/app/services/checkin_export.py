@@ -0,0 +1,93 @@
+import csv
+import io
+
+from app.models import db, Checkin, Amulet
+from app.models.serialization import isoformat
+from app.services.temple_catalog import temple_catalog
+from app.utils.json_backend import json_backend
+
+# 匯出格式 -> (Content-Type, 副檔名)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+# 試算表會當作公式執行的開頭字元（CSV 公式注入）
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_COLUMNS = (
+    'id', 'checkin_time', 'temple_id', 'temple_name', 'amulet_id', 'amulet_name',
+    'points_earned', 'campaign_id', 'notes', 'extra_data',
+)
+
+def iter_checkin_export(user_id, export_format, chunk_size=1000):
+    """逐批產生使用者完整打卡記錄的匯出內容（bytes）
+    
+    以 yield_per 串流讀取（伺服器端游標），每批只保留 chunk_size 筆，
+    記憶體用量不隨打卡數增加；廟宇與平安符名稱以本次匯出的小型對照表
+    快取，每批只為新出現的 id 查詢一次。
+    """
+    query = db.select(
+        Checkin.id, Checkin.checkin_time, Checkin.temple_id, Checkin.amulet_id,
+        Checkin.points_earned, Checkin.campaign_id, Checkin.notes, Checkin.extra_data
+    ).where(Checkin.user_id == user_id).order_by(Checkin.checkin_time, Checkin.id)
+    
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    
+    temple_names = {}
+    amulet_names = {}
+    
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        # 加上 BOM 讓 Excel 正確辨識 UTF-8 中文
+        yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    
+    for rows in result.partitions():
+        _load_temple_names(temple_names, {row.temple_id for row in rows})
+        _load_amulet_names(amulet_names, {row.amulet_id for row in rows})
+        
+        if export_format == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                writer.writerow([csv_cell(value) for value in (
+                    row.id, isoformat(row.checkin_time), row.temple_id, temple_names[row.temple_id],
+                    row.amulet_id, amulet_names[row.amulet_id], row.points_earned, row.campaign_id,
+                    row.notes or '', json_backend.dumps(row.extra_data or {}).decode('utf-8'),
+                )])
+            yield buffer.getvalue().encode('utf-8')
+        else:
+            yield b''.join(json_backend.dumps({
+                'id': row.id,
+                'checkin_time': isoformat(row.checkin_time),
+                'temple_id': row.temple_id,
+                'temple_name': temple_names[row.temple_id],
+                'amulet_id': row.amulet_id,
+                'amulet_name': amulet_names[row.amulet_id],
+                'points_earned': row.points_earned,
+                'campaign_id': row.campaign_id,
+                'notes': row.notes,
+                'extra_data': row.extra_data or {},
+            }) + b'\n' for row in rows)
+
+def csv_cell(value):
+    """以公式字元開頭的文字前加上 '，Excel 開啟時當作文字而不執行"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _load_temple_names(names, temple_ids):
+    """從廟宇目錄補上尚未出現過的廟宇名稱"""
+    missing = temple_ids - names.keys()
+    if missing:
+        for temple_id, entry in temple_catalog.get_many(missing).items():
+            names[temple_id] = entry.name if entry else None
+
+def _load_amulet_names(names, amulet_ids):
+    """以一次 IN 查詢補上尚未出現過的平安符名稱"""
+    missing = amulet_ids - names.keys()
+    if missing:
+        names.update(dict.fromkeys(missing))
+        names.update(db.session.query(Amulet.id, Amulet.name).filter(Amulet.id.in_(missing)).all())
\ No newline at end of file
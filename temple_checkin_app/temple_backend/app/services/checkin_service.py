@@ -0,0 +1,318 @@
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+from app.models import db, Checkin, Temple, Amulet, User, TempleVisit, BlessingLedger
+from app.services.amulet_resolver import amulet_resolver
+from app.services.bonus_campaigns import bonus_campaigns
+from app.services.temple_catalog import temple_catalog
+from app.utils.helpers import generate_uuid, calculate_points, parse_utc_datetime, normalize_amulet_uid
+from app.utils.validators import validate_batch_checkin_item
+
+class CheckinError(Exception):
+    """打卡失敗（附帶 HTTP 狀態碼）"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+def perform_checkin(user, temple_id, amulet_uid, notes='', extra_data=None, hours_limit=None):
+    """在單一交易中完成打卡
+    
+    由快取取得廟宇與平安符，冷卻檢查由 temple_visits 的條件式
+    upsert 在資料庫層級完成，接著寫入打卡記錄並以
+    blessing_points = blessing_points + :n 原子更新福報值與各計數欄位、
+    寫入福報值帳本後 commit。
+    回應資料在 commit 前組好，避免 commit 後重新載入物件。
+    hours_limit 未指定時使用廟宇設定的冷卻時數。
+    """
+    now = datetime.utcnow()
+    temple, amulet = load_checkin_target(user.id, temple_id, amulet_uid)
+    
+    if hours_limit is None:
+        hours_limit = temple.checkin_cooldown_hours
+    
+    checkin_data = build_checkin_row(user.id, temple, amulet.amulet_id, now, notes, extra_data)
+    points_earned = checkin_data['points_earned']
+    
+    try:
+        visit_count = TempleVisit.claim(user.id, temple.id, now, hours_limit)
+        if not visit_count:
+            raise CheckinError(f'您在{hours_limit}小時內已在此廟宇打卡過了', 400)
+        
+        first_visits = {(user.id, temple.id)} if visit_count == 1 else set()
+        
+        db.session.execute(Checkin.__table__.insert().values(**checkin_data))
+        BlessingLedger.append_checkins([checkin_data], now)
+        _increment_counters([checkin_data], first_visits)
+        total_points = _increment_user_totals(user.id, points_earned, 1, len(first_visits), now)
+        
+        # commit 後物件會過期，先組好回應
+        user_data = user.to_dict()
+        user_data['blessing_points'] = total_points
+        user_data['updated_at'] = now
+        
+        checkin_dict = dict(checkin_data)
+        checkin_dict['user'] = user_data
+        checkin_dict['temple'] = temple_summary(temple)
+        checkin_dict['amulet'] = amulet_summary(amulet)
+        
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return {
+        'checkin': checkin_dict,
+        'points_earned': points_earned,
+        'total_blessing_points': total_points,
+        'blessing_level': User.blessing_level_for(total_points),
+    }
+
+def load_checkin_target(user_id, temple_id, amulet_uid):
+    """取得打卡的廟宇（TempleEntry）與平安符（AmuletEntry），不符合時拋出 CheckinError"""
+    temple = temple_catalog.get(temple_id)
+    if temple is None or not temple.is_active:
+        raise CheckinError('廟宇不存在或已停用', 404)
+    
+    amulet = amulet_resolver.resolve_for_user(amulet_uid, user_id)
+    if amulet is None:
+        raise CheckinError('平安符不存在或不屬於您', 404)
+    
+    return temple, amulet
+
+def temple_summary(temple):
+    """打卡回應中的廟宇摘要"""
+    return {
+        'id': temple.id,
+        'name': temple.name,
+        'main_deity': temple.main_deity,
+        'blessing_bonus': temple.blessing_bonus,
+        'latitude': temple.latitude,
+        'longitude': temple.longitude,
+    }
+
+def amulet_summary(amulet):
+    """打卡回應中的平安符摘要"""
+    return {'id': amulet.amulet_id, 'uid': amulet.uid, 'name': amulet.name}
+
+def build_checkin_row(user_id, temple, amulet_id, checkin_time, notes='', extra_data=None):
+    """組出 checkins 資料表的一列（依打卡時間套用加碼活動）"""
+    # 計算獲得的福報值
+    base_points = 1
+    campaign = bonus_campaigns.best_for(temple.id, checkin_time)
+    special_bonus = campaign.bonus_points if campaign else 0
+    
+    return {
+        'id': generate_uuid(),
+        'user_id': user_id,
+        'temple_id': temple.id,
+        'amulet_id': amulet_id,
+        'points_earned': calculate_points(base_points, temple.blessing_bonus, special_bonus),
+        'checkin_time': checkin_time,
+        'notes': notes,
+        'extra_data': extra_data or {},
+        'campaign_id': campaign.id if campaign else None,
+    }
+
+def insert_checkin_rows(rows, first_visits):
+    """批次寫入已確認冷卻的打卡（不 commit），回傳 user_id -> 更新後的福報值
+    
+    寫入打卡記錄與福報值帳本，累加各計數欄位，福報值依使用者彙總後原子更新。
+    first_visits 為第一次造訪的 (user_id, temple_id)。
+    """
+    if not rows:
+        return {}
+    
+    now = datetime.utcnow()
+    db.session.execute(Checkin.__table__.insert(), rows)
+    BlessingLedger.append_checkins(rows, now)
+    _increment_counters(rows, first_visits)
+    
+    totals_by_user = {}
+    for row in rows:
+        points, checkins = totals_by_user.get(row['user_id'], (0, 0))
+        totals_by_user[row['user_id']] = (points + row['points_earned'], checkins + 1)
+    
+    total_points = {}
+    for user_id, (points, checkins) in sorted(totals_by_user.items()):
+        new_temples = sum(1 for visitor_id, _ in first_visits if visitor_id == user_id)
+        total_points[user_id] = _increment_user_totals(user_id, points, checkins, new_temples, now)
+    return total_points
+
+def perform_batch_checkin(user, items, max_age_days=30, clock_skew_seconds=300):
+    """在單一交易中同步多筆離線打卡
+    
+    廟宇、平安符與最後造訪時間各以一次 IN 查詢預先載入，依 client_time
+    排序後在記憶體中套用冷卻規則；每間廟宇再以一次條件式 upsert 確認
+    冷卻，最後由 insert_checkin_rows 批次寫入打卡記錄、帳本與計數。
+    回傳與 items 順序相同的逐筆結果。
+    """
+    now = datetime.utcnow()
+    earliest = now - timedelta(days=max_age_days)
+    latest = now + timedelta(seconds=clock_skew_seconds)
+    
+    results = [None] * len(items)
+    pending = []
+    
+    for index, item in enumerate(items):
+        errors = validate_batch_checkin_item(item)
+        if not errors:
+            checkin_time = parse_utc_datetime(item['client_time'])
+            if checkin_time is None:
+                errors.append('client_time 格式不正確')
+            elif not earliest <= checkin_time <= latest:
+                errors.append('client_time 超出可同步的時間範圍')
+        
+        if errors:
+            results[index] = _batch_result(index, False, errors[0])
+        else:
+            pending.append((checkin_time, index, item))
+    
+    accepted = {}
+    if pending:
+        temple_ids = {item['temple_id'] for _, _, item in pending}
+        
+        temples = temple_catalog.get_many(temple_ids)
+        amulets = amulet_resolver.resolve_many(item['amulet_uid'] for _, _, item in pending)
+        last_visits = dict(db.session.query(TempleVisit.temple_id, TempleVisit.last_checkin_time).filter(
+            TempleVisit.user_id == user.id,
+            TempleVisit.temple_id.in_(temple_ids)
+        ).all())
+        
+        # 依時間順序套用冷卻規則（早於最後造訪時間的打卡一律視為冷卻中）
+        pending.sort(key=lambda entry: (entry[0], entry[1]))
+        for checkin_time, index, item in pending:
+            temple = temples.get(item['temple_id'])
+            if temple is None or not temple.is_active:
+                results[index] = _batch_result(index, False, '廟宇不存在或已停用')
+                continue
+            
+            amulet = amulets.get(normalize_amulet_uid(item['amulet_uid']))
+            if amulet is None or amulet.user_id != user.id or not amulet.is_active:
+                results[index] = _batch_result(index, False, '平安符不存在或不屬於您')
+                continue
+            
+            hours_limit = temple.checkin_cooldown_hours
+            last_checkin_time = last_visits.get(temple.id)
+            if last_checkin_time is not None and checkin_time < last_checkin_time + timedelta(hours=hours_limit):
+                results[index] = _batch_result(index, False, f'您在{hours_limit}小時內已在此廟宇打卡過了')
+                continue
+            
+            last_visits[temple.id] = checkin_time
+            accepted.setdefault(temple.id, []).append((index, build_checkin_row(
+                user.id, temple, amulet.amulet_id, checkin_time,
+                item.get('notes', ''), item.get('extra_data')
+            )))
+    
+    try:
+        rows = []
+        first_visits = set()
+        for temple_id, entries in accepted.items():
+            first_time = entries[0][1]['checkin_time']
+            last_time = entries[-1][1]['checkin_time']
+            hours_limit = temples[temple_id].checkin_cooldown_hours
+            
+            visit_count = TempleVisit.claim(user.id, temple_id, first_time, hours_limit, last_time, len(entries))
+            if visit_count:
+                rows.extend(entries)
+                if visit_count == len(entries):
+                    first_visits.add((user.id, temple_id))
+            else:
+                # 同步期間有其他打卡搶先寫入
+                for index, _ in entries:
+                    results[index] = _batch_result(index, False, f'您在{hours_limit}小時內已在此廟宇打卡過了')
+        
+        points_earned = sum(row['points_earned'] for _, row in rows)
+        total_points = insert_checkin_rows([row for _, row in rows], first_visits).get(user.id, user.blessing_points)
+        
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    for index, row in rows:
+        results[index] = _batch_result(
+            index, True, '打卡成功',
+            checkin_id=row['id'],
+            points_earned=row['points_earned']
+        )
+    
+    return {
+        'results': results,
+        'accepted_count': len(rows),
+        'rejected_count': len(items) - len(rows),
+        'points_earned': points_earned,
+        'total_blessing_points': total_points,
+        'blessing_level': User.blessing_level_for(total_points),
+    }
+
+def _batch_result(index, success, message, **extra):
+    """批次打卡的單筆結果"""
+    result = {'index': index, 'success': success, 'message': message}
+    result.update(extra)
+    return result
+
+def _increment_user_totals(user_id, points, checkins, new_temples, now):
+    """原子增加福報值與打卡計數，回傳新的福報值總額"""
+    users = User.__table__
+    stmt = users.update().where(users.c.id == user_id).values(
+        blessing_points=users.c.blessing_points + points,
+        checkin_count=users.c.checkin_count + checkins,
+        unique_temples_count=users.c.unique_temples_count + new_temples,
+        updated_at=now
+    )
+    
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(stmt.returning(users.c.blessing_points)).scalar_one()
+    
+    db.session.execute(stmt)
+    return db.session.query(User.blessing_points).filter(User.id == user_id).scalar()
+
+def _increment_counters(rows, first_visits):
+    """依寫入的打卡累加廟宇與平安符的計數欄位
+    
+    first_visits 為第一次造訪的 (user_id, temple_id)。以 executemany 更新，
+    並保留 updated_at（計數變動不算資料異動）。
+    """
+    temple_counts = {}
+    amulet_counts = {}
+    for row in rows:
+        checkins, visitors = temple_counts.get(row['temple_id'], (0, 0))
+        temple_counts[row['temple_id']] = (checkins + 1, visitors)
+        
+        checkins, last_time = amulet_counts.get(row['amulet_id'], (0, row['checkin_time']))
+        amulet_counts[row['amulet_id']] = (checkins + 1, max(last_time, row['checkin_time']))
+    
+    for _, temple_id in first_visits:
+        checkins, visitors = temple_counts[temple_id]
+        temple_counts[temple_id] = (checkins, visitors + 1)
+    
+    # 依主鍵順序更新，降低並行交易互相等待的機會
+    temples = Temple.__table__
+    db.session.execute(
+        temples.update().where(temples.c.id == bindparam('_id')).values(
+            checkin_count=temples.c.checkin_count + bindparam('_checkins'),
+            unique_visitors_count=temples.c.unique_visitors_count + bindparam('_visitors'),
+            updated_at=temples.c.updated_at
+        ),
+        [
+            {'_id': temple_id, '_checkins': checkins, '_visitors': visitors}
+            for temple_id, (checkins, visitors) in sorted(temple_counts.items())
+        ]
+    )
+    
+    amulets = Amulet.__table__
+    last_time = bindparam('_last')
+    db.session.execute(
+        amulets.update().where(amulets.c.id == bindparam('_id')).values(
+            checkin_count=amulets.c.checkin_count + bindparam('_checkins'),
+            last_checkin_at=db.case(
+                (db.or_(amulets.c.last_checkin_at.is_(None), amulets.c.last_checkin_at < last_time), last_time),
+                else_=amulets.c.last_checkin_at
+            ),
+            updated_at=amulets.c.updated_at
+        ),
+        [
+            {'_id': amulet_id, '_checkins': checkins, '_last': last_checkin_at}
+            for amulet_id, (checkins, last_checkin_at) in sorted(amulet_counts.items())
+        ]
+    )
\ No newline at end of file
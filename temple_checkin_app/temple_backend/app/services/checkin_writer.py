@@ -0,0 +1,491 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，僅略過跨行程的檔案鎖
+    fcntl = None
+
+from app.models import db, Checkin, User, TempleVisit
+from app.utils.metrics import register_metrics
+from app.services.checkin_service import (
+    CheckinError, load_checkin_target, build_checkin_row, insert_checkin_rows,
+    temple_summary, amulet_summary
+)
+
+logger = logging.getLogger(__name__)
+
+# 多次重試仍無法寫入的打卡（與寫入日誌不同名稱，啟動時不會自動重播）
+DEAD_LETTER_FILE = 'checkin_dead_letter.log'
+
+class CheckinWriteBehind:
+    """打卡寫入緩衝（write-behind + group commit）
+    
+    請求端同步完成驗證，冷卻由受理執行緒以 temple_visits 的條件式 upsert
+    在資料庫確認（各 worker 共用，受理後寫入時不會再被捨棄）：同時送出的打卡
+    在同一個交易中確認，寫入本機追加日誌（一次 fsync）後才 commit，再回覆請求；
+    背景執行緒每累積 N 筆或每 T 毫秒以單一交易批次寫入打卡記錄、帳本與計數。
+    行程重啟時會重播日誌中尚未寫入的打卡（以打卡 id 去重），並補上未 commit 的冷卻。
+    同一批重試多次仍失敗時改為逐筆寫入，仍無法寫入的移到 dead-letter 日誌，
+    不擋住後續的打卡；修正後以 replay-dead-checkins 指令重新寫入。
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._pending_points = {}  # user_id -> 尚未寫入的福報值
+        self._claims = deque()  # 等待確認冷卻的打卡
+        self._claim_lock = threading.Lock()
+        self._claims_ready = threading.Condition(self._claim_lock)
+        self._claim_thread = None
+        self._claims_stopping = False
+        self._log_path = None
+        self._log_file = None
+        self._thread = None
+        self._stopping = False
+        self._flushing = False
+        self._stats = {
+            'submitted': 0,
+            'claim_batches': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'batches': 0,
+            'errors': 0,
+            'dead_lettered': 0,
+        }
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定啟用寫入緩衝"""
+        register_metrics('checkin_writer', self.get_stats)
+        if not app.config.get('CHECKIN_WRITE_BEHIND'):
+            return
+        
+        self.app = app
+        self.batch_size = app.config['CHECKIN_FLUSH_BATCH_SIZE']
+        self.flush_interval = app.config['CHECKIN_FLUSH_INTERVAL_MS'] / 1000.0
+        self.max_attempts = app.config['CHECKIN_FLUSH_MAX_ATTEMPTS']
+        self.fsync = app.config['CHECKIN_WRITE_BEHIND_FSYNC']
+        
+        log_dir = app.config.get('CHECKIN_WRITE_BEHIND_DIR') or app.instance_path
+        os.makedirs(log_dir, exist_ok=True)
+        self._dead_letter_path = os.path.join(log_dir, DEAD_LETTER_FILE)
+        
+        # 重播前一次（或已結束的其他 worker）遺留的日誌
+        with app.app_context():
+            self._replay_logs(log_dir)
+        
+        # 每個 worker 使用自己的日誌檔並持有檔案鎖
+        self._log_file = self._open_log(log_dir)
+        if self._log_file is None:
+            logger.error('無法鎖定打卡寫入日誌，改為同步寫入打卡')
+            return
+        
+        self.enabled = True
+        self._claim_thread = threading.Thread(target=self._run_claims, name='checkin-claimer', daemon=True)
+        self._claim_thread.start()
+        self._thread = threading.Thread(target=self._run, name='checkin-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+    
+    def submit(self, user, temple_id, amulet_uid, notes='', extra_data=None):
+        """同步驗證並受理一筆打卡，實際寫入由背景執行緒完成"""
+        now = datetime.utcnow()
+        temple, amulet = load_checkin_target(user.id, temple_id, amulet_uid)
+        hours_limit = temple.checkin_cooldown_hours
+        blessing_points = user.blessing_points
+        
+        row = build_checkin_row(user.id, temple, amulet.amulet_id, now, notes, extra_data)
+        points_earned = row['points_earned']
+        
+        # 冷卻在受理前就寫入資料庫，其他 worker 與之後的批次寫入都以此為準
+        claim = {'row': row, 'hours_limit': hours_limit, 'done': threading.Event(), 'visit_count': None, 'error': None}
+        with self._claim_lock:
+            if self._claims_stopping:
+                raise CheckinError('打卡服務暫停中，請稍後再試', 503)
+            self._claims.append(claim)
+            self._claims_ready.notify()
+        claim['done'].wait()
+        
+        if claim['error'] is not None:
+            raise claim['error']
+        if not claim['visit_count']:
+            raise CheckinError(f'您在{hours_limit}小時內已在此廟宇打卡過了', 400)
+        
+        # 福報值為資料庫中的值加上尚未寫入的部分（預估值）
+        total_points = blessing_points + claim['pending_points']
+        
+        checkin_dict = dict(row)
+        checkin_dict['temple'] = temple_summary(temple)
+        checkin_dict['amulet'] = amulet_summary(amulet)
+        
+        return {
+            'checkin': checkin_dict,
+            'points_earned': points_earned,
+            'total_blessing_points': total_points,
+            'blessing_level': User.blessing_level_for(total_points),
+        }
+    
+    def get_stats(self):
+        """取得寫入緩衝統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._queue)
+        stats['enabled'] = self.enabled
+        stats['avg_batch_size'] = round(stats['flushed'] / stats['batches'], 2) if stats['batches'] else 0
+        return stats
+    
+    def flush(self, timeout=10):
+        """等待佇列清空（測試與關閉時使用）"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._queue and not self._flushing:
+                    return True
+            time.sleep(self.flush_interval / 2 or 0.001)
+        return False
+    
+    def stop(self):
+        """停止背景執行緒並寫入剩餘的打卡"""
+        if not self.enabled or self._stopping:
+            return
+        # 先處理完等待確認冷卻的打卡，受理的打卡都會進入寫入佇列
+        with self._claim_lock:
+            self._claims_stopping = True
+            self._claims_ready.notify_all()
+        self._claim_thread.join()
+        
+        with self._lock:
+            self._stopping = True
+            self._not_empty.notify_all()
+        self._thread.join()
+        self._log_file.close()
+    
+    def _run_claims(self):
+        """受理執行緒：等待中的打卡一起確認冷卻，每組只 commit 一次"""
+        while True:
+            with self._claim_lock:
+                while not self._claims and not self._claims_stopping:
+                    self._claims_ready.wait()
+                if not self._claims:
+                    return
+                claims = [self._claims.popleft() for _ in range(min(self.batch_size, len(self._claims)))]
+            
+            try:
+                with self.app.app_context():
+                    self._claim_batch(claims)
+            except Exception as e:
+                logger.exception('打卡冷卻確認失敗')
+                for claim in claims:
+                    claim['visit_count'] = None
+                    claim['error'] = e
+            
+            for claim in claims:
+                claim['done'].set()
+    
+    def _claim_batch(self, claims):
+        """在同一個交易中確認一組打卡的冷卻，寫入日誌後 commit 並放入寫入佇列
+        
+        日誌追加或 commit 失敗時回滾冷卻並將日誌截回原本長度，冷卻不會
+        被沒有寫入的打卡用掉。日誌 fsync 後、commit 前行程中止時，重啟
+        重播會寫入這些打卡並補上最後造訪時間（見 _write_batch 的 reclaim）。
+        """
+        try:
+            accepted = []
+            for claim in claims:
+                row = claim['row']
+                claim['visit_count'] = TempleVisit.claim(
+                    row['user_id'], row['temple_id'], row['checkin_time'], claim['hours_limit']
+                )
+                if claim['visit_count']:
+                    accepted.append((claim, {'row': row, 'first_visit': claim['visit_count'] == 1}))
+            
+            # 持有鎖直到 commit：背景執行緒不會在這之間清空日誌
+            with self._lock:
+                log_size = os.fstat(self._log_file.fileno()).st_size
+                try:
+                    self._append_log([entry for _, entry in accepted])
+                    db.session.commit()
+                except Exception:
+                    self._truncate_log(log_size)
+                    raise
+                
+                for claim, entry in accepted:
+                    user_id = entry['row']['user_id']
+                    self._queue.append(entry)
+                    self._pending_points[user_id] = self._pending_points.get(user_id, 0) + entry['row']['points_earned']
+                    claim['pending_points'] = self._pending_points[user_id]
+                self._stats['submitted'] += len(accepted)
+                self._stats['claim_batches'] += 1
+                if accepted:
+                    self._not_empty.notify()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    def _run(self):
+        """背景執行緒：每 N 筆或每 T 毫秒 group commit 一次"""
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopping:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_empty.wait(remaining)
+                
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._flushing = True
+            
+            dead = []
+            try:
+                with self.app.app_context():
+                    written = self._write_batch(batch)
+            except Exception:
+                for entry in batch:
+                    entry['attempts'] = entry.get('attempts', 0) + 1
+                
+                if max(entry['attempts'] for entry in batch) < self.max_attempts:
+                    logger.exception('打卡批次寫入失敗，稍後重試')
+                    with self._lock:
+                        self._queue.extendleft(reversed(batch))
+                        self._stats['errors'] += 1
+                        self._flushing = False
+                    time.sleep(max(self.flush_interval, 0.5))
+                    continue
+                
+                # 重試多次仍失敗：逐筆寫入找出有問題的打卡，移到 dead-letter 日誌
+                logger.exception('打卡批次寫入失敗 %d 次，改為逐筆寫入', self.max_attempts)
+                with self.app.app_context():
+                    written, dead = self._write_each(batch)
+                self._dead_letter(dead)
+            
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['flushed'] += written
+                self._stats['dead_lettered'] += len(dead)
+                self._stats['dropped'] += len(batch) - written - len(dead)
+                self._release_pending(batch)
+                self._flushing = False
+                
+                # 佇列清空代表日誌中的打卡都已寫入資料庫
+                if not self._queue:
+                    self._log_file.truncate(0)
+    
+    def _write_batch(self, batch, reclaim=False):
+        """以單一交易寫入一批受理時已確認冷卻的打卡，回傳實際寫入筆數
+        
+        reclaim 用於重播：受理的冷卻可能在日誌 fsync 後、commit 前中止而未寫入，
+        在同一個交易中補上最後造訪時間與造訪次數（已寫入者不會重複計算）。
+        """
+        try:
+            if reclaim:
+                self._reclaim(batch)
+            insert_checkin_rows(
+                [entry['row'] for entry in batch],
+                {(entry['row']['user_id'], entry['row']['temple_id']) for entry in batch if entry['first_visit']}
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(batch)
+    
+    @staticmethod
+    def _reclaim(batch):
+        """補上重播打卡的最後造訪時間，依打卡時間順序套用
+        
+        冷卻為 0 且時間減 1 微秒：只在最後造訪時間早於該打卡時才更新，
+        受理時已 commit 的（最後造訪時間等於或晚於該打卡）維持不變。
+        """
+        for entry in sorted(batch, key=lambda entry: entry['row']['checkin_time']):
+            row = entry['row']
+            visit_count = TempleVisit.claim(
+                row['user_id'], row['temple_id'],
+                row['checkin_time'] - timedelta(microseconds=1), 0,
+                row['checkin_time']
+            )
+            if visit_count:
+                entry['first_visit'] = visit_count == 1
+    
+    def _write_each(self, batch, reclaim=False):
+        """逐筆寫入，回傳 (寫入筆數, 無法寫入的打卡)"""
+        written = 0
+        dead = []
+        for entry in batch:
+            try:
+                written += self._write_batch([entry], reclaim)
+            except Exception:
+                logger.exception('打卡 %s 無法寫入', entry['row']['id'])
+                dead.append(entry)
+        return written, dead
+    
+    def _dead_letter(self, entries):
+        """將無法寫入的打卡追加到 dead-letter 日誌（格式與寫入日誌相同）"""
+        if not entries:
+            return
+        # 各 worker 共用同一個檔案，一次寫入避免交錯
+        with open(self._dead_letter_path, 'a', encoding='utf-8') as dead_file:
+            dead_file.write(''.join(self._log_line(entry) for entry in entries))
+            dead_file.flush()
+            os.fsync(dead_file.fileno())
+        logger.error('%d 筆打卡移到 %s', len(entries), self._dead_letter_path)
+    
+    def _release_pending(self, batch):
+        """移除已寫入的暫存福報值"""
+        for entry in batch:
+            row = entry['row']
+            remaining = self._pending_points.get(row['user_id'], 0) - row['points_earned']
+            if remaining > 0:
+                self._pending_points[row['user_id']] = remaining
+            else:
+                self._pending_points.pop(row['user_id'], None)
+    
+    def _append_log(self, entries):
+        """追加打卡到本機日誌（一次 fsync）"""
+        if not entries:
+            return
+        self._log_file.write(''.join(self._log_line(entry) for entry in entries))
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+    
+    def _truncate_log(self, size):
+        """移除追加失敗或未 commit 的日誌內容"""
+        try:
+            os.ftruncate(self._log_file.fileno(), size)
+        except OSError:
+            logger.exception('無法截斷打卡寫入日誌 %s', self._log_path)
+    
+    @staticmethod
+    def _log_line(entry):
+        """打卡在日誌中的一行 JSON"""
+        row = entry['row']
+        record = dict(entry, row=dict(row, checkin_time=row['checkin_time'].isoformat()))
+        return json.dumps(record, ensure_ascii=False) + '\n'
+    
+    def _open_log(self, log_dir):
+        """建立並鎖定本 worker 的日誌檔，無法鎖定時回傳 None
+        
+        先以暫存名稱建立並取得檔案鎖，再改名為重播會讀取的日誌名稱，
+        其他 worker 啟動時的重播不會看到尚未上鎖的日誌而將其刪除。
+        """
+        name = f'checkin_wal.{os.getpid()}.{uuid.uuid4().hex[:8]}'
+        temp_path = os.path.join(log_dir, f'{name}.tmp')
+        log_file = open(temp_path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            try:
+                fcntl.flock(log_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                log_file.close()
+                os.remove(temp_path)
+                return None
+        
+        self._log_path = os.path.join(log_dir, f'{name}.log')
+        os.rename(temp_path, self._log_path)
+        return log_file
+    
+    def _replay_logs(self, log_dir):
+        """重播未被其他 worker 持有的日誌檔"""
+        for path in glob.glob(os.path.join(log_dir, 'checkin_wal.*.log')):
+            with open(path, 'r+', encoding='utf-8') as log_file:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(log_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # 仍在執行中的 worker
+                
+                records = self._read_log(log_file)
+                if records:
+                    self._replay(path, records)
+                
+                # 仍持有檔案鎖時刪除
+                os.remove(path)
+    
+    def _replay(self, path, records):
+        """重播一個日誌檔的打卡
+        
+        在啟動時執行，資料庫錯誤不會中斷啟動：整批寫入失敗時改為逐筆寫入，
+        無法寫入（或無法確認是否已寫入）的打卡移到 dead-letter 日誌。
+        """
+        try:
+            batch = self._unwritten_records(records)
+        except Exception:
+            db.session.rollback()
+            logger.exception('重播打卡日誌 %s 時無法查詢資料庫', path)
+            self._dead_letter(records)
+            return
+        
+        if not batch:
+            return
+        try:
+            written, dead = self._write_batch(batch, reclaim=True), []
+        except Exception:
+            logger.exception('重播打卡日誌 %s 失敗，改為逐筆寫入', path)
+            written, dead = self._write_each(batch, reclaim=True)
+        self._dead_letter(dead)
+        logger.info('重播打卡日誌 %s：寫入 %d / %d 筆', path, written, len(batch))
+    
+    def replay_dead_letters(self, log_dir):
+        """逐筆重新寫入 dead-letter 日誌中的打卡，回傳 (寫入筆數, 仍失敗筆數)"""
+        self._dead_letter_path = os.path.join(log_dir, DEAD_LETTER_FILE)
+        if not os.path.exists(self._dead_letter_path):
+            return 0, 0
+        
+        # 先改名再讀取，重播期間 worker 新增的 dead-letter 寫到新檔
+        replay_path = f'{self._dead_letter_path}.{os.getpid()}.replay'
+        os.rename(self._dead_letter_path, replay_path)
+        with open(replay_path, 'r', encoding='utf-8') as log_file:
+            batch = self._unwritten_records(self._read_log(log_file))
+        
+        # 重播日誌失敗時移入的打卡也可能沒有寫入冷卻
+        written, dead = self._write_each(batch, reclaim=True)
+        self._dead_letter(dead)
+        os.remove(replay_path)
+        return written, len(dead)
+    
+    @staticmethod
+    def _read_log(log_file):
+        """讀取日誌中的打卡（略過寫到一半的行）"""
+        records = []
+        for line in log_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 寫到一半的最後一行
+            record['row']['checkin_time'] = datetime.fromisoformat(record['row']['checkin_time'])
+            record['row'].setdefault('campaign_id', None)
+            records.append(record)
+        return records
+    
+    def _unwritten_records(self, records):
+        """略過已存在於資料庫的打卡（以打卡 id 去重）"""
+        ids = [record['row']['id'] for record in records]
+        existing = set()
+        for start in range(0, len(ids), 500):
+            existing.update(
+                checkin_id for checkin_id, in db.session.query(Checkin.id).filter(
+                    Checkin.id.in_(ids[start:start + 500])
+                )
+            )
+        
+        return [record for record in records if record['row']['id'] not in existing]
+
+checkin_writer = CheckinWriteBehind()
\ No newline at end of file
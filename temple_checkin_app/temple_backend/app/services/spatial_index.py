@@ -0,0 +1,357 @@
+import heapq
+import math
+import threading
+from array import array
+
+from app.models import db, Temple
+from app.services.temple_catalog import temple_catalog
+from app.utils.geo import KM_PER_DEGREE, bounding_box, distances_from, haversine, mercator_xy, nearest, take
+from app.utils.metrics import register_metrics
+
+# 附近廟宇的查詢方式（SPATIAL_BACKEND）
+SPATIAL_BACKENDS = ('memory', 'geohash', 'sql')
+
+# kNN 的起始搜尋半徑（由上一頁的距離往外）與最大半徑（約半個地球周長）
+KNN_INITIAL_RADIUS_KM = 2.0
+KNN_MAX_RADIUS_KM = 20040.0
+
+# 格子四角最遠距離小於上一頁距離乘以此比例時略過整格（保留球面近似的誤差）
+KNN_SKIP_RATIO = 0.99
+
+# 距離比較的容許誤差（公里），向量化與純 Python 計算的結果可能差在最後一位
+DISTANCE_EPSILON_KM = 1e-9
+
+# 地圖圖磚邊長（像素）
+TILE_SIZE_PX = 256
+
+def after_cursor(distance, temple_id, after):
+    """(距離, id) 是否排在游標 after 之後（after 為 None 時皆是）"""
+    if after is None:
+        return True
+    after_distance, after_id = after
+    if distance > after_distance + DISTANCE_EPSILON_KM:
+        return True
+    return distance >= after_distance - DISTANCE_EPSILON_KM and temple_id > after_id
+
+class SpatialIndex:
+    """啟用中廟宇的記憶體網格索引（附近廟宇查詢用）
+    
+    只保存 (id, 緯度, 經度)：座標放在兩個 array('d')，網格以固定角度切分，
+    每格記錄所屬的位置編號。半徑查詢只取出與邊界框重疊的格子，一次向量化計算
+    距離，不需查詢資料庫，最後由呼叫端只讀取前 N 筆的完整資料。
+    地圖視窗另有各縮放層級的群集網格（依圖磚切分），每格只記數量與座標總和，
+    新增、移除一筆時逐層加減，不需重建。
+    管理員異動時本 worker 直接更新該筆；其他 worker 由廟宇目錄世代得知異動，
+    只重新讀取 catalog_generation 大於索引世代的廟宇（異動時與世代一起寫入，
+    由資料庫決定，不受各 worker 時鐘影響），世代倒退時整個重建。
+    """
+    
+    def __init__(self, app=None):
+        self.backend = 'memory'
+        self.cell_deg = 0.02
+        self.generation = None
+        self._ids = []
+        self._lats = array('d')
+        self._lngs = array('d')
+        self._slots = {}   # id -> 位置編號
+        self._cells = {}   # (列, 行) -> 位置編號列表
+        self._free = []    # 已移除可重用的位置編號
+        self.cluster_max_zoom = 14
+        self.cluster_cells_per_tile = 4
+        self._clusters = []  # 各縮放層級：(行, 列) -> [數量, 緯度總和, 經度總和]
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._stats = {'queries': 0, 'scanned': 0, 'viewports': 0, 'rebuilds': 0, 'resyncs': 0, 'updates': 0}
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定選擇查詢方式並調整網格與群集大小（下次查詢時重建）"""
+        backend = app.config.get('SPATIAL_BACKEND', 'memory')
+        if backend not in SPATIAL_BACKENDS:
+            raise ValueError(f'不支援的 SPATIAL_BACKEND：{backend}')
+        self.backend = backend
+        with self._lock:
+            self.cell_deg = app.config['SPATIAL_INDEX_CELL_KM'] / KM_PER_DEGREE
+            self.cluster_max_zoom = app.config['VIEWPORT_CLUSTER_MAX_ZOOM']
+            self.cluster_cells_per_tile = max(TILE_SIZE_PX // app.config['VIEWPORT_CLUSTER_CELL_PX'], 1)
+            self._loaded = False
+        register_metrics('spatial_index', self.get_stats)
+    
+    def nearby(self, latitude, longitude, radius_km=5, limit=20):
+        """查詢半徑內的廟宇，回傳依距離排序的 [(廟宇 id, 距離公里)]，最多 limit 筆"""
+        self._sync()
+        
+        lat_min, lat_max, lng_min, lng_max = bounding_box(latitude, longitude, radius_km)
+        
+        with self._lock:
+            # 重疊格子中的候選一次向量化計算距離
+            slots = [slot for _, cell in self._cells_in(lat_min, lat_max, lng_min, lng_max) for slot in cell]
+            hits = nearest(
+                latitude, longitude,
+                take(self._lats, slots),
+                take(self._lngs, slots),
+                radius_km, limit
+            )
+            result = [(self._ids[slots[position]], distance) for position, distance in hits]
+        
+        self._stats['queries'] += 1
+        self._stats['scanned'] += len(slots)
+        return result
+    
+    def knn(self, latitude, longitude, k, after=None):
+        """最近的 k 間廟宇，回傳依 (距離, id) 排序的 [(廟宇 id, 距離公里)]
+        
+        after 為上一頁最後一筆的 (距離, id)。由上一頁的距離往外逐次加倍搜尋半徑，
+        每個格子只計算一次；整格都在上一頁距離內的格子直接略過，不重算前幾頁的距離。
+        """
+        self._sync()
+        
+        inner = after[0] if after else 0.0
+        radius = inner + KNN_INITIAL_RADIUS_KM
+        candidates = []
+        visited = set()
+        scanned = 0
+        
+        with self._lock:
+            while True:
+                slots = []
+                for cell, cell_slots in self._cells_in(*bounding_box(latitude, longitude, radius)):
+                    if cell in visited:
+                        continue
+                    visited.add(cell)
+                    if inner and self._cell_max_distance(cell, latitude, longitude) < inner * KNN_SKIP_RATIO:
+                        continue
+                    slots.extend(cell_slots)
+                
+                distances = distances_from(latitude, longitude, take(self._lats, slots), take(self._lngs, slots))
+                candidates.extend(
+                    (distance, self._ids[slot]) for slot, distance in zip(slots, distances)
+                    if after_cursor(distance, self._ids[slot], after)
+                )
+                scanned += len(slots)
+                
+                # 半徑內的點都已計算，足夠 k 筆或已走訪所有格子即可回傳
+                done = len(visited) >= len(self._cells) or radius >= KNN_MAX_RADIUS_KM
+                ready = candidates if done else [item for item in candidates if item[0] <= radius]
+                if done or len(ready) >= k:
+                    break
+                radius *= 2
+        
+        self._stats['queries'] += 1
+        self._stats['scanned'] += scanned
+        return [(temple_id, distance) for distance, temple_id in heapq.nsmallest(k, ready)]
+    
+    def viewport(self, lat_min, lat_max, lng_min, lng_max, zoom, max_points):
+        """地圖視窗內的廟宇，回傳 (類型, 縮放層級, 項目)
+        
+        zoom 大於 cluster_max_zoom 時類型為 'points'，項目為 (廟宇 id, 緯度, 經度)；
+        否則為 'clusters'，項目為該層與視窗重疊各格的 (中心緯度, 中心經度, 數量)。
+        點數超過 max_points 時改回傳 cluster_max_zoom 層的群集。
+        lng_min 大於 lng_max 表示跨越換日線。
+        """
+        self._sync()
+        
+        spans = [(lng_min, lng_max)] if lng_min <= lng_max else [(lng_min, 180.0), (-180.0, lng_max)]
+        self._stats['viewports'] += 1
+        
+        with self._lock:
+            if zoom > self.cluster_max_zoom:
+                points = self._points_in(lat_min, lat_max, spans, max_points)
+                if points is not None:
+                    return 'points', zoom, points
+                zoom = self.cluster_max_zoom
+            return 'clusters', zoom, self._clusters_in(lat_min, lat_max, spans, zoom)
+    
+    def update(self, temple_id, latitude, longitude, is_active=True):
+        """本 worker 新增或異動廟宇後更新索引（停用時移除）"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(temple_id)
+            if is_active and latitude is not None and longitude is not None:
+                self._insert(temple_id, latitude, longitude)
+            self._stats['updates'] += 1
+    
+    def get_stats(self):
+        """取得索引統計"""
+        stats = dict(self._stats)
+        stats['size'] = len(self._slots)
+        stats['cells'] = len(self._cells)
+        stats['cluster_cells'] = sum(len(cells) for cells in self._clusters)
+        stats['generation'] = self.generation
+        return stats
+    
+    def _sync(self):
+        """比對廟宇目錄世代，首次使用時建立索引，之後只重新讀取異動的廟宇"""
+        generation, _ = temple_catalog.version()
+        if self._loaded and generation == self.generation:
+            return
+        
+        with self._lock:
+            if self._loaded and generation == self.generation:
+                return
+            
+            query = db.session.query(Temple.id, Temple.latitude, Temple.longitude, Temple.is_active)
+            # 世代的順序即 commit 的順序：已讀到的世代之前的異動都已 commit
+            if self._loaded and self.generation is not None and generation > self.generation:
+                rows = query.filter(Temple.catalog_generation > self.generation).all()
+                self._stats['resyncs'] += 1
+            else:
+                self._clear()
+                rows = query.filter(Temple.is_active == True).all()
+                self._stats['rebuilds'] += 1
+            
+            for temple_id, latitude, longitude, is_active in rows:
+                self._remove(temple_id)
+                if is_active:
+                    self._insert(temple_id, latitude, longitude)
+            
+            self.generation = generation
+            self._loaded = True
+    
+    def _cells_in(self, lat_min, lat_max, lng_min, lng_max):
+        """與邊界框重疊的 [(格子, 位置編號列表)]；範圍涵蓋的格數多於既有格子時直接走訪所有格子"""
+        row_min, row_max = math.floor(lat_min / self.cell_deg), math.floor(lat_max / self.cell_deg)
+        col_min, col_max = math.floor(lng_min / self.cell_deg), math.floor(lng_max / self.cell_deg)
+        
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+            return [
+                (cell, slots) for cell, slots in self._cells.items()
+                if row_min <= cell[0] <= row_max and col_min <= cell[1] <= col_max
+            ]
+        
+        cells = self._cells
+        return [
+            ((row, col), cells[(row, col)])
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            if (row, col) in cells
+        ]
+    
+    def _points_in(self, lat_min, lat_max, spans, max_points):
+        """視窗內的 [(廟宇 id, 緯度, 經度)]，超過 max_points 筆時回傳 None"""
+        lats, lngs, ids = self._lats, self._lngs, self._ids
+        points = []
+        for west, east in spans:
+            for _, slots in self._cells_in(lat_min, lat_max, west, east):
+                self._stats['scanned'] += len(slots)
+                for slot in slots:
+                    latitude, longitude = lats[slot], lngs[slot]
+                    if lat_min <= latitude <= lat_max and west <= longitude <= east:
+                        points.append((ids[slot], latitude, longitude))
+                if len(points) > max_points:
+                    return None
+        return points
+    
+    def _clusters_in(self, lat_min, lat_max, spans, zoom):
+        """該縮放層級與視窗重疊的群集 [(中心緯度, 中心經度, 數量)]"""
+        cells = self._clusters[zoom]
+        scale = (1 << zoom) * self.cluster_cells_per_tile
+        _, y_min = mercator_xy(lat_max, 0.0)
+        _, y_max = mercator_xy(lat_min, 0.0)
+        row_min, row_max = self._cluster_index(y_min, scale), self._cluster_index(y_max, scale)
+        
+        keys = []
+        for west, east in spans:
+            col_min = self._cluster_index(mercator_xy(0.0, west)[0], scale)
+            col_max = self._cluster_index(mercator_xy(0.0, east)[0], scale)
+            # 與 _cells_in 相同：範圍涵蓋的格數多於既有格子時直接走訪所有格子
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > len(cells):
+                keys.extend(
+                    cell for cell in cells
+                    if col_min <= cell[0] <= col_max and row_min <= cell[1] <= row_max
+                )
+            else:
+                keys.extend(
+                    (col, row)
+                    for col in range(col_min, col_max + 1)
+                    for row in range(row_min, row_max + 1)
+                    if (col, row) in cells
+                )
+        
+        clusters = []
+        for cell in dict.fromkeys(keys):
+            count, lat_sum, lng_sum = cells[cell]
+            clusters.append((lat_sum / count, lng_sum / count, count))
+        return clusters
+    
+    @staticmethod
+    def _cluster_index(value, scale):
+        """正規化座標在 scale 等分中的格子編號"""
+        return min(max(int(value * scale), 0), scale - 1)
+    
+    def _cluster_add(self, latitude, longitude, sign):
+        """在每個縮放層級的群集加入（sign 為 1）或移除（sign 為 -1）一筆"""
+        x, y = mercator_xy(latitude, longitude)
+        scale = (1 << self.cluster_max_zoom) * self.cluster_cells_per_tile
+        col, row = self._cluster_index(x, scale), self._cluster_index(y, scale)
+        # 每往上一層格子邊長加倍，格子編號右移一位即可
+        for shift, cells in enumerate(reversed(self._clusters)):
+            cell = (col >> shift, row >> shift)
+            total = cells.get(cell)
+            if total is None:
+                total = cells[cell] = [0, 0.0, 0.0]
+            total[0] += sign
+            if not total[0]:
+                del cells[cell]
+                continue
+            total[1] += sign * latitude
+            total[2] += sign * longitude
+    
+    def _cell_max_distance(self, cell, latitude, longitude):
+        """座標到格子四個角的最遠距離（公里）"""
+        row, col = cell
+        lats = (row * self.cell_deg, (row + 1) * self.cell_deg)
+        lngs = (col * self.cell_deg, (col + 1) * self.cell_deg)
+        return max(haversine(latitude, longitude, lat, lng) for lat in lats for lng in lngs)
+    
+    def _cell(self, latitude, longitude):
+        """座標所在的格子"""
+        return math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg)
+    
+    def _insert(self, temple_id, latitude, longitude):
+        """加入一筆（位置編號優先重用已移除的）"""
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = temple_id
+            self._lats[slot] = latitude
+            self._lngs[slot] = longitude
+        else:
+            slot = len(self._ids)
+            self._ids.append(temple_id)
+            self._lats.append(latitude)
+            self._lngs.append(longitude)
+        
+        self._slots[temple_id] = slot
+        self._cells.setdefault(self._cell(latitude, longitude), []).append(slot)
+        self._cluster_add(latitude, longitude, 1)
+    
+    def _remove(self, temple_id):
+        """移除一筆（不存在時略過）"""
+        slot = self._slots.pop(temple_id, None)
+        if slot is None:
+            return
+        
+        latitude, longitude = self._lats[slot], self._lngs[slot]
+        cell = self._cell(latitude, longitude)
+        slots = self._cells[cell]
+        slots.remove(slot)
+        if not slots:
+            del self._cells[cell]
+        self._cluster_add(latitude, longitude, -1)
+        self._ids[slot] = None
+        self._free.append(slot)
+    
+    def _clear(self):
+        """清空索引"""
+        self._ids = []
+        self._lats = array('d')
+        self._lngs = array('d')
+        self._slots = {}
+        self._cells = {}
+        self._free = []
+        self._clusters = [{} for _ in range(self.cluster_max_zoom + 1)]
+
+# 全域實例
+spatial_index = SpatialIndex()
\ No newline at end of file
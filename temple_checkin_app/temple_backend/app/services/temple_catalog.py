@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import namedtuple
+
+from app.models import db, Temple, CacheGeneration
+from app.utils.cache import LRUCache
+from app.utils.metrics import register_metrics
+
+# 熱門路徑所需的廟宇欄位
+TempleEntry = namedtuple('TempleEntry', [
+    'id', 'name', 'main_deity', 'blessing_bonus', 'checkin_cooldown_hours',
+    'is_active', 'latitude', 'longitude', 'updated_at'
+])
+
+# cache_generations 中的名稱
+TEMPLE_CATALOG = 'temples'
+
+_MISSING = object()
+
+class TempleCatalog:
+    """廟宇目錄快取（read-through，管理員異動時失效）
+    
+    以 id 快取熱門路徑需要的欄位。管理員異動廟宇時在同一交易中遞增資料庫的
+    世代計數器，各 worker 最多每隔檢查間隔比對一次，世代改變即清空快取。
+    讀取資料庫期間若快取被清除或移除，讀到的資料可能已過時，不寫入快取。
+    """
+    
+    def __init__(self, app=None):
+        self.cache = LRUCache(maxsize=20000)
+        self.generation = None
+        self.generation_updated_at = None
+        self.check_interval = 1.0
+        self._checked_at = 0.0
+        self._epoch = 0  # 每次清除或移除快取時遞增
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定調整容量與世代檢查間隔"""
+        self.cache.resize(app.config['TEMPLE_CACHE_SIZE'])
+        self.check_interval = app.config['TEMPLE_CACHE_CHECK_INTERVAL_MS'] / 1000.0
+        register_metrics('temple_catalog', self.get_stats)
+    
+    def get(self, temple_id):
+        """取得單一廟宇，不存在時回傳 None"""
+        return self.get_many([temple_id]).get(temple_id)
+    
+    def get_many(self, temple_ids):
+        """取得多間廟宇，未命中的以一次 IN 查詢載入"""
+        self._sync_generation()
+        
+        results = {}
+        missing = []
+        for temple_id in set(temple_ids):
+            entry = self.cache.get(temple_id, _MISSING)
+            if entry is _MISSING:
+                missing.append(temple_id)
+            else:
+                results[temple_id] = entry
+        
+        if missing:
+            epoch = self._epoch
+            rows = db.session.query(*[getattr(Temple, field) for field in TempleEntry._fields]).filter(
+                Temple.id.in_(missing)
+            ).all()
+            found = {row.id: TempleEntry(*row) for row in rows}
+            
+            with self._lock:
+                fresh = epoch == self._epoch
+                for temple_id in missing:
+                    entry = found.get(temple_id)
+                    if fresh:
+                        self.cache.set(temple_id, entry)
+                    results[temple_id] = entry
+        
+        return results
+    
+    def version(self):
+        """目錄版本 (世代, 最後異動時間)，供 ETag 與 Last-Modified 使用"""
+        self._sync_generation()
+        return self.generation, self.generation_updated_at
+    
+    def invalidate(self, temple_id=None):
+        """本 worker 的廟宇異動後移除快取（其他 worker 由世代計數器處理）"""
+        self._checked_at = 0.0  # 下次存取立即讀取新的世代
+        with self._lock:
+            self._epoch += 1
+            if temple_id is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(temple_id)
+    
+    def get_stats(self):
+        """取得快取統計"""
+        stats = self.cache.get_stats()
+        stats['generation'] = self.generation
+        return stats
+    
+    def _sync_generation(self):
+        """比對資料庫世代，改變時清空快取"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        
+        self._checked_at = now
+        generation, updated_at = CacheGeneration.get_state(TEMPLE_CATALOG)
+        if generation != self.generation:
+            with self._lock:
+                self._epoch += 1
+                self.cache.clear()
+            self.generation = generation
+            self.generation_updated_at = updated_at
+
+temple_catalog = TempleCatalog()
\ No newline at end of file
@@ -2,12 +2,18 @@
 from .auth import admin_required, active_user_required, get_current_user, token_required
 from .helpers import (
     generate_uuid, success_response, error_response, paginate_response,
-    safe_get_json, calculate_points, generate_amulet_uid
+    safe_get_json, calculate_points, generate_amulet_uid, normalize_amulet_uid,
+    parse_utc_datetime
 )
+from .fieldsets import Fieldset, parse_fieldset, apply_fieldset
+from .idempotency import idempotent
 from .validators import (
     validate_username, validate_email_format, validate_password,
     validate_temple_data, validate_amulet_data, validate_checkin_data,
-    validate_pagination_params
+    validate_campaign_data,
+    validate_batch_checkin_data, validate_batch_checkin_item, validate_batch_requests,
+    validate_pagination_params, validate_count_mode, validate_id_list, validate_points,
+    validate_bbox
 )
 
 __all__ = [
@@ -16,6 +22,7 @@ __all__ = [
     'active_user_required', 
     'get_current_user',
     'token_required',
+    'idempotent',
     
     # Helper functions
     'generate_uuid',
@@ -25,6 +32,13 @@ __all__ = [
     'safe_get_json',
     'calculate_points',
     'generate_amulet_uid',
+    'normalize_amulet_uid',
+    'parse_utc_datetime',
+    
+    # Sparse fieldsets
+    'Fieldset',
+    'parse_fieldset',
+    'apply_fieldset',
     
     # Validators
     'validate_username',
@@ -33,5 +47,13 @@ __all__ = [
     'validate_temple_data',
     'validate_amulet_data',
     'validate_checkin_data',
+    'validate_campaign_data',
+    'validate_batch_checkin_data',
+    'validate_batch_checkin_item',
+    'validate_batch_requests',
     'validate_pagination_params',
+    'validate_count_mode',
+    'validate_id_list',
+    'validate_points',
+    'validate_bbox',
 ]
\ No newline at end of file
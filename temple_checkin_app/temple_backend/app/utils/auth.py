@@ -1,15 +1,74 @@
 from functools import wraps
-from flask import jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from app.models import User
+from flask import g, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from sqlalchemy import inspect
+from app.models import db, User
+
+# 批次請求在外層驗證過的 Token，放在子請求的 environ 中供子請求直接沿用
+BATCH_IDENTITY_KEY = 'temple.batch_identity'
+
+def batch_identity():
+    """取得外層批次請求已驗證的身分（Token 字串、標頭、內容與使用者），供子請求沿用
+    
+    只在外層有有效 Token 時回傳，否則回 None
+    """
+    if not get_jwt():
+        return None
+    return {
+        'authorization': request.headers.get('Authorization'),
+        'jwt_header': g._jwt_extended_jwt_header,
+        'jwt_data': get_jwt(),
+        'user': load_user(get_jwt_identity()),
+    }
+
+def verify_jwt(optional=False, refresh=False):
+    """驗證請求中的 JWT；批次子請求沿用外層相同 Token 的驗證結果，不再重新解碼
+    
+    子請求自行指定不同的 Authorization 或需要不同類型的 Token 時照常驗證
+    """
+    shared = request.environ.get(BATCH_IDENTITY_KEY)
+    if (shared is not None and request.headers.get('Authorization') == shared['authorization']
+            and shared['jwt_data'].get('type') == ('refresh' if refresh else 'access')):
+        # flask_jwt_extended 由 g 讀取目前的 Token，與 verify_jwt_in_request 成功時設定的值相同
+        g._jwt_extended_jwt_user = {'loaded_user': None}
+        g._jwt_extended_jwt_header = shared['jwt_header']
+        g._jwt_extended_jwt = shared['jwt_data']
+        g._jwt_extended_jwt_location = 'headers'
+        return shared['jwt_header'], shared['jwt_data']
+    
+    return verify_jwt_in_request(optional=optional, refresh=refresh)
+
+def jwt_required(optional=False, refresh=False):
+    """JWT 驗證裝飾器（同 flask_jwt_extended.jwt_required，批次子請求沿用外層的驗證結果）"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            verify_jwt(optional=optional, refresh=refresh)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def load_user(user_id):
+    """依 id 取得使用者；批次子請求沿用外層已載入的使用者，不再查詢資料庫"""
+    if user_id is None:
+        return None
+    
+    shared = request.environ.get(BATCH_IDENTITY_KEY)
+    user = shared and shared['user']
+    if user is None or inspect(user).identity != (user_id,):
+        return User.query.get(user_id)
+    
+    if inspect(user).session is db.session():
+        return user
+    # 平行子請求使用各自的 session，以外層的資料列建立副本而不重新查詢
+    return db.session.merge(user, load=False)
 
 def admin_required(f):
     """需要管理員權限的裝飾器"""
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = load_user(get_jwt_identity())
         
         if not user or not user.is_admin:
             return jsonify({'message': '需要管理員權限'}), 403
@@ -22,8 +81,7 @@ def active_user_required(f):
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = load_user(get_jwt_identity())
         
         if not user:
             return jsonify({'message': '使用者不存在'}), 404
@@ -37,8 +95,7 @@ def active_user_required(f):
 def get_current_user():
     """取得當前使用者"""
     try:
-        current_user_id = get_jwt_identity()
-        return User.query.get(current_user_id)
+        return load_user(get_jwt_identity())
     except:
         return None
 
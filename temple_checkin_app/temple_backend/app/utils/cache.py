@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """執行緒安全的 LRU 快取（可設定 TTL 秒數）"""
+    
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """取得快取值，不存在或已過期時回傳 default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+    
+    def set(self, key, value, ttl=None):
+        """寫入快取值，超過容量時淘汰最久未使用的項目"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        """移除單一項目"""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+    
+    def clear(self):
+        """清除所有項目"""
+        with self._lock:
+            self._data.clear()
+    
+    def resize(self, maxsize, ttl=None):
+        """調整容量與 TTL"""
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get_stats(self):
+        """取得快取命中統計"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0,
+        }
\ No newline at end of file
@@ -0,0 +1,172 @@
+import gzip
+import threading
+import time
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # 未安裝時只提供 gzip
+    brotli = None
+
+from app.utils.cache import LRUCache
+from app.utils.metrics import register_metrics
+
+# 伺服器偏好順序（用戶端品質值相同時優先使用前者）
+CONTENT_ENCODINGS = ('br', 'gzip')
+
+# 超過此大小的壓縮結果不放進快取
+_MAX_CACHED_BODY = 1024 * 1024
+
+class ResponseCompressor:
+    """依 Accept-Encoding 壓縮回應（gzip，有安裝 brotli 時也支援 br）
+    
+    只壓縮設定的 Content-Type 且大於門檻的回應，已有 Content-Encoding 的略過。
+    有 ETag 的回應以 (ETag, 編碼) 快取壓縮結果，相同版本不重複壓縮；
+    壓縮後的 ETag 加上編碼後綴，與未壓縮的版本區分。串流回應逐段壓縮。
+    """
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.cache = LRUCache(maxsize=256)
+        self._lock = threading.Lock()
+        self._stats = {
+            'compressed': 0,
+            'streamed': 0,
+            'skipped_small': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'cpu_seconds': 0.0,
+        }
+        self._by_encoding = {encoding: 0 for encoding in CONTENT_ENCODINGS}
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定啟用並註冊 after_request"""
+        register_metrics('compression', self.get_stats)
+        if not app.config.get('COMPRESSION_ENABLED'):
+            return
+        
+        self.enabled = True
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.gzip_level = app.config['COMPRESSION_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESSION_BROTLI_QUALITY']
+        self.mimetypes = set(app.config['COMPRESSION_MIMETYPES'])
+        self.encodings = [encoding for encoding in CONTENT_ENCODINGS if encoding != 'br' or brotli is not None]
+        self.cache.resize(app.config['COMPRESSION_CACHE_SIZE'])
+        app.after_request(self.compress)
+    
+    def compress(self, response):
+        """after_request：必要時壓縮回應內容"""
+        if (response.mimetype not in self.mimetypes
+                or response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+        
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        
+        if response.is_streamed:
+            return self._compress_stream(response, encoding)
+        
+        body = response.get_data()
+        if len(body) < self.min_size:
+            with self._lock:
+                self._stats['skipped_small'] += 1
+            return response
+        
+        etag, weak = response.get_etag()
+        cache_key = (etag, encoding) if etag else None
+        compressed = self.cache.get(cache_key) if cache_key else None
+        if compressed is None:
+            started = time.thread_time()
+            compressed = self._compress_bytes(body, encoding)
+            cpu_seconds = time.thread_time() - started
+            if cache_key and len(compressed) <= _MAX_CACHED_BODY:
+                self.cache.set(cache_key, compressed)
+        else:
+            cpu_seconds = 0.0
+        
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        self._record(encoding, len(body), len(compressed), cpu_seconds)
+        return response
+    
+    def get_stats(self):
+        """取得壓縮統計（壓縮率為輸出 / 輸入位元組）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['by_encoding'] = dict(self._by_encoding)
+        stats['enabled'] = self.enabled
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 4) if stats['bytes_in'] else None
+        count = stats['compressed'] + stats['streamed']
+        stats['avg_cpu_ms'] = round(stats['cpu_seconds'] * 1000 / count, 3) if count else 0
+        stats['cpu_seconds'] = round(stats['cpu_seconds'], 4)
+        cache_stats = self.cache.get_stats()
+        stats['cache_hits'] = cache_stats['hits']
+        stats['cache_misses'] = cache_stats['misses']
+        stats['cache_size'] = cache_stats['size']
+        return stats
+    
+    def _compress_bytes(self, body, encoding):
+        """壓縮完整內容"""
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+    
+    def _compress_stream(self, response, encoding):
+        """串流回應逐段壓縮，每段都 flush 讓用戶端立即收到資料"""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31：gzip 格式
+            process = compressor.compress
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+        
+        chunks = response.response
+        
+        def generate():
+            bytes_in = bytes_out = 0
+            cpu_seconds = 0.0
+            try:
+                for chunk in chunks:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    started = time.thread_time()
+                    data = process(chunk) + flush()
+                    cpu_seconds += time.thread_time() - started
+                    bytes_in += len(chunk)
+                    bytes_out += len(data)
+                    yield data
+                data = finish()
+                bytes_out += len(data)
+                yield data
+            finally:
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+                self._record(encoding, bytes_in, bytes_out, cpu_seconds, streamed=True)
+        
+        response.response = generate()
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+    
+    def _record(self, encoding, bytes_in, bytes_out, cpu_seconds, streamed=False):
+        """累計壓縮統計"""
+        with self._lock:
+            self._stats['streamed' if streamed else 'compressed'] += 1
+            self._stats['bytes_in'] += bytes_in
+            self._stats['bytes_out'] += bytes_out
+            self._stats['cpu_seconds'] += cpu_seconds
+            self._by_encoding[encoding] += 1
+
+response_compressor = ResponseCompressor()
\ No newline at end of file
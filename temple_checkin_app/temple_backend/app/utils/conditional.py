@@ -0,0 +1,54 @@
+import hashlib
+from datetime import timezone
+from flask import request, current_app
+
+from app.utils.compression import CONTENT_ENCODINGS
+from app.utils.negotiation import response_mimetype
+
+def make_etag(*parts):
+    """由版本資訊產生強 ETag（不含引號），協商的回應格式也納入"""
+    raw = '\n'.join('' if part is None else str(part) for part in parts + (response_mimetype(),))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def not_modified_response(etag, last_modified=None):
+    """條件式 GET：用戶端版本仍有效時回傳 304 回應，否則回傳 None
+    
+    有 If-None-Match 時只比對 ETag（依 RFC 7232 使用弱比對），沒有時才看 If-Modified-Since。
+    壓縮後的回應 ETag 帶有編碼後綴，比對時一併接受，304 回傳用戶端持有的那一個。
+    """
+    last_modified = _http_time(last_modified)
+    
+    if request.if_none_match:
+        variants = [etag] + [f'{etag}-{encoding}' for encoding in CONTENT_ENCODINGS]
+        matched = next((variant for variant in variants if request.if_none_match.contains_weak(variant)), None)
+        if matched:
+            etag = matched
+        elif request.if_none_match.star_tag:
+            matched = True
+    elif request.if_modified_since and last_modified:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    
+    if not matched:
+        return None
+    
+    response = current_app.response_class(status=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+def set_validators(response, etag, last_modified=None):
+    """附上 ETag 與 Last-Modified，並要求快取每次重新驗證"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _http_time(last_modified)
+    response.cache_control.no_cache = True
+    return response
+
+def _http_time(value):
+    """資料庫的 UTC 時間轉為 HTTP 日期精度（秒）"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
\ No newline at end of file
@@ -0,0 +1,38 @@
+from app.models import CacheGeneration
+from app.utils.cache import LRUCache
+from app.utils.metrics import register_metrics
+
+# cache_generations 中的名稱（使用者註冊或修改使用者名稱時遞增；信箱無法修改，
+# 啟用狀態不在列表的篩選條件中，切換時不遞增）
+USERS_GENERATION = 'users'
+
+class CountCache:
+    """分頁總數快取（count=estimate 使用）
+    
+    以查詢的 SQL 與參數加上資料表世代為 key 保存 COUNT(*) 結果；
+    寫入時遞增世代，舊的總數即不再命中。TTL 為總數可能過期的上限。
+    """
+    
+    def __init__(self, app=None):
+        self.cache = LRUCache(maxsize=1024, ttl=300)
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定調整容量與 TTL"""
+        self.cache.resize(app.config['COUNT_CACHE_SIZE'], app.config['COUNT_CACHE_TTL_SECONDS'])
+        register_metrics('count_cache', self.cache.get_stats)
+    
+    def get_total(self, query, generation_name=None):
+        """取得查詢的總數（快取未命中時執行一次 COUNT）"""
+        generation = CacheGeneration.get(generation_name) if generation_name else 0
+        statement = query.order_by(None).statement.compile()
+        key = (generation_name, generation, str(statement), tuple(sorted(statement.params.items())))
+        
+        total = self.cache.get(key)
+        if total is None:
+            total = query.order_by(None).count()
+            self.cache.set(key, total)
+        return total
+
+count_cache = CountCache()
\ No newline at end of file
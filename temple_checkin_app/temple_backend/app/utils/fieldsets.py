@@ -0,0 +1,74 @@
+from collections import namedtuple
+from flask import request
+
+from app.models import db
+
+# fields：要輸出的欄位（None 為全部）；include：要附上的區塊；nested：關聯 -> 欄位
+Fieldset = namedtuple('Fieldset', ['fields', 'include', 'nested'])
+
+def parse_fieldset(model, includes=(), default_include=(), relations=None):
+    """解析 fields= 與 include= 查詢參數
+    
+    fields 以逗號分隔，可用「關聯.欄位」指定關聯要輸出的欄位（例如 temple.name），
+    只列關聯名稱則輸出該關聯的全部欄位；未帶 include 時使用 default_include，
+    維持原本的回應內容。回傳 (errors, fieldset)。
+    """
+    errors = []
+    relations = relations or {}
+    include = set(default_include)
+    fields = None
+    nested = {}
+    
+    raw_include = request.args.get('include')
+    if raw_include is not None:
+        include = set()
+        for name in _split(raw_include):
+            if name in includes:
+                include.add(name)
+            else:
+                errors.append(f'不支援的 include：{name}')
+    
+    raw_fields = request.args.get('fields')
+    if raw_fields is not None:
+        fields = set()
+        for name in _split(raw_fields):
+            relation, _, sub_field = name.partition('.')
+            if relation in relations and relation in includes:
+                include.add(relation)
+                if not sub_field:
+                    nested[relation] = None
+                elif sub_field in relations[relation].FIELDS:
+                    if nested.get(relation, frozenset()) is not None:
+                        nested[relation] = nested.get(relation, frozenset()) | {sub_field}
+                else:
+                    errors.append(f'不支援的欄位：{name}')
+            elif name in model.FIELDS:
+                fields.add(name)
+            else:
+                errors.append(f'不支援的欄位：{name}')
+        if not fields:
+            fields.add('id')
+        fields = frozenset(fields)
+    
+    return errors, Fieldset(fields, include, nested)
+
+def apply_fieldset(query, model, fieldset, required=()):
+    """依 fieldset 只讀取需要的欄位（load_only）
+    
+    required 為回應以外仍需要的欄位，例如游標分頁的排序鍵。
+    """
+    if fieldset.fields is None:
+        return query
+    
+    columns = {'id'}
+    columns.update(required)
+    columns.update(name for name in fieldset.fields if name in model.__table__.c)
+    include_columns = getattr(model, 'INCLUDE_COLUMNS', {})
+    for name in fieldset.include:
+        columns.update(include_columns.get(name, ()))
+    
+    return query.options(db.load_only(*(getattr(model, name) for name in sorted(columns))))
+
+def _split(value):
+    """拆解逗號分隔的參數"""
+    return [name.strip() for name in value.split(',') if name.strip()]
\ No newline at end of file
@@ -0,0 +1,286 @@
+import heapq
+import math
+
+try:
+    import numpy as np
+except ImportError:  # 未安裝時使用純 Python 計算
+    np = None
+
+# 地球半徑（公里）
+EARTH_RADIUS_KM = 6371
+
+# 緯度每度約 111 公里
+KM_PER_DEGREE = 111.0
+
+# 少於此筆數時純 Python 較快（NumPy 陣列建立的固定成本）
+NUMPY_MIN_SIZE = 32
+
+# 距離計算方式：auto 依筆數與是否安裝 NumPy 自動選擇，numpy / python 強制使用其中一種
+DISTANCE_BACKENDS = ('auto', 'numpy', 'python')
+
+# geohash 字元表與 temples.geohash 保存的長度（9 碼約 4.8 x 4.8 公尺）
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+
+# 前綴範圍查詢一次最多使用的格數
+GEOHASH_MAX_CELLS = 16
+
+# Web Mercator（地圖圖磚）可表示的最大緯度
+MERCATOR_MAX_LAT = 85.05112878
+
+def haversine(lat1, lng1, lat2, lng2):
+    """兩點間的大圓距離（公里）"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    a = (math.sin((lat2_rad - lat1_rad) / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+def bounding_box(latitude, longitude, radius_km):
+    """半徑的邊界框 (最小緯度, 最大緯度, 最小經度, 最大經度)"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+def inner_box(latitude, longitude, radius_km):
+    """完全落在半徑內的邊界框 (最小緯度, 最大緯度, 最小經度, 最大經度)，無法保證時回傳 None
+    
+    經緯度框離中心最遠的點是四個角，四角都在半徑內即整個框都在半徑內。
+    """
+    if radius_km <= 0:
+        return None
+    half = radius_km / math.sqrt(2) * 0.999  # 保留計算誤差
+    lat_delta = math.degrees(half / EARTH_RADIUS_KM)
+    lat_min, lat_max = latitude - lat_delta, latitude + lat_delta
+    if lat_min <= -90.0 or lat_max >= 90.0:
+        return None
+    # 框內最接近赤道的緯度每度經度最長，以此換算經度範圍
+    equator_side = 0.0 if lat_min <= 0.0 <= lat_max else min(abs(lat_min), abs(lat_max))
+    lng_delta = math.degrees(half / (EARTH_RADIUS_KM * math.cos(math.radians(equator_side))))
+    if lng_delta >= 180.0:
+        return None
+    
+    lats, lngs = (lat_min, lat_max), (longitude - lng_delta, longitude + lng_delta)
+    if any(haversine(latitude, longitude, lat, lng) > radius_km for lat in lats for lng in lngs):
+        return None
+    return lat_min, lat_max, lngs[0], lngs[1]
+
+def outside_box(lat_column, lng_column, box):
+    """座標不在 box 內的 SQL 條件（box 為 None 時不限制）"""
+    from sqlalchemy import and_, not_, true
+    
+    if box is None:
+        return true()
+    lat_min, lat_max, lng_min, lng_max = box
+    return not_(and_(lat_column.between(lat_min, lat_max), lng_column.between(lng_min, lng_max)))
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """座標轉為 geohash 字串"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        # 偶數位元切經度、奇數位元切緯度
+        coordinate, interval = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (interval[0] + interval[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            interval[0] = mid
+        else:
+            value *= 2
+            interval[1] = mid
+        even = not even
+        
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            value = bits = 0
+    return ''.join(chars)
+
+def geohash_ranges(lat_min, lat_max, lng_min, lng_max, max_cells=GEOHASH_MAX_CELLS, exclude=None):
+    """涵蓋邊界框的 geohash 字串範圍 [(起, 迄)]（迄不含，None 為無上限）
+    
+    選擇格數不超過 max_cells 的最長前綴，geohash 順序上相鄰的格子合併為同一範圍，
+    每個範圍都是 geohash 索引上的一次範圍掃描。exclude 為邊界框時略過整格都在
+    其中的格子（環狀範圍只掃描外圈），格數也只計算未略過的格子。
+    """
+    lat_min, lat_max = max(lat_min, -90.0), min(lat_max, 90.0)
+    lng_min, lng_max = max(lng_min, -180.0), min(lng_max, 180.0)
+    
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        rows, cols = _geohash_span(candidate, lat_min, lat_max, lng_min, lng_max)
+        inner_rows, inner_cols = _geohash_inner_span(candidate, exclude)
+        if len(rows) * len(cols) - _overlap(rows, inner_rows) * _overlap(cols, inner_cols) <= max_cells:
+            precision = candidate
+            break
+    
+    rows, cols = _geohash_span(precision, lat_min, lat_max, lng_min, lng_max)
+    inner_rows, inner_cols = _geohash_inner_span(precision, exclude)
+    lat_bits, lng_bits = _geohash_bits(precision)
+    cell_lat = 180.0 / (1 << lat_bits)
+    cell_lng = 360.0 / (1 << lng_bits)
+    cells = sorted({
+        _geohash_int(geohash_encode(-90.0 + (row + 0.5) * cell_lat, -180.0 + (col + 0.5) * cell_lng, precision))
+        for row in rows
+        for col in (_outside(cols, inner_cols) if row in inner_rows else cols)
+    })
+    
+    # 合併連續的格子
+    ranges = []
+    for cell in cells:
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1][1] = cell + 1
+        else:
+            ranges.append([cell, cell + 1])
+    
+    limit = 32 ** precision
+    return [
+        (_geohash_str(start, precision), _geohash_str(end, precision) if end < limit else None)
+        for start, end in ranges
+    ]
+
+def mercator_xy(latitude, longitude):
+    """Web Mercator 正規化座標 (x, y)，範圍 0 到 1（x 由西往東、y 由北往南增加）"""
+    sin_lat = math.sin(math.radians(max(min(latitude, MERCATOR_MAX_LAT), -MERCATOR_MAX_LAT)))
+    x = (longitude + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+def available_backends():
+    """目前環境可使用的距離計算方式（不含 auto）"""
+    return ('numpy', 'python') if np is not None else ('python',)
+
+def distances_from(latitude, longitude, lats, lngs, backend='auto'):
+    """一點到多點的距離（公里），依 lats / lngs 的順序回傳 list"""
+    if _use_numpy(len(lats), backend):
+        return _distances_numpy(latitude, longitude, lats, lngs).tolist()
+    return _distances_python(latitude, longitude, lats, lngs)
+
+def distance_matrix(points, lats, lngs, backend='auto'):
+    """多點到多點的距離（公里），回傳 len(points) x len(lats) 的巢狀 list"""
+    if _use_numpy(len(points) * len(lats), backend):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return _distances_numpy(points[:, 0:1], points[:, 1:2], lats, lngs).tolist()
+    return [_distances_python(latitude, longitude, lats, lngs) for latitude, longitude in points]
+
+def nearest(latitude, longitude, lats, lngs, radius_km=None, limit=None, backend='auto'):
+    """找出距離最近的點，回傳依距離排序的 [(位置, 距離公里)]
+    
+    radius_km 指定時只保留半徑內的點；limit 指定時最多回傳 limit 筆，
+    NumPy 以 argpartition 只排序前 limit 筆。
+    """
+    if _use_numpy(len(lats), backend):
+        distances = _distances_numpy(latitude, longitude, lats, lngs)
+        positions = np.arange(len(distances))
+        if radius_km is not None:
+            positions = positions[distances <= radius_km]
+        if limit is not None and limit < len(positions):
+            positions = positions[np.argpartition(distances[positions], limit - 1)[:limit]]
+        positions = positions[np.argsort(distances[positions], kind='stable')]
+        return list(zip(positions.tolist(), distances[positions].tolist()))
+    
+    hits = [
+        (distance, position)
+        for position, distance in enumerate(_distances_python(latitude, longitude, lats, lngs))
+        if radius_km is None or distance <= radius_km
+    ]
+    hits = heapq.nsmallest(limit, hits) if limit is not None else sorted(hits)
+    return [(position, distance) for distance, position in hits]
+
+def take(values, positions):
+    """依位置取出陣列中的值（NumPy 可用時直接以索引陣列取值）"""
+    if np is not None and len(positions) >= NUMPY_MIN_SIZE:
+        return np.frombuffer(values, dtype=float)[np.asarray(positions, dtype=np.intp)]
+    return [values[position] for position in positions]
+
+def _use_numpy(size, backend):
+    """依 backend 與資料筆數決定是否使用 NumPy"""
+    if backend == 'auto':
+        return np is not None and size >= NUMPY_MIN_SIZE
+    if backend not in DISTANCE_BACKENDS:
+        raise ValueError(f'不支援的距離計算方式：{backend}')
+    if backend == 'numpy' and np is None:
+        raise RuntimeError('距離計算指定 numpy 但未安裝 NumPy')
+    return backend == 'numpy'
+
+def _geohash_bits(precision):
+    """geohash 長度對應的 (緯度位元數, 經度位元數)"""
+    bits = precision * 5
+    return bits // 2, (bits + 1) // 2
+
+def _geohash_span(precision, lat_min, lat_max, lng_min, lng_max):
+    """邊界框在該長度下涵蓋的 (列範圍, 行範圍)"""
+    lat_bits, lng_bits = _geohash_bits(precision)
+    cell_lat = 180.0 / (1 << lat_bits)
+    cell_lng = 360.0 / (1 << lng_bits)
+    rows = range(
+        int((lat_min + 90.0) // cell_lat),
+        min(int((lat_max + 90.0) // cell_lat), (1 << lat_bits) - 1) + 1
+    )
+    cols = range(
+        int((lng_min + 180.0) // cell_lng),
+        min(int((lng_max + 180.0) // cell_lng), (1 << lng_bits) - 1) + 1
+    )
+    return rows, cols
+
+def _geohash_inner_span(precision, box):
+    """整格都在邊界框內的 (列範圍, 行範圍)，box 為 None 時為空範圍"""
+    if box is None:
+        return range(0), range(0)
+    lat_min, lat_max, lng_min, lng_max = box
+    lat_bits, lng_bits = _geohash_bits(precision)
+    cell_lat = 180.0 / (1 << lat_bits)
+    cell_lng = 360.0 / (1 << lng_bits)
+    rows = range(math.ceil((lat_min + 90.0) / cell_lat), math.floor((lat_max + 90.0) / cell_lat))
+    cols = range(math.ceil((lng_min + 180.0) / cell_lng), math.floor((lng_max + 180.0) / cell_lng))
+    return rows, cols
+
+def _overlap(a, b):
+    """兩個連續範圍重疊的個數"""
+    return max(min(a.stop, b.stop) - max(a.start, b.start), 0)
+
+def _outside(values, excluded):
+    """連續範圍 values 中不在 excluded 內的值"""
+    if not excluded:
+        return values
+    return [value for value in values if not excluded.start <= value < excluded.stop]
+
+def _geohash_int(geohash):
+    """geohash 字串轉為整數（與字串順序相同）"""
+    value = 0
+    for char in geohash:
+        value = value * 32 + GEOHASH_BASE32.index(char)
+    return value
+
+def _geohash_str(value, precision):
+    """整數轉回指定長度的 geohash 字串"""
+    chars = []
+    for _ in range(precision):
+        value, digit = divmod(value, 32)
+        chars.append(GEOHASH_BASE32[digit])
+    return ''.join(reversed(chars))
+
+def _distances_numpy(latitude, longitude, lats, lngs):
+    """NumPy 向量化的 Haversine（latitude / longitude 可為欄向量以計算矩陣）"""
+    lat0 = np.radians(latitude)
+    lats = np.radians(np.asarray(lats, dtype=float))
+    dlng = np.radians(np.asarray(lngs, dtype=float) - longitude)
+    a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _distances_python(latitude, longitude, lats, lngs):
+    """純 Python 的 Haversine（一點到多點）"""
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    lat0 = radians(latitude)
+    cos_lat0 = cos(lat0)
+    diameter = 2 * EARTH_RADIUS_KM
+    
+    distances = []
+    for lat, lng in zip(lats, lngs):
+        lat1 = radians(lat)
+        a = sin((lat1 - lat0) / 2) ** 2 + cos_lat0 * cos(lat1) * sin(radians(lng - longitude) / 2) ** 2
+        distances.append(diameter * asin(sqrt(min(a, 1.0))))
+    return distances
\ No newline at end of file
@@ -1,7 +1,9 @@
 import uuid
 import json
-from datetime import datetime
-from flask import jsonify
+import base64
+from datetime import datetime, timezone
+from app.utils.negotiation import encode_response, decode_request_body
+from app.utils.count_cache import count_cache
 
 def generate_uuid():
     """生成 UUID"""
@@ -13,9 +15,9 @@ def success_response(data=None, message='成功', status_code=200):
         'success': True,
         'message': message,
         'data': data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow()
     }
-    return jsonify(response), status_code
+    return encode_response(response, status_code), status_code
 
 def error_response(message='發生錯誤', errors=None, status_code=400):
     """錯誤回應格式"""
@@ -23,24 +25,26 @@ def error_response(message='發生錯誤', errors=None, status_code=400):
         'success': False,
         'message': message,
         'errors': errors or [],
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow()
     }
-    return jsonify(response), status_code
+    return encode_response(response, status_code), status_code
 
-def paginate_response(query, page, per_page, endpoint=None, **kwargs):
-    """分頁回應格式"""
+def paginate_response(query, page, per_page, endpoint=None, count='exact', count_key=None, **kwargs):
+    """分頁回應格式（kwargs 會傳給每筆資料的 to_dict 或模型的 to_dict_many）
+    
+    count 為 exact 時以 COUNT(*) 計算總數；none 不計算總數（total、pages 為 None），
+    多取一筆判斷是否有下一頁；estimate 使用快取的總數，count_key 對應的資料表
+    世代遞增（寫入）時重新計算。非 exact 模式的 pagination 會多一個 count 欄位。
+    """
     try:
-        paginated = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
-        
-        items = [item.to_dict() if hasattr(item, 'to_dict') else item for item in paginated.items]
-        
-        response_data = {
-            'items': items,
-            'pagination': {
+        if count == 'exact':
+            paginated = query.paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            rows = paginated.items
+            pagination = {
                 'page': paginated.page,
                 'per_page': paginated.per_page,
                 'total': paginated.total,
@@ -50,22 +54,70 @@ def paginate_response(query, page, per_page, endpoint=None, **kwargs):
                 'has_next': paginated.has_next,
                 'next_num': paginated.next_num,
             }
+        else:
+            rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            
+            total = pages = None
+            if count == 'estimate':
+                total = count_cache.get_total(query, count_key)
+                pages = -(-total // per_page)
+            
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': pages,
+                'has_prev': page > 1,
+                'prev_num': page - 1 if page > 1 else None,
+                'has_next': has_next,
+                'next_num': page + 1 if has_next else None,
+                'count': count,
+            }
+        
+        # 模型有 to_dict_many 時整頁一起轉換，統計或關聯可批次查詢
+        model = type(rows[0]) if rows else None
+        if hasattr(model, 'to_dict_many'):
+            items = model.to_dict_many(rows, **kwargs)
+        else:
+            items = [item.to_dict(**kwargs) if hasattr(item, 'to_dict') else item for item in rows]
+        
+        response_data = {
+            'items': items,
+            'pagination': pagination,
         }
         
         return success_response(response_data)
     except Exception as e:
         return error_response(f'分頁查詢失敗: {str(e)}', status_code=500)
 
+def encode_cursor(*values):
+    """將排序鍵編碼為不透明的分頁游標（datetime 以 ISO 格式保存）"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """解碼分頁游標，格式不正確或長度不符時回傳 None"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
 def safe_get_json():
-    """安全取得 JSON 資料"""
+    """安全取得請求資料（JSON，或依 Content-Type 解析 MessagePack / CBOR）"""
     try:
-        from flask import request
-        data = request.get_json()
+        data = decode_request_body()
         if data is None:
             return {}, ['請求必須包含 JSON 資料']
         return data, []
     except Exception as e:
-        return {}, [f'JSON 格式錯誤: {str(e)}']
+        return {}, [f'JSON 格式錯誤: {str(e) or type(e).__name__}']
 
 def format_datetime(dt):
     """格式化日期時間"""
@@ -80,6 +132,22 @@ def parse_datetime(date_string):
     except:
         return None
 
+def parse_utc_datetime(value):
+    """解析日期時間字串並轉為無時區的 UTC 時間（無時區者視為 UTC）
+    
+    也接受二進位格式請求中已解碼的 datetime。
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        parsed = parse_datetime(value)
+    else:
+        return None
+    
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 def calculate_points(base_points, bonus_multiplier=1, special_bonus=0):
     """計算福報值"""
     return int(base_points * bonus_multiplier) + special_bonus
@@ -89,6 +157,10 @@ def generate_amulet_uid():
     # 生成 8 字元的十六進位字串
     return uuid.uuid4().hex[:8].upper()
 
+def normalize_amulet_uid(uid):
+    """正規化平安符 UID（去除空白並轉大寫）"""
+    return uid.strip().upper() if isinstance(uid, str) else uid
+
 def is_valid_coordinates(latitude, longitude):
     """驗證座標是否有效"""
     try:
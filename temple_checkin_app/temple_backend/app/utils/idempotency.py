@@ -0,0 +1,183 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, make_response, current_app
+from werkzeug.http import parse_options_header
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, IdempotencyKey
+from app.utils.auth import verify_jwt
+from app.utils.cache import LRUCache
+from app.utils.helpers import error_response
+from app.utils.metrics import register_metrics
+from app.utils.negotiation import DECODABLE_MIMETYPES, decode_body, encode_response, response_mimetype
+
+# 重播所需的回應內容
+StoredResponse = namedtuple('StoredResponse', ['request_hash', 'status_code', 'content_type', 'body'])
+
+class IdempotencyStore:
+    """Idempotency-Key 回應儲存（記憶體 LRU + 資料表供跨 worker 使用）"""
+    
+    def __init__(self, app=None):
+        self.ttl = 86400
+        self.lock_timeout = 60
+        self.cache = LRUCache(maxsize=1024, ttl=self.ttl)
+        self._begin_count = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定調整容量與保存時間"""
+        self.ttl = app.config['IDEMPOTENCY_TTL_SECONDS']
+        self.lock_timeout = app.config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS']
+        self.cache.resize(app.config['IDEMPOTENCY_CACHE_SIZE'], self.ttl)
+        register_metrics('idempotency', self.cache.get_stats)
+    
+    def get(self, key):
+        """取得已儲存的回應（或處理中的佔位記錄）"""
+        stored = self.cache.get(key)
+        if stored is not None:
+            return stored
+        
+        record = IdempotencyKey.query.filter(
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > datetime.utcnow()
+        ).first()
+        if record is None:
+            return None
+        
+        stored = StoredResponse(record.request_hash, record.status_code, record.content_type, record.response_body)
+        if stored.status_code is not None:
+            self.cache.set(key, stored)
+        return stored
+    
+    def begin(self, key, request_hash):
+        """寫入處理中的佔位記錄，若其他請求已搶先則回傳 False
+        
+        佔位記錄只保留 lock_timeout 秒，處理中的 worker 當掉時，
+        逾時後同一個 key 可以重新取得；完成時才延長為 ttl。
+        """
+        now = datetime.utcnow()
+        try:
+            # 定期清除過期記錄
+            self._begin_count += 1
+            if self._begin_count % 100 == 0:
+                IdempotencyKey.query.filter(IdempotencyKey.expires_at <= now).delete()
+            else:
+                IdempotencyKey.query.filter(
+                    IdempotencyKey.key == key,
+                    IdempotencyKey.expires_at <= now
+                ).delete()
+            
+            db.session.add(IdempotencyKey(key, request_hash, now + timedelta(seconds=self.lock_timeout)))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+    
+    def complete(self, key, request_hash, response, body=None):
+        """儲存第一次的回應（body 指定時儲存該內容而非回應本身）"""
+        if body is None:
+            body = response.get_data()
+        db.session.query(IdempotencyKey).filter(IdempotencyKey.key == key).update({
+            'status_code': response.status_code,
+            'content_type': response.content_type,
+            'response_body': body,
+            'expires_at': datetime.utcnow() + timedelta(seconds=self.ttl),
+        })
+        db.session.commit()
+        self.cache.set(key, StoredResponse(request_hash, response.status_code, response.content_type, body))
+    
+    def abort(self, key):
+        """移除佔位記錄，讓客戶端可以重試"""
+        db.session.rollback()
+        db.session.query(IdempotencyKey).filter(IdempotencyKey.key == key).delete()
+        db.session.commit()
+
+idempotency_store = IdempotencyStore()
+
+def idempotent(f=None, redact=None, restore=None):
+    """支援 Idempotency-Key 標頭的裝飾器（重試時重播第一次的回應）
+    
+    回應內容會保存在 idempotency_keys 資料表中。回應含 token 等不可保存的資料時，
+    以 redact 從解碼後的成功回應移除，重播時再由 restore 補上（例如重新簽發 token）。
+    """
+    if f is None:
+        return lambda f: idempotent(f, redact, restore)
+    
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        client_key = request.headers.get('Idempotency-Key')
+        if not client_key:
+            return f(*args, **kwargs)
+        
+        if len(client_key) > 255:
+            return error_response('Idempotency-Key 不能超過255個字元')
+        
+        key = _scoped_key(client_key)
+        if key is None:
+            return f(*args, **kwargs)
+        
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        
+        stored = idempotency_store.get(key)
+        if stored is None and not idempotency_store.begin(key, request_hash):
+            stored = idempotency_store.get(key)
+        
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                return error_response('Idempotency-Key 已用於不同的請求內容', status_code=422)
+            if stored.status_code is None:
+                return error_response('相同 Idempotency-Key 的請求處理中', status_code=409)
+            
+            response = _replay(stored, restore)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_store.abort(key)
+            raise
+        
+        # 伺服器錯誤不保存，讓客戶端可以重試
+        if response.status_code >= 500 or response.is_streamed:
+            idempotency_store.abort(key)
+        elif redact is not None and response.status_code < 300:
+            payload = redact(decode_body(response.get_data(), response.mimetype))
+            idempotency_store.complete(key, request_hash, response, encode_response(payload).get_data())
+        else:
+            idempotency_store.complete(key, request_hash, response)
+        
+        return response
+    return decorated_function
+
+def _replay(stored, restore=None):
+    """重播已儲存的回應
+    
+    重試的 Accept 與第一次不同時，解碼後以本次協商的格式重新編碼；
+    有 restore 時成功回應也解碼後交給 restore 補上未保存的資料。
+    """
+    stored_mimetype = parse_options_header(stored.content_type)[0]
+    restoring = restore is not None and stored.status_code < 300
+    if (stored_mimetype == response_mimetype() and not restoring) or stored_mimetype not in DECODABLE_MIMETYPES:
+        return current_app.response_class(stored.body, status=stored.status_code, content_type=stored.content_type)
+    
+    payload = decode_body(stored.body, stored_mimetype)
+    if restoring:
+        payload = restore(payload)
+    return encode_response(payload, stored.status_code)
+
+def _scoped_key(client_key):
+    """以使用者、方法與路徑限定 key 的範圍"""
+    try:
+        verify_jwt(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None  # token 無效時交由路由本身回覆錯誤
+    
+    raw = f'{identity or ""}\n{request.method}\n{request.path}\n{client_key}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # 未安裝時使用標準函式庫
+    orjson = None
+
+def _default(obj):
+    """標準函式庫與 orjson 共用的型別轉換"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'無法序列化的型別：{type(obj).__name__}')
+
+class JSONBackend:
+    """回應 JSON 編碼（有 orjson 時使用 orjson，否則使用標準函式庫）
+    
+    兩種後端輸出相同格式：緊湊、不跳脫非 ASCII 字元、不排序鍵。
+    JSON_BACKEND 可設為 auto、orjson 或 json。
+    """
+    
+    def __init__(self, app=None):
+        self.name = 'orjson' if orjson is not None else 'json'
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """依設定選擇編碼後端"""
+        name = app.config.get('JSON_BACKEND', 'auto')
+        if name == 'auto':
+            name = 'orjson' if orjson is not None else 'json'
+        if name not in ('orjson', 'json'):
+            raise ValueError(f'不支援的 JSON_BACKEND：{name}')
+        if name == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_BACKEND=orjson 但未安裝 orjson')
+        self.name = name
+    
+    def dumps(self, obj):
+        """編碼為 UTF-8 bytes"""
+        if self.name == 'orjson':
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    def response(self, obj, status_code=200):
+        """建立 JSON 回應"""
+        return current_app.response_class(self.dumps(obj), status=status_code, mimetype='application/json')
+
+json_backend = JSONBackend()
\ No newline at end of file
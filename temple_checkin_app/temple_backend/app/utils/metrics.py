@@ -0,0 +1,10 @@
+# 執行期統計來源（快取命中率、寫入緩衝等）
+_sources = {}
+
+def register_metrics(name, collector):
+    """註冊統計來源，collector 為回傳 dict 的函式"""
+    _sources[name] = collector
+
+def collect_metrics():
+    """收集所有已註冊的統計"""
+    return {name: collector() for name, collector in _sources.items()}
\ No newline at end of file
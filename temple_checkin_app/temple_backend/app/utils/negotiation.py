@@ -0,0 +1,115 @@
+import base64
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import uuid
+from flask import request, current_app
+
+try:
+    import msgpack
+except ImportError:  # 未安裝時不提供 MessagePack
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # 未安裝時不提供 CBOR
+    cbor2 = None
+
+from app.utils.json_backend import json_backend
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+CBOR_MIMETYPE = 'application/cbor'
+
+def _binary_default(obj):
+    """二進位格式共用的型別轉換（datetime 以外）"""
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (uuid.UUID, Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'無法序列化的型別：{type(obj).__name__}')
+
+def _msgpack_default(obj):
+    """datetime 轉為 MessagePack timestamp（無時區者視為 UTC）"""
+    if isinstance(obj, datetime):
+        return msgpack.Timestamp.from_datetime(obj if obj.tzinfo else obj.replace(tzinfo=timezone.utc))
+    return _binary_default(obj)
+
+def _msgpack_dumps(obj):
+    return msgpack.packb(obj, default=_msgpack_default, use_bin_type=True)
+
+def _msgpack_loads(data):
+    return msgpack.unpackb(data, raw=False, timestamp=3)
+
+def _cbor_default(encoder, obj):
+    encoder.encode(_binary_default(obj))
+
+def _cbor_dumps(obj):
+    return cbor2.dumps(obj, default=_cbor_default, timezone=timezone.utc, datetime_as_timestamp=True)
+
+def _cbor_loads(data):
+    return cbor2.loads(data)
+
+# Content-Type -> (編碼, 解碼)，只列出已安裝的格式
+BINARY_CODECS = {}
+if msgpack is not None:
+    BINARY_CODECS.update(dict.fromkeys(MSGPACK_MIMETYPES, (_msgpack_dumps, _msgpack_loads)))
+if cbor2 is not None:
+    BINARY_CODECS[CBOR_MIMETYPE] = (_cbor_dumps, _cbor_loads)
+
+# JSON 排第一：Accept 為 */* 或未指定時使用 JSON
+_OFFERED = [JSON_MIMETYPE] + list(BINARY_CODECS)
+
+# decode_body 可解碼的回應格式
+DECODABLE_MIMETYPES = frozenset(_OFFERED)
+
+def response_mimetype():
+    """依 Accept 選擇回應格式（JSON、MessagePack 或 CBOR）"""
+    if not BINARY_CODECS or not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    return request.accept_mimetypes.best_match(_OFFERED) or JSON_MIMETYPE
+
+def encode_response(obj, status_code=200):
+    """以協商的格式建立回應（datetime 在二進位格式中為原生 timestamp）"""
+    mimetype = response_mimetype()
+    if mimetype == JSON_MIMETYPE:
+        body = json_backend.dumps(obj)
+    else:
+        body = BINARY_CODECS[mimetype][0](obj)
+    
+    response = current_app.response_class(body, status=status_code, mimetype=mimetype)
+    if BINARY_CODECS:
+        response.vary.add('Accept')
+    return response
+
+def decode_body(data, mimetype):
+    """解碼 encode_response 產生的內容（重播已儲存的回應時使用）"""
+    codec = BINARY_CODECS.get(mimetype)
+    return codec[1](data) if codec else json.loads(data)
+
+def decode_request_body():
+    """依 Content-Type 解析請求內容（JSON、MessagePack 或 CBOR），沒有內容時回傳 None"""
+    codec = BINARY_CODECS.get(request.mimetype)
+    if codec is None:
+        return request.get_json()
+    
+    data = request.get_data()
+    return _to_json_safe(codec[1](data)) if data else None
+
+def _to_json_safe(value):
+    """將二進位格式解碼出的值轉為 JSON 可表示的型別
+    
+    datetime 轉為 ISO 字串、bytes 轉為 base64 字串，解析後的內容與 JSON
+    請求相同，可直接寫入 JSON 欄位與寫入緩衝的日誌。
+    """
+    if isinstance(value, dict):
+        return {_to_json_safe(key): _to_json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_safe(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    return value
\ No newline at end of file
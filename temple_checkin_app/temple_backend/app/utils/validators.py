@@ -1,5 +1,6 @@
 import re
 from email_validator import validate_email, EmailNotValidError
+from app.utils.helpers import parse_utc_datetime
 
 def validate_username(username):
     """驗證使用者名稱"""
@@ -84,6 +85,40 @@ def validate_temple_data(data):
     except (ValueError, TypeError):
         errors.append('福報加成值必須為整數')
     
+    # 驗證打卡冷卻時數
+    if 'checkin_cooldown_hours' in data:
+        try:
+            cooldown_hours = int(data['checkin_cooldown_hours'])
+            if cooldown_hours < 0 or cooldown_hours > 720:
+                errors.append('打卡冷卻時數必須在 0 到 720 之間')
+        except (ValueError, TypeError):
+            errors.append('打卡冷卻時數必須為整數')
+    
+    return errors
+
+def validate_campaign_data(data, partial=False):
+    """驗證加碼活動資料（partial 為 True 時只驗證有提供的欄位）"""
+    errors = []
+    
+    if not partial or 'name' in data:
+        name = data.get('name')
+        if not isinstance(name, str) or not name.strip():
+            errors.append('活動名稱不能為空')
+        elif len(name) > 100:
+            errors.append('活動名稱不能超過100個字元')
+    
+    if not partial or 'bonus_points' in data:
+        try:
+            bonus_points = int(data.get('bonus_points'))
+            if bonus_points < 1 or bonus_points > 100:
+                errors.append('加碼福報值必須在 1 到 100 之間')
+        except (ValueError, TypeError):
+            errors.append('加碼福報值必須為整數')
+    
+    for field in ('starts_at', 'ends_at'):
+        if (not partial or field in data) and parse_utc_datetime(data.get(field)) is None:
+            errors.append(f'{field} 格式不正確')
+    
     return errors
 
 def validate_amulet_data(data):
@@ -113,6 +148,114 @@ def validate_checkin_data(data):
     
     return errors
 
+def validate_batch_checkin_data(data, max_items=500):
+    """驗證批次打卡資料"""
+    errors = []
+    checkins = data.get('checkins')
+    
+    if not isinstance(checkins, list) or not checkins:
+        errors.append('checkins 必須為非空陣列')
+    elif len(checkins) > max_items:
+        errors.append(f'每次最多同步 {max_items} 筆打卡')
+    
+    return errors
+
+def validate_points(points, max_items=100):
+    """驗證座標列表（[[lat, lng], ...] 或 [{"lat": ..., "lng": ...}, ...]，座標須為數字），回傳 (lat, lng) 列表"""
+    if not isinstance(points, list) or not points:
+        return ['points 必須為非空陣列'], []
+    if len(points) > max_items:
+        return [f'每次最多 {max_items} 個座標'], []
+    
+    result = []
+    for index, point in enumerate(points):
+        if isinstance(point, dict):
+            values = (point.get('lat'), point.get('lng'))
+        elif isinstance(point, (list, tuple)) and len(point) == 2:
+            values = point
+        else:
+            values = ()
+        # 只接受數字（字串如 "12" 會被逐字拆成兩個座標，布林值也不是座標）
+        if not values or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            return [f'第 {index + 1} 個座標格式不正確'], []
+        
+        lat, lng = float(values[0]), float(values[1])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return [f'第 {index + 1} 個座標超出範圍'], []
+        result.append((lat, lng))
+    
+    return [], result
+
+def validate_bbox(bbox):
+    """驗證地圖範圍「西經,南緯,東經,北緯」，回傳 (南緯, 北緯, 西經, 東經)
+    
+    西經大於東經表示範圍跨越換日線。
+    """
+    if not bbox:
+        return ['需要提供 bbox 參數'], None
+    
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(','))
+    except ValueError:
+        return ['bbox 必須為「西經,南緯,東經,北緯」四個數字'], None
+    
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return ['bbox 超出範圍'], None
+    return [], (south, north, west, east)
+
+def validate_batch_requests(data, max_items=20):
+    """驗證批次請求（POST /api/batch）的子請求列表"""
+    from app.services.batch_dispatcher import BATCH_METHODS
+    
+    requests = data.get('requests')
+    if not isinstance(requests, list) or not requests:
+        return ['requests 必須為非空陣列']
+    if len(requests) > max_items:
+        return [f'每次最多 {max_items} 個子請求']
+    
+    errors = []
+    for index, item in enumerate(requests):
+        if not isinstance(item, dict):
+            errors.append(f'第 {index + 1} 個子請求格式不正確')
+            continue
+        
+        method = item.get('method', 'GET')
+        path = item.get('path')
+        if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+            errors.append(f'第 {index + 1} 個子請求的 method 必須是 {"、".join(BATCH_METHODS)} 其中之一')
+        if not isinstance(path, str) or not path.startswith('/api/'):
+            errors.append(f'第 {index + 1} 個子請求的 path 必須以 /api/ 開頭')
+        elif path.partition('?')[0].rstrip('/') == '/api/batch':
+            errors.append(f'第 {index + 1} 個子請求不可為批次請求')
+        headers = item.get('headers')
+        if headers is not None and not (isinstance(headers, dict) and all(
+                isinstance(value, str) for value in headers.values())):
+            errors.append(f'第 {index + 1} 個子請求的 headers 必須為字串物件')
+    
+    return errors
+
+def validate_batch_checkin_item(item):
+    """驗證批次打卡中的單筆資料"""
+    if not isinstance(item, dict):
+        return ['打卡資料格式不正確']
+    
+    errors = validate_checkin_data(item)
+    if not item.get('client_time'):
+        errors.append('client_time 為必填欄位')
+    if errors:
+        return errors
+    
+    # 非字串的值無法作為查詢鍵，只拒絕這一筆（client_time 由 parse_utc_datetime 判斷）
+    for field in ('temple_id', 'amulet_uid'):
+        if not isinstance(item[field], str):
+            errors.append(f'{field} 必須為字串')
+    if not isinstance(item.get('notes', ''), str):
+        errors.append('notes 必須為字串')
+    if not isinstance(item.get('extra_data') or {}, dict):
+        errors.append('extra_data 必須為物件')
+    
+    return errors
+
 def validate_pagination_params(page, per_page, max_per_page=100):
     """驗證分頁參數"""
     errors = []
@@ -135,4 +278,30 @@ def validate_pagination_params(page, per_page, max_per_page=100):
         errors.append('每頁數量格式不正確')
         per_page = 20
     
-    return errors, page, per_page
\ No newline at end of file
+    return errors, page, per_page
+
+# 分頁總數計算方式
+COUNT_MODES = ('exact', 'none', 'estimate')
+
+def validate_count_mode(count):
+    """驗證分頁總數計算方式（預設 exact）"""
+    count = count or 'exact'
+    if count not in COUNT_MODES:
+        return [f'count 必須是 {"、".join(COUNT_MODES)} 其中之一'], 'exact'
+    return [], count
+
+def validate_id_list(ids, max_items=100):
+    """驗證 id 列表（逗號分隔字串或字串陣列），回傳去除重複且保留順序的 id"""
+    if isinstance(ids, str):
+        ids = [item.strip() for item in ids.split(',')]
+    
+    if not isinstance(ids, list) or not all(isinstance(item, str) for item in ids):
+        return ['ids 必須為字串陣列或以逗號分隔的字串'], []
+    
+    ids = list(dict.fromkeys(item for item in ids if item))
+    if not ids:
+        return ['ids 不可為空'], []
+    if len(ids) > max_items:
+        return [f'每次最多查詢 {max_items} 筆'], []
+    
+    return [], ids
\ No newline at end of file
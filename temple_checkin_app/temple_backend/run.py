@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 import os
+import time
+from datetime import datetime, timedelta
+import click
 from flask.cli import FlaskGroup
+from sqlalchemy import bindparam
 from app import create_app, db
-from app.models import User, Amulet, Temple, Checkin
+from app.models import User, Amulet, Temple, Checkin, TempleVisit, BlessingLedger, BlessingSnapshot, CacheGeneration
+from app.services.amulet_resolver import AMULETS
+from app.services.temple_catalog import TEMPLE_CATALOG
 
 # 建立應用程式實例
 app = create_app()
@@ -16,7 +22,9 @@ def make_shell_context():
         'User': User,
         'Amulet': Amulet,
         'Temple': Temple,
-        'Checkin': Checkin
+        'Checkin': Checkin,
+        'TempleVisit': TempleVisit,
+        'BlessingLedger': BlessingLedger
     }
 
 @app.cli.command()
@@ -34,6 +42,546 @@ def reset_db():
     db.create_all()
     print('資料庫重置完成！')
 
+@app.cli.command()
+def rebuild_temple_visits():
+    """由打卡記錄重建最後造訪時間表"""
+    print('正在重建最後造訪時間...')
+    visits = TempleVisit.__table__
+    latest = db.select(
+        Checkin.user_id,
+        Checkin.temple_id,
+        db.func.max(Checkin.checkin_time),
+        db.func.count(Checkin.id)
+    ).group_by(Checkin.user_id, Checkin.temple_id)
+    
+    db.session.execute(visits.delete())
+    db.session.execute(visits.insert().from_select(
+        ['user_id', 'temple_id', 'last_checkin_time', 'visit_count'], latest
+    ))
+    db.session.commit()
+    print(f'最後造訪時間重建完成！共 {TempleVisit.query.count()} 筆')
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='每批處理的筆數')
+def rebuild_counters(chunk_size):
+    """由打卡記錄分批重建廟宇、平安符與使用者的計數欄位"""
+    print('正在重建計數欄位...')
+    
+    temples = _rebuild_counter_chunks(Temple, chunk_size, lambda ids: {
+        temple_id: {'checkin_count': checkins, 'unique_visitors_count': visitors}
+        for temple_id, checkins, visitors in db.session.query(
+            Checkin.temple_id,
+            db.func.count(Checkin.id),
+            db.func.count(db.distinct(Checkin.user_id))
+        ).filter(Checkin.temple_id.in_(ids)).group_by(Checkin.temple_id)
+    }, {'checkin_count': 0, 'unique_visitors_count': 0})
+    print(f'廟宇：{temples} 筆')
+    
+    amulets = _rebuild_counter_chunks(Amulet, chunk_size, lambda ids: {
+        amulet_id: {'checkin_count': checkins, 'last_checkin_at': last_checkin_at}
+        for amulet_id, checkins, last_checkin_at in db.session.query(
+            Checkin.amulet_id,
+            db.func.count(Checkin.id),
+            db.func.max(Checkin.checkin_time)
+        ).filter(Checkin.amulet_id.in_(ids)).group_by(Checkin.amulet_id)
+    }, {'checkin_count': 0, 'last_checkin_at': None})
+    print(f'平安符：{amulets} 筆')
+    
+    users = _rebuild_counter_chunks(User, chunk_size, lambda ids: {
+        user_id: {'checkin_count': checkins, 'unique_temples_count': temples}
+        for user_id, checkins, temples in db.session.query(
+            Checkin.user_id,
+            db.func.count(Checkin.id),
+            db.func.count(db.distinct(Checkin.temple_id))
+        ).filter(Checkin.user_id.in_(ids)).group_by(Checkin.user_id)
+    }, {'checkin_count': 0, 'unique_temples_count': 0})
+    print(f'使用者：{users} 筆')
+    
+    print('計數欄位重建完成！')
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='每批處理的筆數')
+@click.option('--missing-only', is_flag=True, help='只補上尚未計算 geohash 的廟宇')
+def backfill_geohash(chunk_size, missing_only):
+    """分批計算廟宇座標的 geohash（附近查詢的前綴範圍掃描使用）"""
+    from app.utils.geo import geohash_encode
+    
+    print('正在計算 geohash...')
+    table = Temple.__table__
+    stmt = table.update().where(table.c.id == bindparam('_id')).values(
+        geohash=bindparam('geohash'),
+        updated_at=table.c.updated_at
+    )
+    
+    total = 0
+    for ids in _iter_id_chunks(table, chunk_size):
+        query = db.select(table.c.id, table.c.latitude, table.c.longitude, table.c.geohash).where(table.c.id.in_(ids))
+        params = []
+        for temple_id, latitude, longitude, current in db.session.execute(query):
+            geohash = geohash_encode(latitude, longitude)
+            if geohash != current and not (missing_only and current):
+                params.append({'_id': temple_id, 'geohash': geohash})
+        
+        if params:
+            db.session.execute(stmt, params)
+            db.session.commit()
+            total += len(params)
+    print(f'geohash 計算完成！共更新 {total} 筆')
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='每批處理的筆數')
+@click.option('--dry-run', is_flag=True, help='只列出需要更新與重複的 UID，不寫入')
+def normalize_amulet_uids(chunk_size, dry_run):
+    """將平安符 UID 轉為正規化格式（去除空白並轉大寫），列出正規化後重複的 UID
+    
+    重複的 UID 不會修改，需人工處理；全部處理完成後可將
+    AMULET_UID_MATCH_LEGACY_CASE 設為 false。
+    """
+    from app.utils.helpers import normalize_amulet_uid
+    
+    print('正在正規化平安符 UID...')
+    table = Amulet.__table__
+    normalized_uid = db.func.upper(db.func.trim(table.c.uid))
+    stmt = table.update().where(table.c.id == bindparam('_id')).values(
+        uid=bindparam('uid'),
+        updated_at=table.c.updated_at
+    )
+    
+    updated = 0
+    collisions = {}
+    last_id = None
+    while True:
+        # 只取出與正規化結果不同的 UID（keyset 分頁，更新後的資料不會再被取出）
+        query = db.select(table.c.id, table.c.uid).where(table.c.uid != normalized_uid).order_by(table.c.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        # 正規化後相同的所有平安符（含已是正規化格式的）
+        targets = {normalize_amulet_uid(uid) for _, uid in rows}
+        groups = {}
+        for amulet_id, uid, user_id, normalized in db.session.execute(
+            db.select(table.c.id, table.c.uid, table.c.user_id, normalized_uid).where(normalized_uid.in_(targets))
+        ):
+            groups.setdefault(normalized, []).append((amulet_id, uid, user_id))
+        
+        params = []
+        for amulet_id, uid in rows:
+            normalized = normalize_amulet_uid(uid)
+            if len(groups.get(normalized, ())) > 1:
+                collisions[normalized] = groups[normalized]
+            else:
+                params.append({'_id': amulet_id, 'uid': normalized})
+        
+        if params and not dry_run:
+            db.session.execute(stmt, params)
+            CacheGeneration.bump(AMULETS)  # 快取的 AmuletEntry.uid 已過時
+            db.session.commit()
+        updated += len(params)
+    
+    for normalized, amulets in sorted(collisions.items()):
+        print(f'  重複 {normalized}：' + '、'.join(f'{uid!r}（平安符 {amulet_id}，使用者 {user_id}）' for amulet_id, uid, user_id in amulets))
+    action = '需要更新' if dry_run else '已更新'
+    print(f'UID 正規化完成！{action} {updated} 筆，{len(collisions)} 組重複需人工處理')
+
+def _rebuild_counter_chunks(model, chunk_size, compute, empty):
+    """依主鍵分批計算並更新計數欄位，每批各自 commit，回傳處理筆數"""
+    table = model.__table__
+    stmt = table.update().where(table.c.id == bindparam('_id')).values(
+        updated_at=table.c.updated_at,
+        **{column: bindparam(column) for column in empty}
+    )
+    
+    total = 0
+    for ids in _iter_id_chunks(table, chunk_size):
+        counters = compute(ids)
+        db.session.execute(stmt, [dict(empty, _id=row_id, **counters.get(row_id, {})) for row_id in ids])
+        db.session.commit()
+        total += len(ids)
+    return total
+
+def _iter_id_chunks(table, chunk_size):
+    """依主鍵順序分批取出 id（keyset，不使用 OFFSET）"""
+    last_id = None
+    while True:
+        query = db.select(table.c.id).order_by(table.c.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        ids = db.session.execute(query).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='每批處理的使用者數')
+@click.option('--lag-seconds', default=300, help='只計入早於此秒數的帳本記錄，避開尚未 commit 的交易')
+def snapshot_blessings(chunk_size, lag_seconds):
+    """分批建立福報值快照"""
+    print('正在建立福報值快照...')
+    cutoff = datetime.utcnow() - timedelta(seconds=lag_seconds)
+    max_ledger_id = db.session.query(db.func.max(BlessingLedger.id)).filter(
+        BlessingLedger.created_at <= cutoff
+    ).scalar()
+    if max_ledger_id is None:
+        print('沒有需要快照的帳本記錄')
+        return
+    
+    total = 0
+    for user_ids in _iter_id_chunks(User.__table__, chunk_size):
+        total += BlessingSnapshot.take(user_ids, max_ledger_id)
+        db.session.commit()
+    print(f'福報值快照建立完成！共 {total} 位使用者（計入帳本 id <= {max_ledger_id}）')
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='每批處理的使用者數')
+def open_blessing_ledger(chunk_size):
+    """為還沒有帳本記錄的使用者建立期初帳本（帳本上線前的福報值）
+    
+    補上既有打卡的帳本記錄，再以一筆 adjustment 記錄 blessing_points 與打卡總和的差額，
+    之後帳本餘額即等於目前的福報值。已有帳本記錄的使用者略過，可重複執行。
+    """
+    print('正在建立期初帳本...')
+    users = User.__table__
+    ledger = BlessingLedger.__table__
+    
+    opened = adjusted = 0
+    for user_ids in _iter_id_chunks(users, chunk_size):
+        has_ledger = {user_id for user_id, in db.session.execute(
+            db.select(ledger.c.user_id).where(ledger.c.user_id.in_(user_ids)).distinct()
+        )}
+        user_ids = [user_id for user_id in user_ids if user_id not in has_ledger]
+        if user_ids:
+            _backfill_checkin_ledger(user_ids)
+            adjusted += _append_ledger_adjustments(user_ids)
+            opened += len(user_ids)
+        db.session.commit()
+    
+    print(f'期初帳本建立完成！共 {opened} 位使用者，{adjusted} 筆期初調整')
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='每批處理的使用者數')
+@click.option('--fix', is_flag=True, help='補齊缺少的帳本記錄，並以 adjustment 記錄補上與福報值的差額')
+def reconcile_blessings(chunk_size, fix):
+    """分批核對福報值帳本、打卡記錄與使用者福報值（請先執行 open-blessing-ledger）"""
+    print('正在核對福報值帳本...')
+    users = User.__table__
+    checkins = Checkin.__table__
+    ledger = BlessingLedger.__table__
+    
+    checked = mismatched = fixed = 0
+    for user_ids in _iter_id_chunks(users, chunk_size):
+        earned = dict(db.session.execute(
+            db.select(checkins.c.user_id, db.func.sum(checkins.c.points_earned)).where(
+                checkins.c.user_id.in_(user_ids)
+            ).group_by(checkins.c.user_id)
+        ).all())
+        granted = dict(db.session.execute(
+            db.select(ledger.c.user_id, db.func.sum(ledger.c.points)).where(
+                ledger.c.user_id.in_(user_ids),
+                ledger.c.checkin_id.isnot(None)
+            ).group_by(ledger.c.user_id)
+        ).all())
+        balances = BlessingLedger.get_balances(user_ids)
+        points = dict(db.session.execute(
+            db.select(users.c.id, users.c.blessing_points).where(users.c.id.in_(user_ids))
+        ).all())
+        
+        mismatched_ids = []
+        for user_id in user_ids:
+            balance, _ = balances.get(user_id, (0, 0))
+            if earned.get(user_id, 0) != granted.get(user_id, 0) or points[user_id] != balance:
+                mismatched_ids.append(user_id)
+                print(f'  {user_id}: 打卡 {earned.get(user_id, 0)} / 帳本 {granted.get(user_id, 0)}，'
+                      f'福報值 {points[user_id]} / 帳本餘額 {balance}')
+        
+        checked += len(user_ids)
+        mismatched += len(mismatched_ids)
+        if fix and mismatched_ids:
+            fixed += _fix_blessing_ledger(mismatched_ids)
+        db.session.commit()
+    
+    print(f'核對完成！共 {checked} 位使用者，{mismatched} 位不一致')
+    if fix:
+        print(f'已為 {fixed} 位使用者新增調整記錄')
+
+def _fix_blessing_ledger(user_ids):
+    """補齊缺少帳本記錄的打卡，並以 adjustment 記錄帳本餘額與福報值的差額，回傳調整人數
+    
+    福報值本身不修改，差額留在帳本中供稽核。不一致使用者的快照不再可信，
+    先刪除後以完整帳本計算餘額。
+    """
+    snapshots = BlessingSnapshot.__table__
+    db.session.execute(snapshots.delete().where(snapshots.c.user_id.in_(user_ids)))
+    _backfill_checkin_ledger(user_ids)
+    return _append_ledger_adjustments(user_ids)
+
+def _backfill_checkin_ledger(user_ids):
+    """為沒有帳本記錄的打卡補上帳本記錄"""
+    checkins = Checkin.__table__
+    ledger = BlessingLedger.__table__
+    
+    missing = db.select(
+        checkins.c.user_id,
+        checkins.c.points_earned,
+        db.literal(BlessingLedger.REASON_CHECKIN),
+        checkins.c.id,
+        checkins.c.campaign_id,
+        checkins.c.checkin_time
+    ).select_from(
+        checkins.outerjoin(ledger, ledger.c.checkin_id == checkins.c.id)
+    ).where(
+        checkins.c.user_id.in_(user_ids),
+        ledger.c.id.is_(None)
+    )
+    db.session.execute(ledger.insert().from_select(
+        ['user_id', 'points', 'reason', 'checkin_id', 'campaign_id', 'created_at'], missing
+    ))
+
+def _append_ledger_adjustments(user_ids):
+    """新增 adjustment 記錄補上 blessing_points 與帳本總和的差額，回傳新增筆數
+    
+    呼叫前這些使用者不可有快照（餘額即帳本總和）。差額以單一 INSERT ... SELECT
+    計算，福報值與帳本總和在同一個語句中讀取。
+    """
+    users = User.__table__
+    ledger = BlessingLedger.__table__
+    
+    ledger_sum = db.select(db.func.coalesce(db.func.sum(ledger.c.points), 0)).where(
+        ledger.c.user_id == users.c.id
+    ).scalar_subquery()
+    difference = users.c.blessing_points - ledger_sum
+    adjustments = db.select(
+        users.c.id,
+        difference,
+        db.literal(BlessingLedger.REASON_ADJUSTMENT),
+        db.literal(datetime.utcnow())
+    ).where(
+        users.c.id.in_(user_ids),
+        difference != 0
+    )
+    result = db.session.execute(ledger.insert().from_select(
+        ['user_id', 'points', 'reason', 'created_at'], adjustments
+    ))
+    return result.rowcount
+
+@app.cli.command()
+def replay_dead_checkins():
+    """重新寫入打卡寫入緩衝 dead-letter 日誌中的打卡（修正資料問題後執行）"""
+    from app.services.checkin_writer import CheckinWriteBehind
+    
+    log_dir = app.config.get('CHECKIN_WRITE_BEHIND_DIR') or app.instance_path
+    written, failed = CheckinWriteBehind().replay_dead_letters(log_dir)
+    print(f'已寫入 {written} 筆，{failed} 筆仍無法寫入')
+
+@app.cli.command()
+@click.argument('user_id')
+@click.option('--per-page', default=20, help='每頁筆數')
+@click.option('--pages', default=200, help='最多量測的頁數')
+@click.option('--every', default=20, help='每隔幾頁輸出一次')
+def benchmark_history(user_id, per_page, pages, every):
+    """量測打卡歷史頁碼分頁與游標分頁的每頁延遲（唯讀）"""
+    print(f'{"頁數":>6} {"頁碼分頁(ms)":>14} {"游標分頁(ms)":>14}')
+    after = None
+    for page in range(1, pages + 1):
+        start = time.perf_counter()
+        Checkin.history_query(user_id).paginate(page=page, per_page=per_page, error_out=False)
+        offset_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        checkins, has_next = Checkin.history_page(user_id, per_page, after)
+        cursor_ms = (time.perf_counter() - start) * 1000
+        
+        if page == 1 or page % every == 0 or not has_next:
+            print(f'{page:>6} {offset_ms:>14.2f} {cursor_ms:>14.2f}')
+        if not has_next:
+            break
+        
+        after = (checkins[-1].checkin_time, checkins[-1].id)
+        db.session.expunge_all()
+
+@app.cli.command()
+@click.option('--checkins', default=800, help='打卡總數')
+@click.option('--threads', default=16, help='同時送出的執行緒數（每個執行緒一位使用者）')
+def benchmark_checkins(checkins, threads):
+    """量測 POST /api/checkin 每次 commit 與寫入緩衝的吞吐量（各使用一個暫存的 SQLite 資料庫）"""
+    import tempfile
+    import threading
+    from flask_jwt_extended import create_access_token
+    from app import create_app as create_benchmark_app
+    from app.config import TestingConfig, config as config_map
+    from app.services.checkin_writer import checkin_writer
+    from app.utils.helpers import generate_uuid
+    
+    per_thread = max(checkins // threads, 1)
+    
+    def run(label, write_behind, work_dir):
+        # 暫存資料庫與寫入日誌，不影響目前設定的資料庫
+        config_map['benchmark'] = type('BenchmarkConfig', (TestingConfig,), {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(work_dir, "benchmark.db")}',
+            'UPLOAD_FOLDER': os.path.join(work_dir, 'uploads'),
+            'CHECKIN_WRITE_BEHIND': write_behind,
+            'CHECKIN_WRITE_BEHIND_DIR': os.path.join(work_dir, 'wal'),
+        })
+        bench_app = create_benchmark_app('benchmark')
+        
+        with bench_app.app_context():
+            db.create_all()
+            temple_ids = [generate_uuid() for _ in range(per_thread)]
+            for temple_id in temple_ids:
+                db.session.add(Temple(
+                    id=temple_id, name=f'廟宇-{temple_id[:8]}', main_deity='媽祖', description='量測',
+                    address='台北市', latitude=25.0, longitude=121.5
+                ))
+            targets = []
+            for index in range(threads):
+                user_id = generate_uuid()
+                db.session.add(User(id=user_id, username=f'bench{index}', email=f'{user_id}@example.com', password='secret1'))
+                amulet_uid = generate_uuid().replace('-', '')[:16].upper()
+                db.session.add(Amulet(id=generate_uuid(), user_id=user_id, uid=amulet_uid, name='平安符'))
+                targets.append((amulet_uid, {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}))
+            db.session.commit()
+        
+        statuses = []
+        lock = threading.Lock()
+        
+        def worker(amulet_uid, headers):
+            client = bench_app.test_client()
+            for temple_id in temple_ids:
+                response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+                with lock:
+                    statuses.append(response.status_code)
+        
+        workers = [threading.Thread(target=worker, args=target) for target in targets]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        accepted_seconds = time.perf_counter() - start
+        
+        total = len(statuses)
+        line = f'{label:<16} {total / accepted_seconds:>10.1f} req/s'
+        if write_behind:
+            checkin_writer.flush(timeout=60)
+            durable_seconds = time.perf_counter() - start
+            stats = checkin_writer.get_stats()
+            checkin_writer.stop()
+            line += (f'（寫入完成 {total / durable_seconds:.1f} req/s，'
+                     f'受理 commit {stats["claim_batches"]} 次，寫入批次 {stats["batches"]} 次）')
+        
+        failed = total - statuses.count(201 if not write_behind else 202)
+        if failed:
+            line += f'，{failed} 筆失敗'
+        print(line)
+    
+    print(f'{threads} 個執行緒，共 {per_thread * threads} 筆打卡')
+    for label, write_behind in (('每次 commit', False), ('寫入緩衝', True)):
+        with tempfile.TemporaryDirectory() as work_dir:
+            run(label, write_behind, work_dir)
+
+@app.cli.command()
+@click.option('--rows', default=100, help='一頁的廟宇數')
+@click.option('--repeat', default=200, help='每項重複次數')
+def benchmark_serializers(rows, repeat):
+    """量測一頁廟宇的序列化與 JSON 編碼：逐欄位取值、預先產生的序列化函式與各 JSON 後端（不讀取資料庫）"""
+    from app.models.serialization import isoformat, serialize_fields
+    from app.utils.json_backend import json_backend, orjson
+    
+    now = datetime.utcnow()
+    temples = []
+    for index in range(rows):
+        temple = Temple(
+            id=f'temple-{index:05d}', name=f'廟宇{index}', main_deity='媽祖', description='量測用的廟宇介紹' * 4,
+            address='台北市中正區', latitude=25.0 + index * 1e-4, longitude=121.5
+        )
+        temple.image_url = temple.phone = temple.website = temple.opening_hours = None
+        temple.is_active = True
+        temple.created_at = temple.updated_at = now
+        temples.append(temple)
+    
+    def by_attribute():
+        # 預先產生序列化函式之前的做法：逐欄位以屬性取值，datetime 轉為 ISO 字串
+        return [
+            {name: isoformat(value) if isinstance(value, datetime) else value
+             for name, value in ((name, getattr(temple, name)) for name in Temple.FIELDS)}
+            for temple in temples
+        ]
+    
+    def measure(func):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1e6
+    
+    sparse = frozenset(('id', 'name', 'latitude', 'longitude'))
+    cases = [
+        ('逐欄位取值（轉 ISO 字串）', by_attribute),
+        ('序列化函式（全部欄位）', lambda: [serialize_fields(temple) for temple in temples]),
+        ('序列化函式（4 個欄位）', lambda: [serialize_fields(temple, sparse) for temple in temples]),
+    ]
+    
+    payload = {'success': True, 'data': {'temples': [serialize_fields(temple) for temple in temples]}}
+    backend = json_backend.name
+    backends = ['json'] + (['orjson'] if orjson is not None else [])
+    
+    print(f'每頁 {rows} 間廟宇，每項重複 {repeat} 次')
+    for label, func in cases:
+        print(f'{label:<24} {measure(func):>10.1f} us')
+    try:
+        for name in backends:
+            json_backend.name = name
+            print(f'{"JSON 編碼（" + name + "）":<24} {measure(lambda: json_backend.dumps(payload)):>10.1f} us')
+    finally:
+        json_backend.name = backend
+    if orjson is None:
+        print('未安裝 orjson，只量測標準函式庫')
+
+@app.cli.command()
+@click.option('--temples', default=100000, help='隨機產生的廟宇數')
+@click.option('--points', default=10, help='距離矩陣的起點數')
+@click.option('--repeat', default=5, help='每項重複次數')
+def benchmark_distance(temples, points, repeat):
+    """量測距離計算：逐筆 Haversine、純 Python 批次與 NumPy 向量化（不讀取資料庫）"""
+    import random
+    from app.utils import geo
+    
+    rng = random.Random(0)
+    lats = [rng.uniform(21.9, 25.3) for _ in range(temples)]
+    lngs = [rng.uniform(120.0, 122.0) for _ in range(temples)]
+    origins = [(rng.uniform(21.9, 25.3), rng.uniform(120.0, 122.0)) for _ in range(points)]
+    lat, lng = origins[0]
+    
+    def measure(func):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+    
+    cases = [('逐筆 haversine（一點到全部）', lambda: [geo.haversine(lat, lng, a, b) for a, b in zip(lats, lngs)])]
+    for backend in geo.available_backends():
+        cases += [
+            (f'{backend}（一點到全部）', lambda backend=backend: geo.distances_from(lat, lng, lats, lngs, backend=backend)),
+            (f'{backend} 最近 20 筆（nearest）', lambda backend=backend: geo.nearest(lat, lng, lats, lngs, limit=20, backend=backend)),
+            (f'{backend} 矩陣（{points} 點到全部）', lambda backend=backend: geo.distance_matrix(origins, lats, lngs, backend=backend)),
+        ]
+    if 'numpy' in geo.available_backends():
+        import numpy
+        lat_array, lng_array = numpy.asarray(lats), numpy.asarray(lngs)
+        cases += [
+            ('numpy（一點到全部，已是陣列）', lambda: geo.distances_from(lat, lng, lat_array, lng_array, backend='numpy')),
+            ('numpy 最近 20 筆（已是陣列）', lambda: geo.nearest(lat, lng, lat_array, lng_array, limit=20, backend='numpy')),
+        ]
+    else:
+        print('未安裝 NumPy，只量測純 Python')
+    
+    print(f'{temples} 間廟宇，每項重複 {repeat} 次')
+    for label, func in cases:
+        print(f'{label:<32} {measure(func):>10.2f} ms')
+
 @app.cli.command()
 def seed_db():
     """填入測試資料"""
@@ -51,7 +599,8 @@ def seed_db():
             email='test@example.com',
             password='password123'
         )
-        test_user.blessing_points = 150
+        test_user.blessing_points = 0
+        test_user.add_blessing_points(150)  # 同時寫入帳本
         db.session.add(test_user)
         
         # 建立管理員使用者
@@ -63,7 +612,8 @@ def seed_db():
             password='admin123'
         )
         admin_user.is_admin = True
-        admin_user.blessing_points = 1000
+        admin_user.blessing_points = 0
+        admin_user.add_blessing_points(1000)
         db.session.add(admin_user)
         
         # 建立測試平安符
@@ -151,10 +701,20 @@ def seed_db():
             }
         ]
         
+        temples = []
         for temple_data in temples_data:
+            # 建構子不接受的選填欄位建立後再設定
+            optional = {field: temple_data.pop(field) for field in ('phone', 'opening_hours')}
             temple = Temple(**temple_data)
+            for field, value in optional.items():
+                setattr(temple, field, value)
             db.session.add(temple)
+            temples.append(temple)
         
+        # 讓各 worker 的廟宇目錄快取、空間索引與 ETag 失效
+        generation = CacheGeneration.bump(TEMPLE_CATALOG)
+        for temple in temples:
+            temple.catalog_generation = generation
         db.session.commit()
         print('測試資料填入完成！')
         
@@ -0,0 +1,58 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from app.config import TestingConfig
+from app.models import db, User, Temple, Amulet
+from app.utils.helpers import generate_uuid
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """測試用應用程式（檔案型 SQLite，多個執行緒可共用同一個資料庫）"""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setattr(TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+    
+    yield app
+    
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def factory(app):
+    """建立測試資料（id 每次不同，避免各服務的全域快取沿用上一個測試的資料）"""
+    return Factory(app)
+
+class Factory:
+    """測試資料建立工具"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def user(self, blessing_points=0):
+        """建立使用者與一個平安符，回傳 (使用者 id, 平安符 UID, 驗證標頭)"""
+        user_id = generate_uuid()
+        amulet_uid = generate_uuid().replace('-', '')[:16].upper()
+        with self.app.app_context():
+            user = User(id=user_id, username=f'user-{user_id[:8]}', email=f'{user_id}@example.com', password='secret1')
+            user.blessing_points = blessing_points
+            db.session.add(user)
+            db.session.add(Amulet(id=generate_uuid(), user_id=user_id, uid=amulet_uid, name='平安符'))
+            db.session.commit()
+            token = create_access_token(identity=user_id)
+        return user_id, amulet_uid, {'Authorization': f'Bearer {token}'}
+    
+    def temple(self, latitude=25.0, longitude=121.5, blessing_bonus=2):
+        """建立廟宇，回傳 id"""
+        temple_id = generate_uuid()
+        with self.app.app_context():
+            db.session.add(Temple(
+                id=temple_id, name=f'廟宇-{temple_id[:8]}', main_deity='媽祖', description='測試',
+                address='台北市', latitude=latitude, longitude=longitude, blessing_bonus=blessing_bonus
+            ))
+            db.session.commit()
+        return temple_id
@@ -0,0 +1,118 @@
+from click.testing import CliRunner
+
+from app.models import db, Amulet
+from app.services.amulet_resolver import AmuletResolver, amulet_resolver
+from app.utils.helpers import generate_uuid
+
+def add_legacy_amulet(user_id, uid):
+    """模擬舊版 create_amulet 依輸入原樣保存的 UID"""
+    amulet_id = generate_uuid()
+    db.session.add(Amulet(id=amulet_id, user_id=user_id, uid=uid, name='舊平安符'))
+    db.session.commit()
+    return amulet_id
+
+def test_legacy_mixed_case_uid_can_check_in(app, factory):
+    """正規化前以小寫保存的 UID 仍可解析並打卡，也不能再被綁定"""
+    user_id, _, headers = factory.user()
+    temple_id = factory.temple()
+    uid = generate_uuid().replace('-', '')[:12]
+    with app.app_context():
+        amulet_id = add_legacy_amulet(user_id, f' {uid.lower()}')
+        assert amulet_resolver.resolve(uid).amulet_id == amulet_id
+        assert amulet_resolver.is_taken(uid.upper())
+    
+    client = app.test_client()
+    response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': uid}, headers=headers)
+    assert response.status_code == 201
+    
+    response = client.post('/api/amulets', json={'name': '新平安符', 'uid': uid.upper()}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '此 UID 已被使用'
+
+def test_normalize_amulet_uids_reports_collisions(app, factory):
+    """normalize-amulet-uids 轉換不重複的 UID，正規化後重複者只列出不修改"""
+    from run import normalize_amulet_uids
+    
+    user_id, _, _ = factory.user()
+    base = generate_uuid().replace('-', '')[:12].upper()
+    with app.app_context():
+        lone = add_legacy_amulet(user_id, f'{base}a'.lower())
+        first = add_legacy_amulet(user_id, f'{base}b'.lower())
+        second = add_legacy_amulet(user_id, f'{base}B')
+        
+        result = CliRunner().invoke(normalize_amulet_uids, ['--chunk-size', '1'])
+        
+        assert result.exit_code == 0, result.output
+        assert f'重複 {base}B' in result.output
+        assert '已更新 1 筆，1 組重複' in result.output
+        db.session.expire_all()
+        assert db.session.get(Amulet, lone).uid == f'{base}A'
+        assert db.session.get(Amulet, first).uid == f'{base}b'.lower()
+        assert db.session.get(Amulet, second).uid == f'{base}B'
+
+def other_worker(app):
+    """另一個 worker 的解析服務（每次存取都比對世代，模擬檢查間隔已過）"""
+    resolver = AmuletResolver(app)
+    resolver.check_interval = 0
+    resolver.miss_ttl = 3600  # 查無資料的快取要靠世代失效，不能靠 TTL 到期
+    return resolver
+
+def test_bind_is_visible_to_other_workers(app, factory):
+    """其他 worker 快取的查無資料在綁定後由世代計數器失效"""
+    _, _, headers = factory.user()
+    uid = generate_uuid().replace('-', '')[:12].upper()
+    resolver = other_worker(app)
+    with app.app_context():
+        assert resolver.resolve(uid) is None
+        assert resolver.resolve(uid) is None
+        assert resolver.get_stats()['hits'] == 1
+    
+    response = app.test_client().post('/api/auth/bind-amulet', json={'amulet_uid': uid}, headers=headers)
+    assert response.status_code == 201
+    
+    with app.app_context():
+        entry = resolver.resolve(uid)
+        assert entry is not None and entry.is_active
+        assert entry.amulet_id == response.get_json()['data']['amulet']['id']
+
+def test_unbind_is_visible_to_other_workers(app, factory):
+    """其他 worker 快取的平安符在解綁後不再視為啟用"""
+    user_id, amulet_uid, headers = factory.user()
+    resolver = other_worker(app)
+    with app.app_context():
+        entry = resolver.resolve_for_user(amulet_uid, user_id)
+        assert entry is not None
+    
+    response = app.test_client().delete(f'/api/auth/unbind-amulet/{entry.amulet_id}', headers=headers)
+    assert response.status_code == 200
+    
+    with app.app_context():
+        assert resolver.resolve_for_user(amulet_uid, user_id) is None
+
+def test_query_racing_invalidation_is_not_cached(app, factory, monkeypatch):
+    """讀取資料庫期間快取被移除時，讀到的資料不寫入快取"""
+    _, amulet_uid, _ = factory.user()
+    resolver = other_worker(app)
+    query = resolver._query
+    
+    def racing_query(uids):
+        found = query(uids)
+        resolver.invalidate(amulet_uid)  # 讀取後、寫入快取前有異動
+        return found
+    
+    monkeypatch.setattr(resolver, '_query', racing_query)
+    with app.app_context():
+        assert resolver.resolve(amulet_uid) is not None
+        assert len(resolver.cache) == 0
+
+def test_misses_expire_quickly(app):
+    """查無資料只快取 miss_ttl 秒，miss_ttl 為 0 時不快取"""
+    resolver = AmuletResolver(app)
+    with app.app_context():
+        resolver.resolve('NO-SUCH-UID')
+        assert resolver.cache._data['NO-SUCH-UID'][1] is not None
+        
+        resolver.invalidate()
+        resolver.miss_ttl = 0
+        resolver.resolve('NO-SUCH-UID')
+        assert len(resolver.cache) == 0
@@ -0,0 +1,171 @@
+import threading
+
+import pytest
+
+from app.models import Checkin
+from app.services.batch_dispatcher import batch_dispatcher
+
+def post_batch(app, requests, headers=None, parallel=False):
+    return app.test_client().post('/api/batch', json={'requests': requests, 'parallel': parallel}, headers=headers or {})
+
+@pytest.fixture
+def isolated_threads(monkeypatch):
+    """記錄以獨立 context 執行子請求的執行緒名稱（只在平行模式下使用）"""
+    names = []
+    run_isolated = batch_dispatcher._run_isolated
+    
+    def spy(app, environ):
+        names.append(threading.current_thread().name)
+        return run_isolated(app, environ)
+    
+    monkeypatch.setattr(batch_dispatcher, '_run_isolated', spy)
+    return names
+
+def test_sequential_batch_keeps_order_and_isolates_errors(app, factory, isolated_threads):
+    """依序執行時回應依子請求順序排列，失敗的子請求不影響其他子請求"""
+    user_id, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    
+    response = post_batch(app, [
+        {'method': 'POST', 'path': '/api/checkin', 'body': {'temple_id': temple_id, 'amulet_uid': amulet_uid}},
+        {'path': '/api/temples/no-such-id'},
+        {'method': 'POST', 'path': '/api/checkin', 'body': {'temple_id': temple_id}},
+        {'path': '/api/auth/me?include=stats'},
+    ], headers)
+    
+    assert response.status_code == 200
+    responses = response.get_json()['data']['responses']
+    assert [item['status'] for item in responses] == [201, 404, 400, 200]
+    assert responses[1]['body']['message'] == '廟宇不存在'
+    assert responses[2]['body']['success'] is False
+    # 後面的子請求看得到前面子請求寫入的資料
+    assert responses[3]['body']['data']['user']['stats']['total_checkins'] == 1
+    assert isolated_threads == []
+    with app.app_context():
+        assert Checkin.query.filter_by(user_id=user_id).count() == 1
+
+def test_parallel_batch_runs_reads_in_worker_threads(app, factory, isolated_threads):
+    """全部為 GET 且要求平行時由執行緒池執行，回應仍依子請求順序排列"""
+    _, _, headers = factory.user()
+    temple_ids = [factory.temple() for _ in range(5)]
+    requests = [{'path': f'/api/temples/{temple_id}?fields=id&include='} for temple_id in temple_ids]
+    requests.insert(2, {'path': '/api/temples/no-such-id'})
+    requests.append({'path': '/api/auth/me', 'headers': {'Authorization': 'Bearer invalid'}})
+    
+    response = post_batch(app, requests, headers, parallel=True)
+    
+    assert response.status_code == 200
+    responses = response.get_json()['data']['responses']
+    assert [item['status'] for item in responses] == [200, 200, 404, 200, 200, 200, 401]
+    found = [item['body']['data']['id'] for item in responses if item['status'] == 200]
+    assert found == temple_ids
+    assert all('ETag' in item['headers'] for item in responses if item['status'] == 200)
+    assert len(isolated_threads) == len(requests)
+    assert all(name.startswith('batch') for name in isolated_threads)
+
+def test_parallel_with_writes_runs_sequentially(app, factory, isolated_threads):
+    """含寫入的批次即使要求平行也依序執行"""
+    _, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    
+    response = post_batch(app, [
+        {'path': f'/api/temples/{temple_id}'},
+        {'method': 'POST', 'path': '/api/checkin', 'body': {'temple_id': temple_id, 'amulet_uid': amulet_uid}},
+    ], headers, parallel=True)
+    
+    assert [item['status'] for item in response.get_json()['data']['responses']] == [200, 201]
+    assert isolated_threads == []
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_subrequest_exception_becomes_500(app, factory, parallel):
+    """子請求拋出例外時該筆回 500，其他子請求照常回應"""
+    def boom():
+        raise RuntimeError('boom')
+    
+    app.add_url_rule('/api/boom', 'boom', boom)
+    temple_id = factory.temple()
+    
+    response = post_batch(app, [{'path': '/api/boom'}, {'path': f'/api/temples/{temple_id}'}], parallel=parallel)
+    
+    responses = response.get_json()['data']['responses']
+    assert [item['status'] for item in responses] == [500, 200]
+    assert 'boom' in responses[0]['body']['message']
+
+@pytest.mark.parametrize('requests', [
+    [],
+    [{'path': '/api/batch'}],
+    [{'path': '/health'}],
+    [{'method': 'PATCH', 'path': '/api/temples'}],
+    [{'path': '/api/temples', 'headers': {'X-Count': 1}}],
+    [{'path': '/api/temples'}] * 21,
+])
+def test_invalid_batch_is_rejected(app, requests):
+    """格式錯誤、巢狀批次與超過上限時整批回 400"""
+    response = post_batch(app, requests)
+    
+    assert response.status_code == 400
+
+def test_invalid_outer_token_rejects_whole_batch(app):
+    """外層 Token 無效時整批回 401"""
+    response = post_batch(app, [{'path': '/api/temples'}], {'Authorization': 'Bearer invalid'})
+    
+    assert response.status_code == 401
+
+@pytest.fixture
+def verifications(monkeypatch):
+    """記錄 JWT 解碼的次數"""
+    from flask_jwt_extended import view_decorators
+    decoded = []
+    decode_token = view_decorators.decode_token
+    
+    def spy(*args, **kwargs):
+        decoded.append(args[0])
+        return decode_token(*args, **kwargs)
+    
+    monkeypatch.setattr(view_decorators, 'decode_token', spy)
+    return decoded
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_outer_token_is_verified_once(app, factory, verifications, parallel):
+    """外層 Token 整批只驗證一次，子請求沿用驗證結果與已載入的使用者"""
+    from sqlalchemy import event
+    from app.models import db
+    
+    _, _, headers = factory.user()
+    temple_id = factory.temple()
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = post_batch(app, [
+            {'path': '/api/auth/me'},
+            {'path': '/api/users/profile'},
+            {'path': f'/api/temples/{temple_id}'},
+            {'path': '/api/checkin/history'},
+        ], headers, parallel=parallel)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    
+    assert [item['status'] for item in response.get_json()['data']['responses']] == [200, 200, 200, 200]
+    assert len(verifications) == 1
+    assert len([statement for statement in statements if 'FROM users' in statement]) == 1
+
+def test_subrequest_with_own_token_is_verified(app, factory, verifications):
+    """子請求自行指定 Authorization 時以自己的 Token 驗證"""
+    _, _, headers = factory.user()
+    other_id, _, other_headers = factory.user()
+    
+    response = post_batch(app, [
+        {'path': '/api/auth/me'},
+        {'path': '/api/auth/me', 'headers': other_headers},
+    ], headers)
+    
+    responses = response.get_json()['data']['responses']
+    assert responses[1]['body']['data']['user']['id'] == other_id
+    assert responses[0]['body']['data']['user']['id'] != other_id
+    assert len(verifications) == 2
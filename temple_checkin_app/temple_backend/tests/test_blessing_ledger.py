@@ -0,0 +1,99 @@
+from click.testing import CliRunner
+
+from app.models import db, BlessingLedger, BlessingSnapshot, Checkin, User
+
+def checkin(app, headers, amulet_uid, temple_id):
+    response = app.test_client().post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']
+
+def run_command(command, *args):
+    result = CliRunner().invoke(command, list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+def test_checkin_appends_ledger_entry(app, factory):
+    """每筆打卡新增一筆帳本記錄，帳本餘額等於使用者的福報值"""
+    user_id, amulet_uid, headers = factory.user()
+    temple_ids = [factory.temple(blessing_bonus=2), factory.temple(blessing_bonus=5)]
+    
+    for temple_id in temple_ids:
+        checkin(app, headers, amulet_uid, temple_id)
+    
+    with app.app_context():
+        entries = BlessingLedger.query.filter_by(user_id=user_id).order_by(BlessingLedger.id).all()
+        checkins = {row.id: row for row in Checkin.query.filter_by(user_id=user_id)}
+        assert len(entries) == 2
+        assert all(entry.reason == BlessingLedger.REASON_CHECKIN for entry in entries)
+        assert {entry.checkin_id: entry.points for entry in entries} == {
+            checkin_id: row.points_earned for checkin_id, row in checkins.items()
+        }
+        assert BlessingLedger.get_balance(user_id) == db.session.get(User, user_id).blessing_points
+
+def test_balance_is_snapshot_plus_later_entries(app, factory):
+    """快照之後的帳本記錄加到快照餘額上；再次快照時更新"""
+    from run import snapshot_blessings
+    
+    user_id, amulet_uid, headers = factory.user()
+    first, second = factory.temple(), factory.temple()
+    checkin(app, headers, amulet_uid, first)
+    
+    with app.app_context():
+        output = run_command(snapshot_blessings, '--lag-seconds', '0')
+        assert '共 1 位使用者' in output
+        snapshot = db.session.get(BlessingSnapshot, user_id)
+        assert snapshot.balance == BlessingLedger.get_balance(user_id)
+        snapshot_ledger_id = snapshot.ledger_id
+    
+    checkin(app, headers, amulet_uid, second)
+    
+    with app.app_context():
+        later = BlessingLedger.query.filter(
+            BlessingLedger.user_id == user_id, BlessingLedger.id > snapshot_ledger_id
+        ).one()
+        balance, ledger_id = BlessingLedger.get_balances([user_id])[user_id]
+        assert (balance, ledger_id) == (db.session.get(BlessingSnapshot, user_id).balance + later.points, later.id)
+        assert balance == db.session.get(User, user_id).blessing_points
+        
+        # 快照內的舊記錄不再重新加總
+        db.session.get(BlessingSnapshot, user_id).balance += 100
+        db.session.commit()
+        assert BlessingLedger.get_balance(user_id) == balance + 100
+        
+        run_command(snapshot_blessings, '--lag-seconds', '0')
+        db.session.expire_all()
+        assert db.session.get(BlessingSnapshot, user_id).ledger_id == later.id
+
+def test_reconcile_reports_and_fixes_mismatch(app, factory):
+    """reconcile-blessings 找出帳本與福報值不一致的使用者，--fix 補齊帳本但不修改福報值"""
+    from run import reconcile_blessings
+    
+    user_id, amulet_uid, headers = factory.user()
+    other_id, other_amulet_uid, other_headers = factory.user()
+    temple_ids = [factory.temple(), factory.temple()]
+    for temple_id in temple_ids:
+        checkin(app, headers, amulet_uid, temple_id)
+    checkin(app, other_headers, other_amulet_uid, temple_ids[0])
+    
+    with app.app_context():
+        assert '共 2 位使用者，0 位不一致' in run_command(reconcile_blessings, '--chunk-size', '1')
+        
+        # 遺失一筆打卡的帳本記錄，福報值又另外被加了 5 點
+        db.session.delete(BlessingLedger.query.filter_by(user_id=user_id).order_by(BlessingLedger.id).first())
+        db.session.get(User, user_id).blessing_points += 5
+        db.session.commit()
+        points = db.session.get(User, user_id).blessing_points
+        
+        output = run_command(reconcile_blessings, '--chunk-size', '1')
+        assert '共 2 位使用者，1 位不一致' in output
+        assert user_id in output and other_id not in output
+        
+        output = run_command(reconcile_blessings, '--chunk-size', '1', '--fix')
+        assert '已為 1 位使用者新增調整記錄' in output
+        
+        db.session.expire_all()
+        assert BlessingLedger.query.filter_by(user_id=user_id, reason=BlessingLedger.REASON_CHECKIN).count() == 2
+        adjustment = BlessingLedger.query.filter_by(user_id=user_id, reason=BlessingLedger.REASON_ADJUSTMENT).one()
+        assert adjustment.points == 5
+        assert db.session.get(User, user_id).blessing_points == points
+        assert '共 2 位使用者，0 位不一致' in run_command(reconcile_blessings)
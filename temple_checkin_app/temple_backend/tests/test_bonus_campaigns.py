@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from app.models import db, BonusCampaign, CacheGeneration
+from app.services.bonus_campaigns import BonusCampaigns, BONUS_CAMPAIGNS
+from app.utils.helpers import generate_uuid
+
+def add_campaign(temple_id, bonus_points):
+    """模擬管理員新增加碼活動（遞增世代）"""
+    now = datetime.utcnow()
+    campaign = BonusCampaign(
+        id=generate_uuid(), name='加碼', bonus_points=bonus_points,
+        starts_at=now - timedelta(hours=1), ends_at=now + timedelta(hours=1), temple_id=temple_id
+    )
+    db.session.add(campaign)
+    CacheGeneration.bump(BONUS_CAMPAIGNS)
+    db.session.commit()
+    return campaign.id
+
+def test_best_campaign_applies(app, factory):
+    """同時適用多個活動時取加碼最高者，其他廟宇的活動不適用"""
+    temple_id, other_id = factory.temple(), factory.temple()
+    campaigns = BonusCampaigns(app)
+    with app.app_context():
+        add_campaign(None, 1)
+        best = add_campaign(temple_id, 3)
+        add_campaign(other_id, 5)
+        
+        assert campaigns.best_for(temple_id, datetime.utcnow()).id == best
+        assert campaigns.best_for(temple_id, datetime.utcnow() + timedelta(hours=2)) is None
+
+def test_load_racing_invalidation_is_not_cached(app, factory, monkeypatch):
+    """讀取活動期間有 invalidate() 時，讀到的舊活動不寫入快取"""
+    temple_id = factory.temple()
+    campaigns = BonusCampaigns(app)
+    campaigns.check_interval = 3600
+    query = campaigns._query
+    
+    def racing_query():
+        found = query()
+        add_campaign(temple_id, 3)  # 讀取後、寫入快取前有異動
+        campaigns.invalidate()
+        return found
+    
+    monkeypatch.setattr(campaigns, '_query', racing_query)
+    with app.app_context():
+        assert campaigns.best_for(temple_id, datetime.utcnow()) is None
+        monkeypatch.undo()
+        
+        assert campaigns.best_for(temple_id, datetime.utcnow()).bonus_points == 3
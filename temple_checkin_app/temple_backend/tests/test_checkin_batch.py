@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db, Checkin, TempleVisit, User
+
+def test_batch_rejects_only_malformed_items(app, factory):
+    """欄位型別錯誤的離線打卡只拒絕該筆，其餘照常寫入"""
+    _, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    client_time = datetime.utcnow().isoformat() + 'Z'
+    
+    items = [
+        {'temple_id': [temple_id], 'amulet_uid': amulet_uid, 'client_time': client_time},
+        {'temple_id': temple_id, 'amulet_uid': {'uid': amulet_uid}, 'client_time': client_time},
+        {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': 1700000000},
+        {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': client_time},
+    ]
+    response = app.test_client().post('/api/checkin/batch', json={'checkins': items}, headers=headers)
+    
+    assert response.status_code == 200
+    results = response.get_json()['data']['results']
+    assert [result['success'] for result in results] == [False, False, False, True]
+    assert results[0]['message'] == 'temple_id 必須為字串'
+
+def client_time(delta):
+    return (datetime.utcnow() + delta).isoformat() + 'Z'
+
+def post_batch(app, headers, items):
+    response = app.test_client().post('/api/checkin/batch', json={'checkins': items}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+def test_cooldown_follows_client_time_order(app, factory):
+    """不論送出順序都依 client_time 套用冷卻：同一冷卻時間內的第二筆被拒絕，之後的照常寫入"""
+    user_id, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    times = [timedelta(hours=-2), timedelta(hours=-20), timedelta(hours=-30)]
+    
+    data = post_batch(app, headers, [
+        {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': client_time(delta)} for delta in times
+    ])
+    
+    results = data['results']
+    assert [result['index'] for result in results] == [0, 1, 2]
+    assert [result['success'] for result in results] == [True, False, True]
+    assert results[1]['message'] == '您在24小時內已在此廟宇打卡過了'
+    assert data['accepted_count'] == 2 and data['rejected_count'] == 1
+    with app.app_context():
+        visit = db.session.get(TempleVisit, (user_id, temple_id))
+        assert visit.visit_count == 2
+        assert abs(visit.last_checkin_time - (datetime.utcnow() - timedelta(hours=2))) < timedelta(minutes=1)
+        assert Checkin.query.filter_by(user_id=user_id).count() == 2
+        assert db.session.get(User, user_id).blessing_points == data['total_blessing_points'] == data['points_earned']
+
+def test_batch_respects_existing_visit(app, factory):
+    """早於或在已有打卡冷卻時間內的離線打卡被拒絕"""
+    user_id, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    response = app.test_client().post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+    assert response.status_code == 201
+    
+    data = post_batch(app, headers, [
+        {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': client_time(timedelta(hours=-1))},
+        {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': client_time(timedelta(minutes=1))},
+    ])
+    
+    assert [result['success'] for result in data['results']] == [False, False]
+    assert data['points_earned'] == 0
+    with app.app_context():
+        assert data['total_blessing_points'] == db.session.get(User, user_id).blessing_points
+
+@pytest.mark.parametrize('delta, accepted', [
+    (timedelta(days=-31), False),
+    (timedelta(days=-29), True),
+    (timedelta(minutes=10), False),
+    (timedelta(minutes=4), True),
+])
+def test_client_time_window(app, factory, delta, accepted):
+    """client_time 早於 CHECKIN_BATCH_MAX_AGE_DAYS 或晚於容許的時鐘誤差時拒絕"""
+    _, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    
+    result = post_batch(app, headers, [
+        {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': client_time(delta)},
+    ])['results'][0]
+    
+    assert result['success'] is accepted
+    if not accepted:
+        assert result['message'] == 'client_time 超出可同步的時間範圍'
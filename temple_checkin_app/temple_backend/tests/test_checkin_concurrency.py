@@ -0,0 +1,43 @@
+import threading
+
+from app.models import db, Checkin, User
+
+N_THREADS = 8
+CHECKINS_PER_THREAD = 5
+
+def test_concurrent_checkins_do_not_lose_points(app, factory):
+    """多個執行緒同時打卡：福報值等於打卡記錄總和，冷卻時間內同一廟宇只有一筆"""
+    user_id, amulet_uid, headers = factory.user()
+    shared_temple = factory.temple()
+    temple_ids = [factory.temple() for _ in range(N_THREADS * CHECKINS_PER_THREAD)]
+    
+    statuses = []
+    lock = threading.Lock()
+    
+    def worker(k):
+        client = app.test_client()
+        # 每個執行緒都搶同一間廟宇，再各自打卡不同的廟宇
+        targets = [shared_temple] + temple_ids[k * CHECKINS_PER_THREAD:(k + 1) * CHECKINS_PER_THREAD]
+        for temple_id in targets:
+            response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+            with lock:
+                statuses.append(response.status_code)
+    
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(N_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    with app.app_context():
+        blessing_points = db.session.query(User.blessing_points).filter(User.id == user_id).scalar()
+        earned = db.session.query(db.func.sum(Checkin.points_earned)).filter(Checkin.user_id == user_id).scalar()
+        duplicates = db.session.query(Checkin.temple_id).filter(Checkin.user_id == user_id).group_by(
+            Checkin.temple_id
+        ).having(db.func.count(Checkin.id) > 1).all()
+        checkin_count = db.session.query(db.func.count(Checkin.id)).filter(Checkin.user_id == user_id).scalar()
+    
+    assert blessing_points == earned
+    assert duplicates == []
+    assert statuses.count(201) == checkin_count == len(temple_ids) + 1
+    assert statuses.count(400) == N_THREADS - 1
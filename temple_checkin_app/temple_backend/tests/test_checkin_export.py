@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db, Amulet, Checkin, Temple
+from app.utils.helpers import generate_uuid
+
+NOTES = ['平安', '=HYPERLINK("http://example.com")', '+1', '-2', '@SUM(A1)', '祈福']
+
+@pytest.fixture
+def export(app, factory):
+    """建立一位有 6 筆打卡的使用者（廟宇名稱與備註含公式字元），回傳 (打卡 id 依時間排序, 驗證標頭)"""
+    app.config['CHECKIN_EXPORT_CHUNK_SIZE'] = 2
+    user_id, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.get(Temple, temple_id).name = '=cmd|calc'
+        amulet_id = Amulet.query.filter_by(uid=amulet_uid).one().id
+        checkin_ids = []
+        for i, notes in enumerate(NOTES):
+            checkin = Checkin(id=generate_uuid(), user_id=user_id, temple_id=temple_id, amulet_id=amulet_id,
+                              points_earned=i, notes=notes, extra_data={'index': i})
+            checkin.checkin_time = now - timedelta(minutes=len(NOTES) - i)
+            db.session.add(checkin)
+            checkin_ids.append(checkin.id)
+        db.session.commit()
+    return checkin_ids, headers
+
+def get_export(app, headers, export_format):
+    """回傳 (回應, 各批內容)"""
+    response = app.test_client().get(f'/api/checkin/export?format={export_format}', headers=headers, buffered=False)
+    chunks = list(response.response)
+    response.close()
+    return response, chunks
+
+def test_ndjson_export_streams_all_rows_in_order(app, export):
+    """NDJSON 每行一筆，依打卡時間排序，每批分開送出"""
+    checkin_ids, headers = export
+    
+    response, chunks = get_export(app, headers, 'ndjson')
+    
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+    assert [row['id'] for row in rows] == checkin_ids
+    assert [row['notes'] for row in rows] == NOTES
+    assert rows[0]['temple_name'] == '=cmd|calc'
+    assert rows[0]['extra_data'] == {'index': 0}
+
+def test_csv_export_has_bom_and_escapes_formulas(app, export):
+    """CSV 以 BOM 開頭，依打卡時間排序，公式字元開頭的文字前加上 '"""
+    checkin_ids, headers = export
+    
+    response, chunks = get_export(app, headers, 'csv')
+    
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    body = b''.join(chunks)
+    assert body.startswith(b'\xef\xbb\xbf')
+    assert len(chunks) == 4  # 標題列加上三批
+    
+    rows = list(csv.DictReader(io.StringIO(body.decode('utf-8-sig'))))
+    assert [row['id'] for row in rows] == checkin_ids
+    assert [row['notes'] for row in rows] == ['平安', '\'=HYPERLINK("http://example.com")', "'+1", "'-2", "'@SUM(A1)", '祈福']
+    assert {row['temple_name'] for row in rows} == {"'=cmd|calc"}
+    assert rows[0]['extra_data'] == '{"index":0}'
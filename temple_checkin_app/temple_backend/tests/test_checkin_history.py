@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.models import db, Amulet, Checkin, Temple
+from app.utils.helpers import encode_cursor, generate_uuid
+
+@pytest.fixture
+def history(app, factory):
+    """建立一位有 120 筆打卡（各在不同廟宇）的使用者，回傳驗證標頭"""
+    user_id, amulet_uid, headers = factory.user()
+    now = datetime.utcnow()
+    with app.app_context():
+        amulet_id = Amulet.query.filter_by(uid=amulet_uid).one().id
+        for i in range(120):
+            temple_id = generate_uuid()
+            db.session.add(Temple(
+                id=temple_id, name=f'廟宇-{i}', main_deity='媽祖', description='測試',
+                address='台北市', latitude=25.0, longitude=121.5
+            ))
+            checkin = Checkin(id=generate_uuid(), user_id=user_id, temple_id=temple_id, amulet_id=amulet_id, points_earned=3)
+            checkin.checkin_time = now - timedelta(minutes=i)
+            db.session.add(checkin)
+        db.session.commit()
+    return headers
+
+def count_statements(app, client, url, headers):
+    """回傳一次請求執行的 SQL 敘述數"""
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, 'after_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response.get_json()['data']
+
+@pytest.mark.parametrize('query', ['', '&cursor=', '&include=temple', '&fields=id,temple.name'])
+def test_history_statement_count_independent_of_page_size(app, history, query):
+    """打卡歷史的查詢數不隨每頁筆數增加（關聯以 IN 查詢一次載入）"""
+    client = app.test_client()
+    client.get(f'/api/checkin/history?per_page=10{query}', headers=history)  # 先暖機，讓各快取就緒
+    
+    counts = {}
+    for per_page in (10, 50, 100):
+        counts[per_page], data = count_statements(app, client, f'/api/checkin/history?per_page={per_page}{query}', history)
+        assert len(data['checkins']) == per_page
+    
+    assert counts[10] == counts[50] == counts[100], counts
+
+@pytest.fixture
+def tied_history(app, factory):
+    """30 筆打卡，每 5 筆的 checkin_time 相同，回傳 (驗證標頭, 依 (時間, id) 新到舊排列的 id)"""
+    user_id, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    base = datetime(2026, 1, 1, 12, 0)
+    with app.app_context():
+        amulet_id = Amulet.query.filter_by(uid=amulet_uid).one().id
+        rows = []
+        for i in range(30):
+            checkin = Checkin(id=generate_uuid(), user_id=user_id, temple_id=temple_id, amulet_id=amulet_id, points_earned=1)
+            checkin.checkin_time = base - timedelta(minutes=i // 5)
+            db.session.add(checkin)
+            rows.append((checkin.checkin_time, checkin.id))
+        db.session.commit()
+    return headers, [checkin_id for _, checkin_id in sorted(rows, reverse=True)]
+
+def walk_history(client, headers, per_page, query=''):
+    """由第一頁（cursor=）依 next_cursor 取到最後一頁，回傳各頁的 id 列表"""
+    pages = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/api/checkin/history?per_page={per_page}&cursor={cursor}{query}', headers=headers)
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()['data']
+        pages.append([checkin['id'] for checkin in data['checkins']])
+        assert data['pagination']['has_next'] == (data['pagination']['next_cursor'] is not None)
+        cursor = data['pagination']['next_cursor']
+    return pages
+
+@pytest.mark.parametrize('per_page', [1, 4, 5, 7, 30, 100])
+@pytest.mark.parametrize('query', ['', '&fields=id&include='])
+def test_cursor_pages_cover_ties_without_duplicates(app, tied_history, per_page, query):
+    """同一時間有多筆打卡時，逐頁以游標取得的結果不重複也不遺漏，順序與頁碼分頁相同"""
+    headers, expected = tied_history
+    client = app.test_client()
+    
+    pages = walk_history(client, headers, per_page, query)
+    
+    assert [checkin_id for page in pages for checkin_id in page] == expected
+    assert all(len(page) == per_page for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= per_page
+    
+    response = client.get(f'/api/checkin/history?per_page=100{query}', headers=headers)
+    assert [checkin['id'] for checkin in response.get_json()['data']['checkins']] == expected
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    encode_cursor('2026-01-01T12:00:00'),
+    encode_cursor('2026-01-01T12:00:00', 'some-id', 'extra'),
+    encode_cursor('yesterday', 'some-id'),
+    encode_cursor(None, 'some-id'),
+    encode_cursor({'time': '2026-01-01T12:00:00'}, 'some-id'),
+])
+def test_malformed_cursor_is_rejected(app, factory, cursor):
+    """游標無法解碼、長度不符或時間格式錯誤時回 400"""
+    _, _, headers = factory.user()
+    
+    response = app.test_client().get(f'/api/checkin/history?cursor={cursor}', headers=headers)
+    
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '分頁游標格式不正確'
@@ -0,0 +1,207 @@
+import glob
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.models import db, Amulet, Checkin, User, TempleVisit
+from app.services.checkin_service import CheckinError
+from app.services import checkin_writer
+from app.services.checkin_writer import CheckinWriteBehind
+from app.utils.helpers import generate_uuid
+
+@pytest.fixture
+def make_writer(app, tmp_path):
+    """建立啟用中的寫入緩衝（模擬各自獨立的 worker），測試結束時停止"""
+    writers = []
+    
+    def _make(name):
+        app.config.update(CHECKIN_WRITE_BEHIND=True, CHECKIN_WRITE_BEHIND_DIR=str(tmp_path / name))
+        writer = CheckinWriteBehind(app)
+        writers.append(writer)
+        return writer
+    
+    yield _make
+    for writer in writers:
+        writer.stop()
+
+def write_wal(app, log_dir, user_id, amulet_uid, temple_ids, checkin_time):
+    """模擬 worker 在日誌 fsync 後、commit 前中止，回傳日誌中的打卡 id"""
+    os.makedirs(log_dir, exist_ok=True)
+    with app.app_context():
+        amulet_id = Amulet.query.filter_by(uid=amulet_uid).one().id
+    entries = [{'row': {
+        'id': generate_uuid(), 'user_id': user_id, 'temple_id': temple_id, 'amulet_id': amulet_id,
+        'points_earned': 1, 'checkin_time': checkin_time, 'notes': '', 'extra_data': {}, 'campaign_id': None,
+    }, 'first_visit': True} for temple_id in temple_ids]
+    with open(os.path.join(log_dir, 'checkin_wal.1.crashed.log'), 'w', encoding='utf-8') as log_file:
+        log_file.write(''.join(CheckinWriteBehind._log_line(entry) for entry in entries))
+    return [entry['row']['id'] for entry in entries]
+
+def test_cooldown_is_decided_when_accepted(app, factory, make_writer):
+    """兩個 worker 受理同一廟宇的打卡：第二筆在受理時就被拒絕，已受理的都會寫入"""
+    user_id, amulet_uid, _ = factory.user()
+    temple_id = factory.temple()
+    first, second = make_writer('worker-1'), make_writer('worker-2')
+    
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        first.submit(user, temple_id, amulet_uid)
+        with pytest.raises(CheckinError):
+            second.submit(user, temple_id, amulet_uid)
+    
+    assert first.flush() and second.flush()
+    with app.app_context():
+        assert db.session.query(db.func.count(Checkin.id)).filter(Checkin.user_id == user_id).scalar() == 1
+        earned = db.session.query(db.func.sum(Checkin.points_earned)).filter(Checkin.user_id == user_id).scalar()
+        assert db.session.get(User, user_id).blessing_points == earned
+    assert first.get_stats()['flushed'] == 1
+    assert first.get_stats()['dropped'] == 0
+
+def test_failing_checkin_moves_to_dead_letter(app, factory, make_writer, tmp_path):
+    """一直寫入失敗的打卡重試數次後移到 dead-letter 日誌，不擋住後續打卡"""
+    user_id, amulet_uid, _ = factory.user()
+    temples = [factory.temple(), factory.temple()]
+    app.config['CHECKIN_FLUSH_MAX_ATTEMPTS'] = 2
+    writer = make_writer('worker')
+    
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        written = writer.submit(user, temples[0], amulet_uid)['checkin']
+        assert writer.flush()
+        
+        # 打卡 id 與已寫入的重複，每次寫入都會失敗
+        bad_row = {key: written[key] for key in ('id', 'user_id', 'temple_id', 'amulet_id', 'points_earned', 'checkin_time')}
+        bad_row.update(notes='', extra_data={}, campaign_id=None)
+        with writer._lock:
+            writer._queue.append({'row': bad_row, 'first_visit': False})
+            writer._not_empty.notify()
+        writer.submit(user, temples[1], amulet_uid)
+    
+    assert writer.flush()
+    stats = writer.get_stats()
+    assert stats['dead_lettered'] == 1
+    assert stats['flushed'] == 2
+    
+    dead_letter = tmp_path / 'worker' / 'checkin_dead_letter.log'
+    assert len(dead_letter.read_text(encoding='utf-8').splitlines()) == 1
+    with app.app_context():
+        assert db.session.query(db.func.count(Checkin.id)).filter(Checkin.user_id == user_id).scalar() == 2
+        # 重播以打卡 id 去重：此 id 已在資料庫中，不再寫入並清除日誌
+        assert writer.replay_dead_letters(str(tmp_path / 'worker')) == (0, 0)
+    assert not dead_letter.exists()
+
+def test_starting_worker_keeps_live_worker_log(app, make_writer):
+    """後啟動的 worker 重播日誌時不會刪除仍在執行中 worker 的日誌"""
+    first = make_writer('shared')
+    second = make_writer('shared')
+    
+    assert os.path.exists(first._log_path)
+    assert first._log_path != second._log_path
+    assert not glob.glob(os.path.join(os.path.dirname(first._log_path), '*.tmp'))
+
+def test_failed_log_append_releases_cooldown(app, factory, make_writer, monkeypatch):
+    """日誌寫入失敗時冷卻一併回滾，同一廟宇可以立刻重新打卡"""
+    user_id, amulet_uid, _ = factory.user()
+    temple_id = factory.temple()
+    writer = make_writer('worker')
+    
+    def broken_append(entries):
+        writer._log_file.write('{"partial": ')
+        writer._log_file.flush()
+        raise OSError('disk full')
+    
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        monkeypatch.setattr(writer, '_append_log', broken_append)
+        with pytest.raises(OSError):
+            writer.submit(user, temple_id, amulet_uid)
+        assert db.session.get(TempleVisit, (user_id, temple_id)) is None
+        assert os.path.getsize(writer._log_path) == 0
+        
+        monkeypatch.undo()
+        writer.submit(user, temple_id, amulet_uid)
+    
+    assert writer.flush()
+    with app.app_context():
+        assert db.session.query(db.func.count(Checkin.id)).filter(Checkin.user_id == user_id).scalar() == 1
+    assert writer.get_stats()['submitted'] == 1
+
+def test_concurrent_submits_share_claim_commits(app, factory, make_writer):
+    """同時送出的打卡一起確認冷卻，commit 次數少於打卡數"""
+    users = [factory.user() for _ in range(8)]
+    temples = [factory.temple() for _ in range(5)]
+    writer = make_writer('worker')
+    errors = []
+    
+    def worker(user_id, amulet_uid):
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            for temple_id in temples:
+                try:
+                    writer.submit(user, temple_id, amulet_uid)
+                except Exception as e:
+                    errors.append(e)
+    
+    threads = [threading.Thread(target=worker, args=(user_id, amulet_uid)) for user_id, amulet_uid, _ in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert writer.flush()
+    stats = writer.get_stats()
+    assert stats['submitted'] == stats['flushed'] == len(users) * len(temples)
+    assert stats['claim_batches'] < stats['submitted']
+
+@pytest.mark.parametrize('failing', ['insert_checkin_rows', '_unwritten_records'])
+def test_replay_error_does_not_break_startup(app, factory, make_writer, tmp_path, monkeypatch, failing):
+    """啟動時重播遇到資料庫錯誤不會中斷啟動，無法寫入的打卡移到 dead-letter 日誌"""
+    user_id, amulet_uid, _ = factory.user()
+    ids = write_wal(app, tmp_path / 'worker', user_id, amulet_uid, [factory.temple(), factory.temple()], datetime.utcnow())
+    
+    def broken(*args, **kwargs):
+        raise RuntimeError('database is down')
+    
+    if failing == 'insert_checkin_rows':
+        monkeypatch.setattr(checkin_writer, 'insert_checkin_rows', broken)
+    else:
+        monkeypatch.setattr(CheckinWriteBehind, '_unwritten_records', broken)
+    
+    writer = make_writer('worker')
+    
+    assert writer.enabled
+    assert not glob.glob(str(tmp_path / 'worker' / 'checkin_wal.1.*'))
+    dead_letter = (tmp_path / 'worker' / 'checkin_dead_letter.log').read_text(encoding='utf-8')
+    assert [line for line in dead_letter.splitlines() if line] and all(checkin_id in dead_letter for checkin_id in ids)
+    
+    # 資料庫恢復後以 replay-dead-checkins 寫入
+    monkeypatch.undo()
+    with app.app_context():
+        assert writer.replay_dead_letters(str(tmp_path / 'worker')) == (2, 0)
+        assert db.session.query(db.func.count(Checkin.id)).filter(Checkin.user_id == user_id).scalar() == 2
+
+def test_replay_applies_uncommitted_claims(app, factory, make_writer, tmp_path):
+    """fsync 後、commit 前中止的打卡在重播時補上最後造訪時間；已 commit 的冷卻不重複計算"""
+    user_id, amulet_uid, _ = factory.user()
+    crashed, committed = factory.temple(), factory.temple()
+    checkin_time = datetime.utcnow()
+    write_wal(app, tmp_path / 'worker', user_id, amulet_uid, [crashed, committed], checkin_time)
+    with app.app_context():
+        TempleVisit.claim(user_id, committed, checkin_time, 24)
+        db.session.commit()
+    
+    writer = make_writer('worker')
+    
+    with app.app_context():
+        for temple_id in (crashed, committed):
+            visit = db.session.get(TempleVisit, (user_id, temple_id))
+            assert visit.last_checkin_time == checkin_time
+            assert visit.visit_count == 1
+        assert db.session.query(db.func.count(Checkin.id)).filter(Checkin.user_id == user_id).scalar() == 2
+        
+        # 冷卻已生效，重播後立刻再打卡會被拒絕
+        with pytest.raises(CheckinError):
+            writer.submit(db.session.get(User, user_id), crashed, amulet_uid)
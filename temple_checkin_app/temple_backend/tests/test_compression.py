@@ -0,0 +1,109 @@
+import gzip
+import json
+
+import pytest
+
+from app.services.temple_catalog import temple_catalog
+from app.utils.compression import response_compressor
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """各測試的資料庫世代都從 0 開始，清除以 ETag 為鍵的全域快取"""
+    temple_catalog.invalidate()
+    response_compressor.cache.clear()
+
+@pytest.fixture
+def temples(factory):
+    """建立足夠多的廟宇，讓列表回應超過壓縮門檻"""
+    return [factory.temple() for _ in range(10)]
+
+def get_list(app, accept_encoding=None):
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    return app.test_client().get('/api/temples', headers=headers)
+
+def without_timestamp(body):
+    body = json.loads(body)
+    body.pop('timestamp')
+    return body
+
+def test_gzip_body_matches_uncompressed(app, temples):
+    """gzip 解壓後與未壓縮的內容相同，ETag 加上 -gzip 後綴"""
+    plain = get_list(app)
+    compressed = get_list(app, 'gzip')
+    
+    assert len(plain.data) >= app.config['COMPRESSION_MIN_SIZE']
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.vary
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.vary
+    assert int(compressed.headers['Content-Length']) == len(compressed.data) < len(plain.data)
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert without_timestamp(gzip.decompress(compressed.data)) == without_timestamp(plain.data)
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip', 'gzip'),
+    ('br;q=0.5, gzip;q=1.0', 'gzip'),
+    ('gzip;q=0.5, br', 'br'),
+    ('br, gzip', 'br'),  # 品質值相同時依伺服器偏好
+    ('*', 'br'),
+    ('gzip;q=0, br;q=0', None),
+    ('identity', None),
+    ('deflate', None),
+])
+def test_encoding_follows_quality_values(app, temples, accept_encoding, expected):
+    """依 Accept-Encoding 的品質值選擇編碼，都不接受時不壓縮"""
+    if expected == 'br':
+        pytest.importorskip('brotli')
+    response = get_list(app, accept_encoding)
+    
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == expected
+    if expected == 'br':
+        import brotli
+        assert json.loads(brotli.decompress(response.data))['success'] is True
+
+def test_gzip_only_without_brotli(app, temples, monkeypatch):
+    """未安裝 brotli 時只會協商出 gzip"""
+    monkeypatch.setattr(response_compressor, 'encodings', ['gzip'])
+    
+    assert get_list(app, 'br').headers.get('Content-Encoding') is None
+    assert get_list(app, 'br, gzip;q=0.1').headers['Content-Encoding'] == 'gzip'
+
+def test_small_body_is_not_compressed(app, factory):
+    """小於 COMPRESSION_MIN_SIZE 的回應原樣送出，但仍標示 Vary"""
+    temple_id = factory.temple()
+    
+    response = app.test_client().get(f'/api/temples/{temple_id}?fields=id&include=', headers={'Accept-Encoding': 'gzip'})
+    
+    assert response.status_code == 200
+    assert len(response.data) < app.config['COMPRESSION_MIN_SIZE']
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.vary
+    assert not response.headers['ETag'].endswith('-gzip"')
+    assert response.get_json()['data'] == {'id': temple_id}
+
+def test_same_etag_reuses_compressed_body(app, temples):
+    """相同 ETag 與編碼的壓縮結果取自快取"""
+    first = get_list(app, 'gzip')
+    hits = response_compressor.get_stats()['cache_hits']
+    
+    second = get_list(app, 'gzip')
+    
+    assert response_compressor.get_stats()['cache_hits'] == hits + 1
+    assert second.data == first.data
+
+def test_streamed_export_is_compressed_per_chunk(app, factory):
+    """串流匯出逐段壓縮，整體仍是一個完整的 gzip"""
+    app.config['CHECKIN_EXPORT_CHUNK_SIZE'] = 1
+    _, amulet_uid, headers = factory.user()
+    client = app.test_client()
+    for temple_id in (factory.temple(), factory.temple()):
+        response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+        assert response.status_code == 201
+    
+    response = client.get('/api/checkin/export?format=ndjson', headers={**headers, 'Accept-Encoding': 'gzip'})
+    
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+    assert len(lines) == 2
@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+import pytest
+from werkzeug.http import http_date
+
+from app.models import db, Temple, CacheGeneration
+from app.services.temple_catalog import temple_catalog, TEMPLE_CATALOG
+from app.utils.compression import response_compressor
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """各測試的資料庫世代都從 0 開始，清除以 ETag 為鍵的全域快取"""
+    temple_catalog.invalidate()
+    response_compressor.cache.clear()
+
+def rename_temple(app, temple_id, name):
+    """與管理員修改廟宇相同：遞增目錄世代後移除快取"""
+    with app.app_context():
+        temple = db.session.get(Temple, temple_id)
+        temple.name = name
+        temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
+        db.session.commit()
+    temple_catalog.invalidate(temple_id)
+
+@pytest.mark.parametrize('path', [
+    '/api/temples/{id}',
+    '/api/temples/{id}?include=',
+    '/api/temples',
+    '/api/temples?include=stats',
+    '/api/temples?ids={id},missing',
+])
+def test_if_none_match_returns_304_until_temple_changes(app, factory, path):
+    """帶相同 ETag 時回 304 且不含內容，廟宇異動後 ETag 改變並回傳新內容"""
+    temple_id = factory.temple()
+    path = path.format(id=temple_id)
+    client = app.test_client()
+    
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert 'no-cache' in first.headers['Cache-Control']
+    
+    cached = client.get(path, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+    
+    rename_temple(app, temple_id, '新名稱')
+    
+    changed = client.get(path, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert '新名稱' in changed.get_data(as_text=True)
+
+def test_stats_etag_changes_with_checkin_count(app, factory):
+    """含統計時打卡次數改變即視為新版本"""
+    _, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    client = app.test_client()
+    etag = client.get(f'/api/temples/{temple_id}').headers['ETag']
+    
+    response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+    assert response.status_code == 201
+    
+    response = client.get(f'/api/temples/{temple_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['data']['stats']['checkin_count'] == 1
+
+def test_compressed_etag_variant_returns_304(app, factory, monkeypatch):
+    """壓縮後的 ETag 帶 -gzip 後綴，以該 ETag 條件式請求時回 304 並沿用同一個 ETag"""
+    monkeypatch.setattr(response_compressor, 'min_size', 0)
+    temple_id = factory.temple()
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+    
+    plain = client.get(f'/api/temples/{temple_id}')
+    compressed = client.get(f'/api/temples/{temple_id}', headers=headers)
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    etag = compressed.headers['ETag']
+    assert etag == plain.headers['ETag'][:-1] + '-gzip"'
+    
+    for request_headers in (headers, {}):
+        cached = client.get(f'/api/temples/{temple_id}', headers={**request_headers, 'If-None-Match': etag})
+        assert cached.status_code == 304
+        assert cached.headers['ETag'] == etag
+        assert 'Content-Encoding' not in cached.headers
+    
+    cached = client.get(f'/api/temples/{temple_id}', headers={'If-None-Match': f'"{plain.headers["ETag"][1:-1]}-deflate"'})
+    assert cached.status_code == 200
+
+def test_if_modified_since(app, factory):
+    """沒有 If-None-Match 時依 Last-Modified 判斷；含統計時不提供 Last-Modified"""
+    temple_id = factory.temple()
+    client = app.test_client()
+    path = f'/api/temples/{temple_id}?include='
+    
+    response = client.get(path)
+    last_modified = response.last_modified
+    assert last_modified is not None
+    assert 'Last-Modified' not in client.get(f'/api/temples/{temple_id}').headers
+    
+    assert client.get(path, headers={'If-Modified-Since': http_date(last_modified)}).status_code == 304
+    earlier = http_date(last_modified - timedelta(seconds=1))
+    assert client.get(path, headers={'If-Modified-Since': earlier}).status_code == 200
+    # If-None-Match 優先：ETag 不符時即使時間未變也回傳內容
+    response = client.get(path, headers={'If-Modified-Since': http_date(last_modified), 'If-None-Match': '"stale"'})
+    assert response.status_code == 200
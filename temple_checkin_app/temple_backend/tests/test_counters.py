@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+import pytest
+from click.testing import CliRunner
+
+from app.models import db, Amulet, Checkin, Temple, TempleVisit, User
+from app.services.checkin_writer import CheckinWriteBehind
+
+def assert_counters_match():
+    """廟宇、平安符與使用者的計數欄位都等於由打卡記錄 COUNT(*) 的結果"""
+    db.session.expire_all()
+    for temple in Temple.query:
+        checkins = Checkin.query.filter_by(temple_id=temple.id)
+        assert temple.checkin_count == checkins.count(), temple.id
+        assert temple.unique_visitors_count == checkins.with_entities(db.func.count(db.distinct(Checkin.user_id))).scalar()
+    
+    for amulet in Amulet.query:
+        checkins = Checkin.query.filter_by(amulet_id=amulet.id)
+        assert amulet.checkin_count == checkins.count(), amulet.id
+        assert amulet.last_checkin_at == checkins.with_entities(db.func.max(Checkin.checkin_time)).scalar()
+    
+    for user in User.query:
+        checkins = Checkin.query.filter_by(user_id=user.id)
+        assert user.checkin_count == checkins.count(), user.id
+        assert user.unique_temples_count == checkins.with_entities(db.func.count(db.distinct(Checkin.temple_id))).scalar()
+        assert user.blessing_points == (checkins.with_entities(db.func.sum(Checkin.points_earned)).scalar() or 0)
+
+def allow_repeat(app, user_id, temple_id):
+    """把最後造訪時間往前移，讓同一間廟宇可以立刻再打卡"""
+    with app.app_context():
+        db.session.get(TempleVisit, (user_id, temple_id)).last_checkin_time -= timedelta(days=2)
+        db.session.commit()
+
+@pytest.fixture
+def users(factory):
+    return [factory.user() for _ in range(2)]
+
+@pytest.fixture
+def temples(factory):
+    return [factory.temple() for _ in range(3)]
+
+def test_single_checkins_keep_counters(app, users, temples):
+    """逐筆打卡（含同一間廟宇第二次打卡）後計數與打卡記錄一致"""
+    client = app.test_client()
+    (first_id, first_uid, first_headers), (_, second_uid, second_headers) = users
+    
+    def checkin(amulet_uid, headers, temple_id):
+        response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+        assert response.status_code == 201, response.get_json()
+    
+    for temple_id in temples[:2]:
+        checkin(first_uid, first_headers, temple_id)
+    allow_repeat(app, first_id, temples[0])
+    checkin(first_uid, first_headers, temples[0])
+    checkin(second_uid, second_headers, temples[0])
+    
+    with app.app_context():
+        assert_counters_match()
+        assert db.session.get(Temple, temples[0]).checkin_count == 3
+        assert db.session.get(Temple, temples[0]).unique_visitors_count == 2
+
+def test_batch_checkins_keep_counters(app, users, temples):
+    """離線批次打卡（同一廟宇兩筆相隔超過冷卻時間）後計數與打卡記錄一致"""
+    (_, amulet_uid, headers), (_, other_uid, other_headers) = users
+    now = datetime.utcnow()
+    
+    def client_time(hours_ago):
+        return (now - timedelta(hours=hours_ago)).isoformat() + 'Z'
+    
+    client = app.test_client()
+    response = client.post('/api/checkin/batch', json={'checkins': [
+        {'temple_id': temples[0], 'amulet_uid': amulet_uid, 'client_time': client_time(50)},
+        {'temple_id': temples[0], 'amulet_uid': amulet_uid, 'client_time': client_time(1)},
+        {'temple_id': temples[1], 'amulet_uid': amulet_uid, 'client_time': client_time(2)},
+        {'temple_id': temples[1], 'amulet_uid': amulet_uid, 'client_time': client_time(3)},  # 冷卻中
+    ]}, headers=headers)
+    assert response.get_json()['data']['accepted_count'] == 3
+    response = client.post('/api/checkin/batch', json={'checkins': [
+        {'temple_id': temples[0], 'amulet_uid': other_uid, 'client_time': client_time(5)},
+    ]}, headers=other_headers)
+    assert response.get_json()['data']['accepted_count'] == 1
+    
+    with app.app_context():
+        assert_counters_match()
+        assert db.session.get(Temple, temples[0]).checkin_count == 3
+
+def test_write_behind_checkins_keep_counters(app, users, temples, tmp_path):
+    """寫入緩衝批次寫入後計數與打卡記錄一致"""
+    app.config.update(CHECKIN_WRITE_BEHIND=True, CHECKIN_WRITE_BEHIND_DIR=str(tmp_path / 'wal'))
+    writer = CheckinWriteBehind(app)
+    try:
+        with app.app_context():
+            for user_id, amulet_uid, _ in users:
+                user = db.session.get(User, user_id)
+                for temple_id in temples:
+                    writer.submit(user, temple_id, amulet_uid)
+            allow_repeat(app, users[0][0], temples[0])
+            writer.submit(db.session.get(User, users[0][0]), temples[0], users[0][1])
+        assert writer.flush()
+    finally:
+        writer.stop()
+    
+    with app.app_context():
+        assert_counters_match()
+        assert db.session.get(Temple, temples[0]).checkin_count == 3
+
+def test_rebuild_counters_repairs_drift(app, users, temples):
+    """rebuild-counters 由打卡記錄修正偏移的計數欄位"""
+    from run import rebuild_counters
+    
+    client = app.test_client()
+    for user_id, amulet_uid, headers in users:
+        for temple_id in temples[:2]:
+            client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=headers)
+    
+    with app.app_context():
+        db.session.execute(Temple.__table__.update().values(checkin_count=99, unique_visitors_count=0))
+        db.session.execute(Amulet.__table__.update().values(checkin_count=0, last_checkin_at=None))
+        db.session.execute(User.__table__.update().values(checkin_count=7, unique_temples_count=7))
+        db.session.commit()
+        
+        result = CliRunner().invoke(rebuild_counters, ['--chunk-size', '1'])
+        
+        assert result.exit_code == 0, result.output
+        assert_counters_match()
+        assert db.session.get(Temple, temples[2]).checkin_count == 0
@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy import event
+
+from app.models import db, User
+from app.services.temple_catalog import temple_catalog
+
+# 名稱 -> (路徑, 驗證身分, 列表鍵, 資料表, 選取的欄位, 未選取的欄位)
+ENDPOINTS = {
+    'temples': ('/api/temples', None, 'items', 'temples', 'name', 'description'),
+    'checkins': ('/api/checkin/history', 'user', 'checkins', 'checkins', 'points_earned', 'notes'),
+    'admin_temples': ('/api/admin/temples', 'admin', 'items', 'temples', 'name', 'description'),
+    'admin_users': ('/api/admin/users', 'admin', 'items', 'users', 'username', 'email'),
+}
+
+@pytest.fixture
+def headers(app, factory):
+    """兩間廟宇、一位各打卡一次的使用者與一位管理員，回傳 {身分: 驗證標頭}"""
+    temple_catalog.invalidate()
+    _, amulet_uid, user_headers = factory.user()
+    admin_id, _, admin_headers = factory.user()
+    client = app.test_client()
+    for temple_id in (factory.temple(), factory.temple()):
+        response = client.post('/api/checkin', json={'temple_id': temple_id, 'amulet_uid': amulet_uid}, headers=user_headers)
+        assert response.status_code == 201
+    with app.app_context():
+        db.session.get(User, admin_id).is_admin = True
+        db.session.commit()
+    return {None: {}, 'user': user_headers, 'admin': admin_headers}
+
+def get_items(app, headers, name, query, statements=None):
+    path, role, key, *_ = ENDPOINTS[name]
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    if statements is not None:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(f'{path}?{query}', headers=headers[role])
+    finally:
+        if statements is not None:
+            event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.get_json()
+    items = response.get_json()['data'][key]
+    assert items
+    return items
+
+@pytest.mark.parametrize('name', ENDPOINTS)
+def test_fields_narrow_output_and_select(app, headers, name):
+    """fields= 只輸出選到的欄位，列表查詢也只 SELECT 這些欄位（load_only）"""
+    _, _, _, table, field, excluded = ENDPOINTS[name]
+    statements = []
+    
+    items = get_items(app, headers, name, f'fields=id,{field}&include=', statements)
+    
+    assert all(set(item) == {'id', field} for item in items)
+    selects = [statement for statement in statements if f'FROM {table}' in statement and 'ORDER BY' in statement]
+    assert selects
+    for statement in selects:
+        assert f'{table}.{field}' in statement
+        assert f'{table}.{excluded}' not in statement
+
+@pytest.mark.parametrize('name', ENDPOINTS)
+def test_without_fields_reads_every_column(app, headers, name):
+    """未帶 fields= 時輸出並讀取全部欄位"""
+    _, _, _, table, field, excluded = ENDPOINTS[name]
+    statements = []
+    
+    items = get_items(app, headers, name, 'include=', statements)
+    
+    assert all({'id', field, excluded} <= set(item) for item in items)
+    assert any(f'{table}.{excluded}' in statement for statement in statements if 'ORDER BY' in statement)
+
+@pytest.mark.parametrize('name', ENDPOINTS)
+@pytest.mark.parametrize('query', ['fields=id,no_such_field', 'include=no_such_block', 'fields=temple.no_such_field'])
+def test_unknown_fields_are_rejected(app, headers, name, query):
+    """不支援的欄位、關聯欄位或 include 回 400"""
+    path, role, *_ = ENDPOINTS[name]
+    
+    response = app.test_client().get(f'{path}?{query}', headers=headers[role])
+    
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('query, relations', [
+    ('', {'temple', 'amulet'}),
+    ('include=', set()),
+    ('include=temple', {'temple'}),
+    ('include=amulet&fields=id', {'amulet'}),
+])
+def test_checkin_relations_only_when_requested(app, headers, query, relations):
+    """打卡歷史預設附上廟宇與平安符；帶 include= 時只附上指定的關聯"""
+    items = get_items(app, headers, 'checkins', query)
+    
+    assert all({'temple', 'amulet'} & set(item) == relations for item in items)
+
+def test_checkin_relation_fields(app, headers):
+    """fields= 的「關聯.欄位」只輸出該關聯的這些欄位，並自動附上該關聯"""
+    items = get_items(app, headers, 'checkins', 'include=&fields=id,temple.name')
+    
+    assert all(set(item) == {'id', 'temple'} for item in items)
+    assert all(set(item['temple']) == {'name'} for item in items)
+
+@pytest.mark.parametrize('name', ['temples', 'admin_temples', 'admin_users'])
+def test_stats_only_when_requested(app, headers, name):
+    """列表預設不附統計，include=stats 時才附上"""
+    assert all('stats' not in item for item in get_items(app, headers, name, ''))
+    assert all('stats' in item for item in get_items(app, headers, name, 'include=stats&fields=id'))
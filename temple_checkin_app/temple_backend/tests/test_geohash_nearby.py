@@ -0,0 +1,51 @@
+import random
+
+from app.models import db, Temple
+from app.services.spatial_index import spatial_index
+from app.utils.geo import geohash_encode, haversine
+
+# 赤道與本初子午線交會處，四個象限的 geohash 第一個字元都不同
+CORNERS = [(0.003, 0.003), (0.003, -0.003), (-0.003, 0.003), (-0.003, -0.003)]
+
+def test_ranges_cover_cells_on_both_sides_of_an_edge(app, factory):
+    """查詢範圍跨越 geohash 格子邊界時，各格中的廟宇都會找到，範圍外的不會"""
+    inside = [factory.temple(latitude=lat, longitude=lng) for lat, lng in CORNERS]
+    factory.temple(latitude=0.05, longitude=0.05)
+    with app.app_context():
+        assert len({geohash_encode(lat, lng)[0] for lat, lng in CORNERS}) == 4
+        
+        hits = Temple.find_nearby_ids(0.0, 0.0, radius_km=1, limit=None)
+        
+        assert {temple_id for temple_id, _ in hits} == set(inside)
+        distances = [distance for _, distance in hits]
+        assert distances == sorted(distances)
+
+def test_ranges_match_brute_force(app, factory):
+    """隨機座標的結果與逐筆計算距離相同"""
+    rng = random.Random(0)
+    points = [(rng.uniform(24.9, 25.1), rng.uniform(121.4, 121.6)) for _ in range(200)]
+    temple_ids = [factory.temple(latitude=lat, longitude=lng) for lat, lng in points]
+    with app.app_context():
+        for _ in range(20):
+            lat, lng = rng.uniform(24.9, 25.1), rng.uniform(121.4, 121.6)
+            radius = rng.uniform(0.5, 5)
+            expected = {
+                temple_id for temple_id, (t_lat, t_lng) in zip(temple_ids, points)
+                if haversine(lat, lng, t_lat, t_lng) <= radius
+            }
+            assert {temple_id for temple_id, _ in Temple.find_nearby_ids(lat, lng, radius, None)} == expected
+
+def test_rows_without_geohash_are_still_found(app, factory, monkeypatch):
+    """尚未執行 backfill-geohash 的廟宇仍會出現在 geohash 查詢結果中"""
+    monkeypatch.setattr(spatial_index, 'backend', 'geohash')
+    legacy = factory.temple(latitude=23.0, longitude=120.2)
+    current = factory.temple(latitude=23.001, longitude=120.2)
+    factory.temple(latitude=23.5, longitude=120.2)
+    with app.app_context():
+        db.session.get(Temple, legacy).geohash = None
+        db.session.commit()
+    
+    response = app.test_client().get('/api/temples/nearby?lat=23.0&lng=120.2&radius=1')
+    
+    assert response.status_code == 200
+    assert [temple['id'] for temple in response.get_json()['data']] == [legacy, current]
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db, IdempotencyKey, User
+from app.utils.idempotency import idempotency_store, _scoped_key
+
+def test_stale_in_progress_key_can_be_reclaimed(app, factory):
+    """處理中的 worker 當掉留下佔位記錄：逾時前回 409，逾時後可重新處理"""
+    _, amulet_uid, headers = factory.user()
+    body = json.dumps({'temple_id': factory.temple(), 'amulet_uid': amulet_uid}).encode('utf-8')
+    headers = dict(headers, **{'Idempotency-Key': 'retry-1', 'Content-Type': 'application/json'})
+    client = app.test_client()
+    
+    # 模擬寫入佔位記錄後就當掉的 worker
+    with app.test_request_context('/api/checkin', method='POST', headers=headers):
+        key = _scoped_key('retry-1')
+        assert idempotency_store.begin(key, hashlib.sha256(body).hexdigest())
+    
+    assert client.post('/api/checkin', data=body, headers=headers).status_code == 409
+    
+    with app.app_context():
+        record = db.session.get(IdempotencyKey, key)
+        assert record.expires_at <= datetime.utcnow() + timedelta(seconds=app.config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS'])
+        record.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+    
+    response = client.post('/api/checkin', data=body, headers=headers)
+    assert response.status_code == 201
+    
+    replay = client.post('/api/checkin', data=body, headers=headers)
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    with app.app_context():
+        assert db.session.get(IdempotencyKey, key).expires_at > datetime.utcnow() + timedelta(hours=1)
+
+def test_register_replay_issues_fresh_tokens(app, monkeypatch):
+    """註冊回應保存時不含 token，重試時重播同一位使用者並簽發新的 token"""
+    # 測試環境不查詢 DNS 確認信箱網域
+    monkeypatch.setattr('app.routes.auth.validate_email_format', lambda email: ([], email))
+    body = {'username': 'newuser', 'email': 'newuser@example.com', 'password': 'secret123'}
+    headers = {'Idempotency-Key': 'register-1'}
+    client = app.test_client()
+    
+    first = client.post('/api/auth/register', json=body, headers=headers)
+    assert first.status_code == 201
+    user_id = first.get_json()['data']['user']['id']
+    with app.app_context():
+        stored = json.loads(db.session.query(IdempotencyKey.response_body).scalar())
+        assert stored['data']['user']['id'] == user_id
+        assert 'access_token' not in stored['data'] and 'refresh_token' not in stored['data']
+    idempotency_store.cache.clear()  # 由資料表重播（其他 worker）
+    
+    replay = client.post('/api/auth/register', json=body, headers=headers)
+    
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    data = replay.get_json()['data']
+    assert data['user']['id'] == user_id
+    me = client.get('/api/auth/me', headers={'Authorization': f'Bearer {data["access_token"]}'})
+    assert me.status_code == 200
+    assert me.get_json()['data']['user']['id'] == user_id
+    refreshed = client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {data["refresh_token"]}'})
+    assert refreshed.status_code == 200
+    with app.app_context():
+        assert db.session.query(User).filter_by(username='newuser').count() == 1
+
+def test_replay_follows_accept_of_retry(app, factory):
+    """重試的 Accept 與第一次不同時，重播內容以本次協商的格式編碼"""
+    msgpack = pytest.importorskip('msgpack')
+    _, amulet_uid, headers = factory.user()
+    body = {'temple_id': factory.temple(), 'amulet_uid': amulet_uid}
+    headers = dict(headers, **{'Idempotency-Key': 'accept-1'})
+    client = app.test_client()
+    
+    first = client.post('/api/checkin', json=body, headers={**headers, 'Accept': 'application/msgpack'})
+    assert first.status_code == 201
+    assert first.mimetype == 'application/msgpack'
+    checkin_id = msgpack.unpackb(first.data, timestamp=3)['data']['checkin']['id']
+    
+    replay = client.post('/api/checkin', json=body, headers={**headers, 'Accept': 'application/json'})
+    
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.mimetype == 'application/json'
+    assert replay.get_json()['data']['checkin']['id'] == checkin_id
+    
+    same = client.post('/api/checkin', json=body, headers={**headers, 'Accept': 'application/msgpack'})
+    assert same.data == first.data
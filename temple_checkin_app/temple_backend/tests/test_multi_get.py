@@ -0,0 +1,61 @@
+import pytest
+
+from app.models import db, Temple
+from app.services.temple_catalog import temple_catalog
+
+@pytest.fixture
+def temples(app, factory):
+    """三間廟宇，第三間已停用"""
+    temple_ids = [factory.temple(latitude=25.0 + i * 0.01) for i in range(3)]
+    with app.app_context():
+        db.session.get(Temple, temple_ids[2]).is_active = False
+        db.session.commit()
+    temple_catalog.invalidate()
+    return temple_ids
+
+def lookup(app, method, ids, query=''):
+    client = app.test_client()
+    if method == 'GET':
+        return client.get(f'/api/temples?ids={",".join(ids)}{query}')
+    return client.post(f'/api/temples/lookup{query.replace("&", "?", 1)}', json={'ids': ids})
+
+@pytest.mark.parametrize('method', ['GET', 'POST'])
+def test_items_follow_request_order_with_missing_ids(app, temples, method):
+    """items 依請求順序排列並去除重複，不存在與已停用的 id 列在 missing"""
+    first, second, inactive = temples
+    
+    response = lookup(app, method, [second, 'no-such-id', first, second, inactive])
+    
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert [item['id'] for item in data['items']] == [second, first]
+    assert data['missing'] == ['no-such-id', inactive]
+
+@pytest.mark.parametrize('method', ['GET', 'POST'])
+def test_fields_and_distance(app, temples, method):
+    """fields 與使用者位置與列表相同"""
+    first, second, _ = temples
+    
+    response = lookup(app, method, [first, second], '&fields=id,latitude&include=&lat=25.0&lng=121.5')
+    
+    items = response.get_json()['data']['items']
+    assert [set(item) for item in items] == [{'id', 'latitude', 'distance'}] * 2
+    assert items[0]['distance'] == 0
+    assert items[1]['distance'] > 0
+
+@pytest.mark.parametrize('ids', [None, [], [''], ' , ', [1, 2], {'id': 'abc'}])
+def test_invalid_ids_are_rejected(app, ids):
+    """空的或非字串的 id 列表回 400"""
+    response = app.test_client().post('/api/temples/lookup', json={'ids': ids})
+    
+    assert response.status_code == 400
+
+def test_too_many_ids_are_rejected(app):
+    """超過 MULTI_GET_MAX_IDS 回 400，重複的 id 不計入"""
+    max_ids = app.config['MULTI_GET_MAX_IDS']
+    client = app.test_client()
+    
+    assert client.post('/api/temples/lookup', json={'ids': [f'id-{i}' for i in range(max_ids + 1)]}).status_code == 400
+    response = client.post('/api/temples/lookup', json={'ids': [f'id-{i}' for i in range(max_ids)] * 2})
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['missing']) == max_ids
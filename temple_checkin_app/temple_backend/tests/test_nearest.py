@@ -0,0 +1,202 @@
+import random
+
+import pytest
+
+from app.models import db, CacheGeneration, Temple
+from app.services.spatial_index import spatial_index
+from app.services.temple_catalog import TEMPLE_CATALOG, temple_catalog
+from app.utils import geo
+from app.utils.geo import haversine
+from app.utils.helpers import encode_cursor, generate_uuid
+
+CENTER = (23.0, 120.2)
+BACKENDS = ['memory', 'geohash', 'sql']
+
+@pytest.fixture
+def temples(factory):
+    """中心附近的隨機廟宇，加上同座標的兩間（距離相同，以 id 決定順序）與遠處幾間，回傳 {id: 座標}"""
+    rng = random.Random(0)
+    points = [(CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.05, 0.05)) for _ in range(20)]
+    points += [(23.01, 120.21)] * 2 + [(23.3, 120.2), (24.0, 121.0), (-23.0, -60.0)]
+    return {factory.temple(latitude=lat, longitude=lng): (lat, lng) for lat, lng in points}
+
+def expected_order(temples):
+    return [temple_id for _, temple_id in sorted((haversine(*CENTER, *point), temple_id) for temple_id, point in temples.items())]
+
+def get_page(client, k, cursor=None):
+    url = f'/api/temples/nearby?lat={CENTER[0]}&lng={CENTER[1]}&k={k}'
+    if cursor:
+        url += f'&cursor={cursor}'
+    response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+def walk(client, k, cursor=None):
+    """由 cursor 開始一路取到最後一頁，回傳各頁的 id 列表"""
+    pages = []
+    while True:
+        data = get_page(client, k, cursor)
+        pages.append([temple['id'] for temple in data['temples']])
+        if not data['pagination']['has_next']:
+            assert data['pagination']['next_cursor'] is None
+            return pages
+        cursor = data['pagination']['next_cursor']
+
+def add_temple(latitude, longitude):
+    """模擬管理員新增廟宇（遞增目錄世代）"""
+    temple = Temple(
+        id=generate_uuid(), name='新廟宇', main_deity='媽祖', description='測試',
+        address='台南市', latitude=latitude, longitude=longitude
+    )
+    db.session.add(temple)
+    temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
+    db.session.commit()
+    temple_catalog.invalidate(temple.id)
+    return temple.id
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_pages_concatenate_to_full_ordering(app, temples, monkeypatch, backend):
+    """逐頁取得的結果不重複，串接後與依 (距離, id) 排序的全部廟宇相同"""
+    monkeypatch.setattr(spatial_index, 'backend', backend)
+    client = app.test_client()
+    
+    pages = walk(client, 4)
+    
+    assert [len(page) for page in pages] == [4] * 6 + [1]
+    ids = [temple_id for page in pages for temple_id in page]
+    assert ids == expected_order(temples)
+    assert [temple['id'] for temple in get_page(client, 100)['temples']] == ids
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_ties_are_broken_by_id_across_pages(app, temples, monkeypatch, backend):
+    """距離相同的兩間分在兩頁時，下一頁由 id 較大的那間開始"""
+    monkeypatch.setattr(spatial_index, 'backend', backend)
+    client = app.test_client()
+    order = expected_order(temples)
+    twins = sorted(temple_id for temple_id, point in temples.items() if point == (23.01, 120.21))
+    k = order.index(twins[0]) + 1
+    
+    first = get_page(client, k)
+    
+    assert first['temples'][-1]['id'] == twins[0]
+    second = get_page(client, 1, first['pagination']['next_cursor'])
+    assert second['temples'][0]['id'] == twins[1]
+    assert second['temples'][0]['distance'] == first['temples'][-1]['distance']
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_cursor_is_stable_when_temples_are_added(app, temples, monkeypatch, backend):
+    """兩頁之間新增的廟宇：比游標近的不會讓後續頁面重複或遺漏，比游標遠的會出現在後續頁面"""
+    monkeypatch.setattr(spatial_index, 'backend', backend)
+    client = app.test_client()
+    order = expected_order(temples)
+    
+    first = get_page(client, 5)
+    with app.app_context():
+        add_temple(*CENTER)  # 比游標近，後續頁面不應出現
+        farther = add_temple(23.5, 120.2)
+    
+    rest = [temple_id for page in walk(client, 5, first['pagination']['next_cursor']) for temple_id in page]
+    
+    assert [temple['id'] for temple in first['temples']] == order[:5]
+    expected = order[5:]
+    expected.insert(expected.index(next(temple_id for temple_id in order if temples[temple_id] == (24.0, 121.0))), farther)
+    assert rest == expected
+
+@pytest.mark.parametrize('cursor', [
+    encode_cursor(CENTER[0] + 0.1, CENTER[1], 1.0, 'some-id'),
+    encode_cursor(CENTER[0], CENTER[1], 1.0),
+    encode_cursor(CENTER[0], CENTER[1], 'far', 'some-id'),
+    encode_cursor(CENTER[0], CENTER[1], 1.0, 5),
+    'not-a-cursor',
+])
+def test_invalid_cursor_is_rejected(app, cursor):
+    """游標格式錯誤或與查詢座標不符時回 400"""
+    response = app.test_client().get(f'/api/temples/nearby?lat={CENTER[0]}&lng={CENTER[1]}&k=5&cursor={cursor}')
+    
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('k', ['0', '101', 'abc'])
+def test_invalid_k_is_rejected(app, k):
+    """k 超出範圍或不是整數時回 400"""
+    response = app.test_client().get(f'/api/temples/nearby?lat={CENTER[0]}&lng={CENTER[1]}&k={k}')
+    
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('backend', ['geohash', 'sql'])
+def test_next_page_reads_only_outer_ring(app, factory, monkeypatch, backend):
+    """下一頁不重新讀取前一頁距離內的廟宇，只計算外圈候選的距離"""
+    monkeypatch.setattr(spatial_index, 'backend', backend)
+    rng = random.Random(1)
+    # 29 間在 0.3 公里內、1 間在 0.5 公里（第一頁最後一筆）、10 間在 3 到 4 公里
+    for _ in range(29):
+        distance = rng.uniform(0, 0.3) / 111.0
+        factory.temple(latitude=CENTER[0] + distance, longitude=CENTER[1])
+    factory.temple(latitude=CENTER[0] - 0.5 / 111.0, longitude=CENTER[1])
+    far = {factory.temple(latitude=CENTER[0] + rng.uniform(3, 4) / 111.0, longitude=CENTER[1]) for _ in range(10)}
+    client = app.test_client()
+    first = get_page(client, 30)
+    
+    scanned = []
+    nearest = geo.nearest
+    
+    def counting_nearest(latitude, longitude, lats, lngs, *args, **kwargs):
+        scanned.append(len(lats))
+        return nearest(latitude, longitude, lats, lngs, *args, **kwargs)
+    
+    monkeypatch.setattr(geo, 'nearest', counting_nearest)
+    second = get_page(client, 10, first['pagination']['next_cursor'])
+    
+    assert {temple['id'] for temple in second['temples']} == far
+    assert sum(scanned) <= 20  # 第一頁的 30 間不再讀取（修正前每次加倍半徑都重新讀取全部）
+
+def test_ring_query_matches_brute_force(app, factory):
+    """指定內圈時，距離在內外半徑之間的廟宇都會找到"""
+    rng = random.Random(2)
+    points = [(rng.uniform(22.9, 23.1), rng.uniform(120.1, 120.3)) for _ in range(200)]
+    temple_ids = [factory.temple(latitude=lat, longitude=lng) for lat, lng in points]
+    with app.app_context():
+        for _ in range(20):
+            lat, lng = rng.uniform(22.9, 23.1), rng.uniform(120.1, 120.3)
+            outer = rng.uniform(1, 10)
+            inner = rng.uniform(0, outer)
+            expected = {
+                temple_id for temple_id, point in zip(temple_ids, points)
+                if inner <= haversine(lat, lng, *point) <= outer
+            }
+            for found in (
+                {temple_id for temple_id, _ in Temple.find_nearby_ids(lat, lng, outer, None, min_radius_km=inner)},
+                {temple.id for temple, _ in Temple.find_nearby(lat, lng, outer, None, min_radius_km=inner)},
+            ):
+                assert expected <= found
+
+def test_distance_backends_agree():
+    """強制使用 numpy 或 python 計算距離時結果相同，筆數少於 NUMPY_MIN_SIZE 也照指定方式計算"""
+    pytest.importorskip('numpy')
+    rng = random.Random(3)
+    lats = [rng.uniform(21.9, 25.3) for _ in range(10)]
+    lngs = [rng.uniform(120.0, 122.0) for _ in range(10)]
+    origins = [(rng.uniform(21.9, 25.3), rng.uniform(120.0, 122.0)) for _ in range(3)]
+    
+    results = {
+        backend: (
+            geo.distances_from(*CENTER, lats, lngs, backend=backend),
+            geo.nearest(*CENTER, lats, lngs, radius_km=200, limit=5, backend=backend),
+            geo.distance_matrix(origins, lats, lngs, backend=backend),
+        )
+        for backend in ('numpy', 'python')
+    }
+    
+    assert results['numpy'][0] == pytest.approx(results['python'][0])
+    assert [index for index, _ in results['numpy'][1]] == [index for index, _ in results['python'][1]]
+    for numpy_row, python_row in zip(results['numpy'][2], results['python'][2]):
+        assert numpy_row == pytest.approx(python_row)
+
+def test_unknown_distance_backend_is_rejected(monkeypatch):
+    """不支援的計算方式拋出 ValueError；未安裝 NumPy 時強制 numpy 拋出 RuntimeError"""
+    with pytest.raises(ValueError):
+        geo.distances_from(*CENTER, [CENTER[0]], [CENTER[1]], backend='fortran')
+    
+    monkeypatch.setattr(geo, 'np', None)
+    assert geo.available_backends() == ('python',)
+    with pytest.raises(RuntimeError):
+        geo.nearest(*CENTER, [CENTER[0]], [CENTER[1]], backend='numpy')
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.models import db, Checkin
+
+msgpack = pytest.importorskip('msgpack')
+cbor2 = pytest.importorskip('cbor2')
+
+# (Content-Type, 編碼, 解碼)
+FORMATS = [
+    ('application/msgpack', lambda obj: msgpack.packb(obj, datetime=True), lambda data: msgpack.unpackb(data, timestamp=3)),
+    ('application/cbor', lambda obj: cbor2.dumps(obj, datetime_as_timestamp=True), cbor2.loads),
+]
+
+def post(app, path, mimetype, encode, payload, headers):
+    return app.test_client().post(
+        path, data=encode(payload), content_type=mimetype,
+        headers={**headers, 'Accept': mimetype}
+    )
+
+@pytest.mark.parametrize('mimetype, encode, decode', FORMATS)
+def test_checkin_with_native_datetime_in_extra_data(app, factory, mimetype, encode, decode):
+    """二進位請求中 extra_data 的 datetime 與 bytes 轉為字串後寫入，回應以相同格式編碼"""
+    _, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    payload = {'temple_id': temple_id, 'amulet_uid': amulet_uid, 'extra_data': {'at': at, 'raw': b'\x01\x02'}}
+    
+    response = post(app, '/api/checkin', mimetype, encode, payload, headers)
+    
+    assert response.status_code == 201
+    assert response.mimetype == mimetype
+    assert 'Accept' in response.vary
+    body = decode(response.data)
+    assert body['success'] is True
+    with app.app_context():
+        checkin = db.session.get(Checkin, body['data']['checkin']['id'])
+        assert checkin.extra_data == {'at': '2026-01-02T03:04:05+00:00', 'raw': 'AQI='}
+
+@pytest.mark.parametrize('mimetype, encode, decode', FORMATS)
+def test_batch_checkin_accepts_native_client_time(app, factory, mimetype, encode, decode):
+    """client_time 為二進位格式的原生 timestamp 時照常同步"""
+    user_id, amulet_uid, headers = factory.user()
+    temples = [factory.temple(), factory.temple()]
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    items = [{'temple_id': temple_id, 'amulet_uid': amulet_uid, 'client_time': now} for temple_id in temples]
+    
+    response = post(app, '/api/checkin/batch', mimetype, encode, {'checkins': items}, headers)
+    
+    assert response.status_code == 200
+    results = decode(response.data)['data']['results']
+    assert [result['success'] for result in results] == [True, True]
+    with app.app_context():
+        times = db.session.query(Checkin.checkin_time).filter(Checkin.user_id == user_id).all()
+        assert [checkin_time for checkin_time, in times] == [now.replace(tzinfo=None)] * 2
+
+@pytest.mark.parametrize('mimetype, encode, decode', FORMATS)
+def test_response_encodes_datetime_natively(app, factory, mimetype, encode, decode):
+    """Accept 指定二進位格式時 datetime 以原生 timestamp 回傳"""
+    temple_id = factory.temple()
+    
+    response = app.test_client().get(f'/api/temples/{temple_id}', headers={'Accept': mimetype})
+    
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    body = decode(response.data)
+    assert body['data']['id'] == temple_id
+    assert isinstance(body['timestamp'], datetime)
+
+def test_unknown_accept_falls_back_to_json(app, factory):
+    """未支援的格式與 */* 都回傳 JSON"""
+    temple_id = factory.temple()
+    client = app.test_client()
+    
+    for accept in ('*/*', 'application/xml'):
+        response = client.get(f'/api/temples/{temple_id}', headers={'Accept': accept})
+        assert response.mimetype == 'application/json'
+        assert response.get_json()['data']['id'] == temple_id
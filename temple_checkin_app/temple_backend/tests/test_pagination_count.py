@@ -0,0 +1,89 @@
+import pytest
+
+from app.models import db, CacheGeneration, Temple, User
+from app.services.temple_catalog import TEMPLE_CATALOG
+from app.utils.count_cache import USERS_GENERATION, count_cache
+from app.utils.helpers import generate_uuid
+
+@pytest.fixture(autouse=True)
+def clear_count_cache():
+    """每個測試的資料庫世代都從 0 開始，清除前一個測試快取的總數"""
+    count_cache.cache.clear()
+
+@pytest.fixture
+def temples(factory):
+    """建立 5 間廟宇"""
+    return [factory.temple() for _ in range(5)]
+
+def get_pagination(client, url, headers=None):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['data']['pagination']
+
+def add_temple(bump):
+    """直接新增一間廟宇，bump 為 True 時同時遞增廟宇目錄世代"""
+    db.session.add(Temple(
+        id=generate_uuid(), name='新廟宇', main_deity='媽祖', description='測試',
+        address='台北市', latitude=25.0, longitude=121.5
+    ))
+    if bump:
+        CacheGeneration.bump(TEMPLE_CATALOG)
+    db.session.commit()
+
+def test_exact_count(app, temples):
+    """預設 exact：以 COUNT(*) 計算總數與頁數"""
+    pagination = get_pagination(app.test_client(), '/api/temples?per_page=2')
+    
+    assert (pagination['total'], pagination['pages']) == (5, 3)
+    assert pagination['has_next'] is True
+    assert 'count' not in pagination
+
+@pytest.mark.parametrize('page, has_next', [(1, True), (2, True), (3, False)])
+def test_none_count_uses_one_extra_row(app, temples, page, has_next):
+    """none：不計算總數，多取一筆判斷是否有下一頁"""
+    pagination = get_pagination(app.test_client(), f'/api/temples?per_page=2&count=none&page={page}')
+    
+    assert pagination['total'] is None and pagination['pages'] is None
+    assert pagination['has_next'] is has_next
+    assert pagination['count'] == 'none'
+
+def test_estimate_count_is_cached_until_generation_bump(app, temples):
+    """estimate：總數快取到資料表世代遞增為止"""
+    client = app.test_client()
+    # 每次使用不同的查詢參數，避開 ETag 304
+    assert get_pagination(client, '/api/temples?per_page=2&count=estimate&page=1')['total'] == 5
+    
+    with app.app_context():
+        add_temple(bump=False)
+    pagination = get_pagination(client, '/api/temples?per_page=2&count=estimate&page=2')
+    assert (pagination['total'], pagination['pages']) == (5, 3)
+    
+    with app.app_context():
+        add_temple(bump=True)
+    pagination = get_pagination(client, '/api/temples?per_page=2&count=estimate&page=3')
+    assert (pagination['total'], pagination['pages']) == (7, 4)
+    assert pagination['count'] == 'estimate'
+
+def test_username_change_invalidates_user_count(app, factory):
+    """修改使用者名稱會遞增使用者世代，快取的搜尋總數隨之更新"""
+    admin_id, _, admin_headers = factory.user()
+    _, _, headers = factory.user()
+    with app.app_context():
+        db.session.get(User, admin_id).is_admin = True
+        db.session.commit()
+        generation = CacheGeneration.get(USERS_GENERATION)
+    client = app.test_client()
+    
+    assert get_pagination(client, '/api/admin/users?search=renamed&count=estimate', admin_headers)['total'] == 0
+    
+    response = client.put('/api/users/profile', json={'username': 'renamed_user'}, headers=headers)
+    assert response.status_code == 200
+    with app.app_context():
+        assert CacheGeneration.get(USERS_GENERATION) == generation + 1
+    assert get_pagination(client, '/api/admin/users?search=renamed&count=estimate', admin_headers)['total'] == 1
+
+def test_invalid_count_mode(app):
+    """不支援的 count 回傳 400"""
+    response = app.test_client().get('/api/temples?count=fast')
+    
+    assert response.status_code == 400
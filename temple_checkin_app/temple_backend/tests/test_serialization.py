@@ -0,0 +1,116 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db, Amulet, BonusCampaign, Checkin, Temple, User
+from app.models.serialization import compile_serializer, isoformat, serialize_fields
+from app.utils.helpers import generate_uuid
+from app.utils.json_backend import json_backend
+
+SPARSE = {
+    Temple: {'id', 'name', 'created_at'},
+    Checkin: {'id', 'checkin_time', 'extra_data'},
+    User: {'id', 'blessing_points'},
+    Amulet: {'uid', 'updated_at'},
+    BonusCampaign: {'bonus_points', 'starts_at', 'ends_at'},
+}
+
+@pytest.fixture
+def records(app, factory):
+    """每個有 FIELDS 的模型各一筆資料，回傳 [(模型, id)]"""
+    user_id, amulet_uid, headers = factory.user(blessing_points=7)
+    temple_id = factory.temple()
+    response = app.test_client().post('/api/checkin', json={
+        'temple_id': temple_id, 'amulet_uid': amulet_uid, 'notes': '平安', 'extra_data': {'weather': '晴'}
+    }, headers=headers)
+    assert response.status_code == 201
+    
+    with app.app_context():
+        now = datetime.utcnow()
+        campaign_id = generate_uuid()
+        db.session.add(BonusCampaign(
+            id=campaign_id, name='加碼', bonus_points=2, starts_at=now, ends_at=now + timedelta(days=1), temple_id=temple_id
+        ))
+        db.session.commit()
+        return [
+            (Temple, temple_id),
+            (Checkin, Checkin.query.filter_by(user_id=user_id).one().id),
+            (User, user_id),
+            (Amulet, Amulet.query.filter_by(uid=amulet_uid).one().id),
+            (BonusCampaign, campaign_id),
+        ]
+
+def reference(obj, fields=None):
+    """逐欄位以屬性取值（改為產生序列化函式前的做法）"""
+    getters = getattr(type(obj), 'FIELD_GETTERS', {})
+    return {
+        name: getters[name](obj) if name in getters else getattr(obj, name)
+        for name in type(obj).FIELDS
+        if fields is None or name in fields
+    }
+
+def test_all_models_are_covered(app):
+    """每個有 FIELDS 的模型都在測試中"""
+    assert {model for model in db.Model.__subclasses__() if hasattr(model, 'FIELDS')} == set(SPARSE)
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_compiled_serializer_matches_attribute_access(app, records, sparse):
+    """全部欄位與部分欄位的輸出都與逐欄位取值相同，欄位順序依 FIELDS"""
+    with app.app_context():
+        for model, record_id in records:
+            fields = SPARSE[model] if sparse else None
+            obj = db.session.get(model, record_id)
+            expected = reference(obj, fields)
+            
+            data = serialize_fields(obj, fields)
+            
+            assert data == expected
+            assert obj.to_dict(fields=fields) == expected
+            assert list(data) == [name for name in model.FIELDS if fields is None or name in fields]
+
+def test_expired_instance_uses_attribute_access(app, records):
+    """實例過期（例如 commit 之後）時改走屬性存取，由 ORM 重新載入"""
+    with app.app_context():
+        for model, record_id in records:
+            obj = db.session.get(model, record_id)
+            expected = reference(obj)
+            db.session.expire(obj)
+            
+            assert compile_serializer(model)(obj) == expected
+
+def test_datetimes_stay_native_and_encode_as_iso(app, records):
+    """datetime 欄位輸出為原生 datetime，JSON 回應中為 ISO 字串"""
+    with app.app_context():
+        for model, record_id in records:
+            data = serialize_fields(db.session.get(model, record_id))
+            
+            encoded = json.loads(json_backend.dumps(data))
+            
+            for name, value in data.items():
+                if isinstance(value, datetime):
+                    assert encoded[name] == isoformat(value)
+                else:
+                    assert encoded[name] == value
+
+def test_sparse_fields_do_not_load_deferred_columns(app, records):
+    """搭配 load_only 只讀取選到的欄位，不觸發延遲載入"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import load_only
+    
+    with app.app_context():
+        temple_id = dict(records)[Temple]
+        temple = Temple.query.options(load_only(Temple.id, Temple.name, Temple.created_at)).filter_by(id=temple_id).one()
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            data = serialize_fields(temple, SPARSE[Temple])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        
+        assert statements == []
+        assert data == {'id': temple_id, 'name': temple.name, 'created_at': temple.created_at}
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from app.models import db, CacheGeneration, Temple
+from app.services.spatial_index import spatial_index
+from app.services.temple_catalog import TEMPLE_CATALOG, temple_catalog
+from app.utils.helpers import generate_uuid
+
+def add_temple(latitude, longitude, updated_at):
+    """模擬其他 worker 新增廟宇（updated_at 由該 worker 的時鐘寫入），並遞增世代"""
+    temple = Temple(
+        id=generate_uuid(), name='廟宇', main_deity='媽祖', description='測試',
+        address='台北市', latitude=latitude, longitude=longitude
+    )
+    temple.updated_at = updated_at
+    db.session.add(temple)
+    temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
+    db.session.commit()
+    return temple.id
+
+def nearby_ids(latitude, longitude):
+    temple_catalog.invalidate()  # 立即讀取新的世代
+    return {temple_id for temple_id, _ in spatial_index.nearby(latitude, longitude, radius_km=1)}
+
+def test_resync_reads_temples_from_lagging_clock(app, factory):
+    """只差一個世代時增量讀取，時鐘落後的 worker 寫入的廟宇也不會漏掉"""
+    temple_id = factory.temple(latitude=23.0, longitude=120.2)
+    with app.app_context():
+        assert temple_id in nearby_ids(23.0, 120.2)
+        stats = spatial_index.get_stats()
+        
+        added = add_temple(23.001, 120.2, datetime.utcnow() - timedelta(hours=1))
+        assert nearby_ids(23.0, 120.2) == {temple_id, added}
+        assert spatial_index.get_stats()['resyncs'] == stats['resyncs'] + 1
+        assert spatial_index.get_stats()['rebuilds'] == stats['rebuilds']
+
+def test_generation_jump_resyncs_incrementally(app, factory):
+    """跳過多個世代時同樣只讀取世代較新的廟宇，停用的廟宇會移除"""
+    temple_id = factory.temple(latitude=23.5, longitude=120.5)
+    with app.app_context():
+        assert temple_id in nearby_ids(23.5, 120.5)
+        stats = spatial_index.get_stats()
+        
+        behind = datetime.utcnow() - timedelta(hours=1)
+        first = add_temple(23.501, 120.5, behind)
+        second = add_temple(23.502, 120.5, behind)
+        temple = db.session.get(Temple, first)
+        temple.is_active = False
+        temple.catalog_generation = CacheGeneration.bump(TEMPLE_CATALOG)
+        db.session.commit()
+        
+        assert nearby_ids(23.5, 120.5) == {temple_id, second}
+        assert spatial_index.get_stats()['resyncs'] == stats['resyncs'] + 1
+        assert spatial_index.get_stats()['rebuilds'] == stats['rebuilds']
@@ -0,0 +1,25 @@
+from sqlalchemy import event
+
+from app.models import db
+from app.services.temple_catalog import temple_catalog
+
+def test_fill_racing_with_invalidate_is_not_cached(app, factory):
+    """讀取資料庫期間廟宇被異動（快取被移除）時，讀到的資料不寫入快取"""
+    temple_id = factory.temple()
+    
+    with app.app_context():
+        temple_catalog.version()  # 先同步世代，下一個查詢就是讀取廟宇
+        
+        def invalidate(*args):
+            temple_catalog.invalidate(temple_id)
+        
+        event.listen(db.engine, 'after_cursor_execute', invalidate)
+        try:
+            assert temple_catalog.get(temple_id).id == temple_id
+        finally:
+            event.remove(db.engine, 'after_cursor_execute', invalidate)
+        assert temple_catalog.cache.get(temple_id) is None
+        
+        # 沒有競爭時照常寫入快取
+        temple_catalog.get(temple_id)
+        assert temple_catalog.cache.get(temple_id).id == temple_id
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+from click.testing import CliRunner
+
+from app.models import db, Amulet, Checkin, Temple, TempleVisit
+from app.services.temple_catalog import temple_catalog
+from app.utils.helpers import generate_uuid
+
+T0 = datetime(2026, 1, 1, 8, 0)
+
+@pytest.fixture(params=['upsert', 'update-then-insert'])
+def claim(request, app, monkeypatch):
+    """在 app context 中呼叫 TempleVisit.claim，分別走條件式 upsert 與 UPDATE 後 INSERT 兩條路徑"""
+    with app.app_context():
+        if request.param == 'update-then-insert':
+            monkeypatch.setattr(db.session.get_bind().dialect, 'insert_returning', False)
+        
+        def _claim(*args, **kwargs):
+            visit_count = TempleVisit.claim(*args, **kwargs)
+            db.session.commit()
+            return visit_count
+        
+        yield _claim
+
+def get_visit(user_id, temple_id):
+    db.session.expire_all()
+    visit = db.session.get(TempleVisit, (user_id, temple_id))
+    return visit.last_checkin_time, visit.visit_count
+
+def test_claim_inside_cooldown_is_rejected(factory, claim):
+    """冷卻時間內的 claim 回傳 None，最後造訪時間與次數不變"""
+    user_id, _, _ = factory.user()
+    temple_id = factory.temple()
+    
+    assert claim(user_id, temple_id, T0, 24) == 1
+    assert claim(user_id, temple_id, T0 + timedelta(hours=23, minutes=59), 24) is None
+    assert claim(user_id, temple_id, T0 - timedelta(hours=1), 24) is None
+    
+    assert get_visit(user_id, temple_id) == (T0, 1)
+
+def test_claim_after_cooldown_is_accepted(factory, claim):
+    """冷卻時間一過（含剛好等於冷卻時數）即可再次 claim，造訪次數累加"""
+    user_id, _, _ = factory.user()
+    temple_id = factory.temple()
+    claim(user_id, temple_id, T0, 24)
+    
+    assert claim(user_id, temple_id, T0 + timedelta(hours=24), 24) == 2
+    assert get_visit(user_id, temple_id) == (T0 + timedelta(hours=24), 2)
+
+def test_batch_claim_counts_every_checkin(factory, claim):
+    """批次 claim 以最晚一筆為最後造訪時間，回傳值等於筆數代表第一次造訪"""
+    user_id, _, _ = factory.user()
+    temple_id = factory.temple()
+    
+    assert claim(user_id, temple_id, T0, 2, T0 + timedelta(hours=4), 3) == 3
+    assert get_visit(user_id, temple_id) == (T0 + timedelta(hours=4), 3)
+    assert claim(user_id, temple_id, T0 + timedelta(hours=6), 2, T0 + timedelta(hours=8), 2) == 5
+
+def test_cooldown_is_per_temple(app, factory, claim):
+    """各廟宇使用自己的 checkin_cooldown_hours"""
+    user_id, _, _ = factory.user()
+    short, default = factory.temple(), factory.temple()
+    db.session.get(Temple, short).checkin_cooldown_hours = 2
+    db.session.commit()
+    
+    for temple_id in (short, default):
+        hours = db.session.get(Temple, temple_id).checkin_cooldown_hours
+        assert claim(user_id, temple_id, T0, hours) == 1
+        assert claim(user_id, temple_id, T0 + timedelta(hours=3), hours) == (2 if temple_id == short else None)
+
+def test_checkin_route_uses_temple_cooldown(app, factory):
+    """打卡 API 依廟宇的冷卻時數拒絕重複打卡"""
+    _, amulet_uid, headers = factory.user()
+    temple_id = factory.temple()
+    with app.app_context():
+        db.session.get(Temple, temple_id).checkin_cooldown_hours = 2
+        db.session.commit()
+    temple_catalog.invalidate(temple_id)
+    client = app.test_client()
+    body = {'temple_id': temple_id, 'amulet_uid': amulet_uid}
+    
+    assert client.post('/api/checkin', json=body, headers=headers).status_code == 201
+    response = client.post('/api/checkin', json=body, headers=headers)
+    
+    assert response.status_code == 400
+    assert '2小時內' in response.get_json()['message']
+
+def test_rebuild_temple_visits_from_checkins(app, factory):
+    """rebuild-temple-visits 以打卡記錄重建最後造訪時間與次數，取代錯誤或多餘的資料"""
+    from run import rebuild_temple_visits
+    
+    user_id, amulet_uid, _ = factory.user()
+    other_id, other_amulet_uid, _ = factory.user()
+    temples = [factory.temple(), factory.temple(), factory.temple()]
+    checkins = [
+        (user_id, amulet_uid, temples[0], T0),
+        (user_id, amulet_uid, temples[0], T0 + timedelta(days=2)),
+        (user_id, amulet_uid, temples[0], T0 + timedelta(days=1)),
+        (user_id, amulet_uid, temples[1], T0),
+        (other_id, other_amulet_uid, temples[0], T0 + timedelta(days=3)),
+    ]
+    with app.app_context():
+        amulet_ids = {uid: Amulet.query.filter_by(uid=uid).one().id for uid in (amulet_uid, other_amulet_uid)}
+        for owner_id, uid, temple_id, checkin_time in checkins:
+            checkin = Checkin(id=generate_uuid(), user_id=owner_id, temple_id=temple_id, amulet_id=amulet_ids[uid], points_earned=1)
+            checkin.checkin_time = checkin_time
+            db.session.add(checkin)
+        # 與打卡記錄不符的資料：次數錯誤、沒有打卡的廟宇
+        db.session.add(TempleVisit(user_id, temples[0], T0, visit_count=9))
+        db.session.add(TempleVisit(user_id, temples[2], T0))
+        db.session.commit()
+        
+        result = CliRunner().invoke(rebuild_temple_visits)
+        
+        assert result.exit_code == 0, result.output
+        assert '共 3 筆' in result.output
+        db.session.expire_all()
+        visits = {(visit.user_id, visit.temple_id): (visit.last_checkin_time, visit.visit_count) for visit in TempleVisit.query}
+        assert visits == {
+            (user_id, temples[0]): (T0 + timedelta(days=2), 3),
+            (user_id, temples[1]): (T0, 1),
+            (other_id, temples[0]): (T0 + timedelta(days=3), 1),
+        }
@@ -0,0 +1,27 @@
+import pytest
+
+from app.utils.validators import validate_points
+
+@pytest.mark.parametrize('point', [
+    '12',
+    '25.0,121.5',
+    ['25.0', '121.5'],
+    [25.0],
+    [25.0, 121.5, 0],
+    [True, False],
+    {'lat': '25.0', 'lng': 121.5},
+    {'lat': 25.0},
+    None,
+])
+def test_validate_points_rejects_malformed_point(point):
+    """座標必須為兩個數字的陣列或 {lat, lng}，字串不會被拆成座標"""
+    errors, result = validate_points([[25.0, 121.5], point])
+    assert errors == ['第 2 個座標格式不正確']
+    assert result == []
+
+def test_validate_points_accepts_pairs_and_objects():
+    errors, result = validate_points([[25, 121.5], (23.5, 120), {'lat': -33.9, 'lng': 151.2}])
+    assert errors == []
+    assert result == [(25.0, 121.5), (23.5, 120.0), (-33.9, 151.2)]
+    
+    assert validate_points([[91, 0]]) == (['第 1 個座標超出範圍'], [])
\ No newline at end of file
@@ -0,0 +1,122 @@
+import pytest
+
+from app.models import db, CacheGeneration, Temple
+from app.services.temple_catalog import TEMPLE_CATALOG, temple_catalog
+
+# 台北市區三間（兩間同座標）、高雄一間、換日線兩側各一間
+TAIPEI = [(25.03, 121.56), (25.05, 121.52), (25.05, 121.52)]
+KAOHSIUNG = (22.62, 120.30)
+DATELINE = [(0.5, 179.9), (-0.5, -179.9)]
+
+@pytest.fixture
+def temples(factory):
+    """回傳 {座標群組名稱: [廟宇 id]}"""
+    temple_catalog.invalidate()
+    return {
+        'taipei': [factory.temple(latitude=lat, longitude=lng) for lat, lng in TAIPEI],
+        'kaohsiung': [factory.temple(latitude=KAOHSIUNG[0], longitude=KAOHSIUNG[1])],
+        'dateline': [factory.temple(latitude=lat, longitude=lng) for lat, lng in DATELINE],
+    }
+
+def get_viewport(client, bbox, zoom):
+    response = client.get(f'/api/temples/viewport?bbox={bbox}&zoom={zoom}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+def test_cluster_counts_cover_every_temple_at_each_zoom(app, temples):
+    """整個世界的群集數量總和在每個縮放層級都等於廟宇總數"""
+    client = app.test_client()
+    
+    for zoom in range(app.config['VIEWPORT_CLUSTER_MAX_ZOOM'] + 1):
+        data = get_viewport(client, '-180,-85,180,85', zoom)
+        assert data['type'] == 'clusters'
+        assert data['zoom'] == zoom
+        assert sum(count for _, _, count in data['items']) == 6
+
+def test_clusters_only_count_temples_in_viewport(app, temples):
+    """視窗只涵蓋台北時不計入高雄；群集中心為所屬廟宇的平均座標"""
+    client = app.test_client()
+    
+    data = get_viewport(client, '121.4,24.9,121.7,25.2', 8)
+    
+    assert [count for _, _, count in data['items']] == [3]
+    lat, lng, _ = data['items'][0]
+    assert lat == pytest.approx(sum(point[0] for point in TAIPEI) / 3)
+    assert lng == pytest.approx(sum(point[1] for point in TAIPEI) / 3)
+    
+    data = get_viewport(client, '121.4,24.9,121.7,25.2', 14)
+    assert sorted(count for _, _, count in data['items']) == [1, 2]
+
+def test_points_above_cluster_zoom(app, temples):
+    """縮放層級超過 VIEWPORT_CLUSTER_MAX_ZOOM 時回傳視窗內的廟宇 [id, 緯度, 經度]"""
+    data = get_viewport(app.test_client(), '121.5,25.0,121.6,25.1', 15)
+    
+    assert data['type'] == 'points'
+    assert data['zoom'] == 15
+    assert sorted(temple_id for temple_id, _, _ in data['items']) == sorted(temples['taipei'])
+    assert {(lat, lng) for _, lat, lng in data['items']} == set(TAIPEI)
+
+def test_too_many_points_fall_back_to_clusters(app, temples):
+    """點數超過 VIEWPORT_MAX_POINTS 時改回傳最細一層的群集"""
+    app.config['VIEWPORT_MAX_POINTS'] = 2
+    
+    data = get_viewport(app.test_client(), '121.5,25.0,121.6,25.1', 18)
+    
+    assert data['type'] == 'clusters'
+    assert data['zoom'] == app.config['VIEWPORT_CLUSTER_MAX_ZOOM']
+    assert sum(count for _, _, count in data['items']) == 3
+
+def test_bbox_across_dateline(app, temples):
+    """西經大於東經時視窗跨越換日線，兩側的廟宇都包含在內"""
+    client = app.test_client()
+    
+    data = get_viewport(client, '179,-1,-179,1', 16)
+    assert sorted(temple_id for temple_id, _, _ in data['items']) == sorted(temples['dateline'])
+    
+    data = get_viewport(client, '179,-1,-179,1', 6)
+    assert sorted(count for _, _, count in data['items']) == [1, 1]
+
+def test_clusters_follow_added_and_deactivated_temples(app, temples):
+    """其他 worker 新增或停用廟宇後，群集數量隨目錄世代更新"""
+    client = app.test_client()
+    bbox = '121.4,24.9,121.7,25.2'
+    assert get_viewport(client, bbox, 8)['items'][0][2] == 3
+    
+    with app.app_context():
+        db.session.get(Temple, temples['taipei'][0]).is_active = False
+        added = Temple(
+            id='viewport-added', name='新廟宇', main_deity='媽祖', description='測試',
+            address='台北市', latitude=25.1, longitude=121.6
+        )
+        db.session.add(added)
+        generation = CacheGeneration.bump(TEMPLE_CATALOG)
+        db.session.get(Temple, temples['taipei'][0]).catalog_generation = generation
+        added.catalog_generation = generation
+        db.session.commit()
+    temple_catalog.invalidate()
+    
+    assert sum(count for _, _, count in get_viewport(client, bbox, 8)['items']) == 3
+    points = get_viewport(client, bbox, 15)['items']
+    assert sorted(temple_id for temple_id, _, _ in points) == sorted(temples['taipei'][1:] + ['viewport-added'])
+
+def test_viewport_etag(app, temples):
+    """相同視窗與目錄世代回 304"""
+    client = app.test_client()
+    path = '/api/temples/viewport?bbox=121.4,24.9,121.7,25.2&zoom=8'
+    etag = client.get(path).headers['ETag']
+    
+    assert client.get(path, headers={'If-None-Match': etag}).status_code == 304
+
+@pytest.mark.parametrize('query', [
+    'zoom=8',
+    'bbox=121.4,24.9,121.7&zoom=8',
+    'bbox=121.4,25.2,121.7,24.9&zoom=8',
+    'bbox=121.4,24.9,181,25.2&zoom=8',
+    'bbox=121.4,24.9,121.7,25.2',
+    'bbox=121.4,24.9,121.7,25.2&zoom=23',
+])
+def test_invalid_viewport_is_rejected(app, query):
+    """bbox 或 zoom 不正確時回 400"""
+    response = app.test_client().get(f'/api/temples/viewport?{query}')
+    
+    assert response.status_code == 400